@@ -2,7 +2,7 @@ import logging
 import os
 from datetime import timedelta
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, Optional
 
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
@@ -23,6 +23,18 @@ class LLMSettings(BaseModel):
     temperature: float = 0.0
     max_tokens: Optional[int] = None
     max_retries: int = 3
+    # Model used per call site by LLMFactory.create_completion.
+    # Call sites missing from the map use default_model.
+    call_site_models: Dict[str, str] = Field(default_factory=dict)
+    # Larger model to retry with when validation fails or confidence is too low.
+    # Set to None to disable escalation.
+    escalation_model: Optional[str] = None
+    # Results whose confidence is below this value are re-run on the escalation model
+    escalation_min_confidence: float = 0.6
+    # Max calls in flight to this provider from this process (None = no cap)
+    max_concurrency: Optional[int] = None
+    # Context window of the served model; prompt budgets are clamped to fit (None = no clamp)
+    context_size: Optional[int] = None
 
 
 class OpenAISettings(LLMSettings):
@@ -31,12 +43,70 @@ class OpenAISettings(LLMSettings):
     api_key: str = Field(default_factory=lambda: os.getenv("OPENAI_API_KEY"))
     default_model: str = Field(default="gpt-4o")
     embedding_model: str = Field(default="text-embedding-3-small")
+    # Small, fast model for classification-style calls; the larger model where
+    # the output is long or drives actions (tool decision, conversation, parsing).
+    call_site_models: Dict[str, str] = Field(
+        default_factory=lambda: {
+            "intent": "gpt-4o-mini",
+            "decision": "gpt-4o",
+            "conversation": "gpt-4o",
+            "synthesis": "gpt-4o",
+            "event_gate": "gpt-4o-mini",
+            "event_parse": "gpt-4o",
+            "confirmation": "gpt-4o-mini",
+            "summary": "gpt-4o-mini",
+        }
+    )
+    escalation_model: Optional[str] = Field(default="gpt-4o")
+
+
+class LlamaSettings(LLMSettings):
+    """Local OpenAI-compatible server (llama.cpp server, vLLM, Ollama...)."""
+
+    base_url: str = Field(default_factory=lambda: os.getenv("LLAMA_BASE_URL", "http://localhost:8080/v1"))
+    # Local servers usually ignore the key, but the OpenAI client requires one
+    api_key: str = Field(default_factory=lambda: os.getenv("LLAMA_API_KEY", "not-needed"))
+    default_model: str = Field(default_factory=lambda: os.getenv("LLAMA_MODEL", "llama-3.1-8b-instruct"))
+    # instructor mode: "json_mode" works with most servers; use "json_schema_mode" for servers
+    # with grammar-constrained JSON schema output, or "tool_call" if they support function calling
+    instructor_mode: str = Field(default_factory=lambda: os.getenv("LLAMA_INSTRUCTOR_MODE", "json_mode"))
+    max_tokens: Optional[int] = 1024
+    # A CPU server handles few requests at once; extra calls wait instead of thrashing it
+    max_concurrency: Optional[int] = Field(default_factory=lambda: int(os.getenv("LLAMA_MAX_CONCURRENCY", "2")))
+    context_size: Optional[int] = Field(default_factory=lambda: int(os.getenv("LLAMA_CONTEXT_SIZE", "8192")))
+
+
+def _parse_call_site_providers(value: str) -> Dict[str, str]:
+    """Parse "intent=llama,event_gate=llama" into {"intent": "llama", "event_gate": "llama"}."""
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {call_site.strip(): provider.strip() for call_site, provider in pairs}
+
+
+class ProviderRoutingSettings(BaseModel):
+    """Which LLM provider serves each call site (see LLMFactory.for_call_site)."""
+
+    default_provider: str = Field(default_factory=lambda: os.getenv("LLM_DEFAULT_PROVIDER", "openai"))
+    # e.g. LLM_CALL_SITE_PROVIDERS="intent=llama,event_gate=llama,confirmation=llama"
+    # sends the cheap, high-volume calls to the local server
+    call_site_providers: Dict[str, str] = Field(
+        default_factory=lambda: _parse_call_site_providers(os.getenv("LLM_CALL_SITE_PROVIDERS", ""))
+    )
 
 
 class DatabaseSettings(BaseModel):
     """Database connection settings."""
 
     service_url: str = Field(default_factory=lambda: os.getenv("TIMESCALE_SERVICE_URL"))
+    # Connection pool of each engine (sync for the agent and scripts, async for the routers).
+    # Size it together with the server's max_connections: every worker process holds its own pools.
+    pool_size: int = Field(default_factory=lambda: int(os.getenv("DB_POOL_SIZE", "20")))
+    max_overflow: int = Field(default_factory=lambda: int(os.getenv("DB_MAX_OVERFLOW", "10")))
+    # Seconds a request waits for a free connection before failing
+    pool_timeout: float = Field(default_factory=lambda: float(os.getenv("DB_POOL_TIMEOUT", "30")))
+    # Test connections on checkout, so a connection dropped by the server or a proxy is replaced, not handed out
+    pool_pre_ping: bool = Field(default_factory=lambda: os.getenv("DB_POOL_PRE_PING", "true").lower() == "true")
+    # Seconds after which a connection is replaced (below the server or proxy idle timeout)
+    pool_recycle: int = Field(default_factory=lambda: int(os.getenv("DB_POOL_RECYCLE", "1800")))
 
 
 class VectorStoreSettings(BaseModel):
@@ -47,12 +117,241 @@ class VectorStoreSettings(BaseModel):
     time_partition_interval: timedelta = timedelta(days=7)
 
 
+class PromptBudgetSettings(BaseModel):
+    """Token budgets used by the prompt builder, keyed by LLM call site."""
+
+    # Model name used to pick the tiktoken encoding for local token counting
+    encoding_model: str = "gpt-4o"
+    # Budget used when a call site has no explicit entry below
+    default_budget: int = 4000
+    # Max prompt tokens per call site (system + context + history + user)
+    budgets: Dict[str, int] = Field(
+        default_factory=lambda: {
+            "intent": 1500,
+            "decision": 3000,
+            "conversation": 4000,
+            "synthesis": 6000,
+            "summary": 3000,
+        }
+    )
+    # Max raw messages considered for the history window before budgeting
+    history_messages: int = 5
+    # Send only the selected tool family's schema with decision calls (see decision_schemas.py)
+    narrow_decision_schemas: bool = True
+
+
+class LatencySettings(BaseModel):
+    """Deadlines and request hedging for model and embedding calls."""
+
+    # Per-call deadline used when a call site has no explicit entry below
+    default_deadline_ms: int = 20000
+    deadlines_ms: Dict[str, int] = Field(
+        default_factory=lambda: {
+            "intent": 4000,
+            "event_gate": 4000,
+            "confirmation": 6000,
+            "event_parse": 8000,
+            "decision": 10000,
+            "conversation": 15000,
+            "synthesis": 15000,
+            "embedding": 3000,
+            # Background work, never on a request's critical path
+            "summary": 30000,
+        }
+    )
+    # Send a duplicate request once a call runs longer than this percentile
+    # of its observed latency; the first valid response wins.
+    hedge_enabled: bool = True
+    hedge_percentile: float = 95.0
+    # Don't hedge until the call site has this many latency samples
+    hedge_min_samples: int = 20
+    # Budget for a whole agent turn (all model calls together)
+    turn_deadline_ms: int = 25000
+    # Stream the decision call so task/goal lookups start before the JSON is complete
+    # (see decision_prefetch.py). A streamed call is not hedged or escalated.
+    stream_decision: bool = True
+
+
+class ReplaySettings(BaseModel):
+    """Record/replay of model calls for offline tests and load tests (see llm_cassette.py)."""
+
+    # "off": call providers normally
+    # "record": call providers and save responses/embeddings to the cassette
+    # "replay": never call providers; answer from the cassette
+    mode: str = Field(default_factory=lambda: os.getenv("LLM_REPLAY_MODE", "off"))
+    cassette_path: str = Field(default_factory=lambda: os.getenv("LLM_CASSETTE_PATH", "data/llm_cassette.json"))
+    # Synthetic latency added to every replayed call, to mimic the provider
+    latency_ms: int = Field(default_factory=lambda: int(os.getenv("LLM_REPLAY_LATENCY_MS", "0")))
+    latency_jitter_ms: int = 0
+    # Per-call-site overrides of latency_ms (e.g. {"conversation": 2500})
+    call_site_latency_ms: Dict[str, int] = Field(default_factory=dict)
+    # Seed for the jitter, so replays are deterministic
+    seed: int = 42
+
+
+class RateLimitSettings(BaseModel):
+    """Shared request/token budgets for provider calls (see rate_limiter.py)."""
+
+    enabled: bool = True
+    # Per provider quotas; a provider not listed here is not limited.
+    # Embeddings count against the same provider quota as completions.
+    requests_per_minute: Dict[str, int] = Field(default_factory=lambda: {"openai": 500, "anthropic": 50})
+    tokens_per_minute: Dict[str, int] = Field(default_factory=lambda: {"openai": 200000, "anthropic": 40000})
+    # "memory": limits are per process; "postgres": buckets are shared by all processes through the database
+    backend: str = Field(default_factory=lambda: os.getenv("RATE_LIMIT_BACKEND", "memory"))
+    # Bounded queues: callers beyond this many waiters fail fast instead of piling up
+    max_queue: Dict[str, int] = Field(default_factory=lambda: {"interactive": 50, "batch": 1000})
+    # Longest a call may wait for budget before giving up, per priority (batch work can wait)
+    max_wait_s: Dict[str, float] = Field(default_factory=lambda: {"interactive": 10.0, "batch": 300.0})
+    # After a 429, the allowed rate is multiplied by this factor, then recovers on each success
+    backoff_factor: float = 0.5
+    recovery_step: float = 0.05
+    min_rate_factor: float = 0.1
+    # Pause used after a 429 without a Retry-After header
+    default_retry_after_s: float = 5.0
+
+
+class SessionStateSettings(BaseModel):
+    """Per-conversation state of multi-step flows, e.g. a pending goal link (see session_state.py)."""
+
+    # "memory": state lives in this process only; "postgres": shared by all workers through the session_state table
+    backend: str = Field(default_factory=lambda: os.getenv("SESSION_STATE_BACKEND", "memory"))
+    # Unanswered follow-up questions expire after this long
+    ttl_s: float = Field(default_factory=lambda: float(os.getenv("SESSION_STATE_TTL_S", "900")))
+    # In-process LRU tier
+    max_local_entries: int = 1000
+    # With a shared backend, local copies are only trusted this long (another worker may have changed the state)
+    local_ttl_s: float = 2.0
+
+
+class ChatPersistenceSettings(BaseModel):
+    """How chat turns are written to the database (see chat_persistence.py)."""
+
+    # "transaction" (default): user message, assistant message and context in one commit before replying
+    # "write_behind": the turn is queued and written by a background writer; replies do not wait on the database,
+    # but queued turns live in this process only (lost if it crashes, dropped after max_attempts failed writes)
+    # and turn order is only kept among the requests served by this process
+    mode: str = Field(default_factory=lambda: os.getenv("CHAT_PERSISTENCE_MODE", "transaction"))
+    # Turns waiting to be written; callers block (rather than drop turns) when the queue is full
+    queue_size: int = 1000
+    # Attempts per turn before the writer gives up on it (with exponential backoff between them)
+    max_attempts: int = 5
+    # Longest a turn waits for its conversation's earlier writes, and shutdown waits for the queue to drain
+    flush_timeout_s: float = 10.0
+
+
+class MemorySettings(BaseModel):
+    """Long-term conversation memory: rolling summaries written in the background (see conversation_memory.py)."""
+
+    enabled: bool = Field(default_factory=lambda: os.getenv("CONVERSATION_MEMORY_ENABLED", "true").lower() == "true")
+    # Messages older than the recent history window are summarized once this many have accumulated
+    segment_messages: int = 10
+    # Upper bound for the summary, so the prompt size stays constant however long the conversation runs
+    max_summary_tokens: int = 300
+    # Conversations waiting for the summarizer; new requests are skipped (and retried next turn) when full
+    queue_size: int = 500
+
+
+class RecallSettings(BaseModel):
+    """Semantic recall of earlier conversation messages (see conversation_recall.py)."""
+
+    enabled: bool = Field(default_factory=lambda: os.getenv("CONVERSATION_RECALL_ENABLED", "true").lower() == "true")
+    # Time-partitioned vector table holding one embedding per message
+    table_name: str = "conversation_message_embeddings"
+    # Messages recalled per turn, picked from candidate_k nearest neighbours after recency weighting
+    top_k: int = 3
+    candidate_k: int = 12
+    # Similarity is halved for every half-life of age, so recent turns win close calls
+    recency_half_life_days: float = 30.0
+    # Only partitions within this window are searched
+    lookback_days: int = 365
+    # Short messages ("yes", "no") carry no meaning on their own and are not embedded
+    min_chars: int = 20
+    # Messages waiting to be embedded; new ones are skipped when full
+    queue_size: int = 1000
+
+
+class ToolExecutionSettings(BaseModel):
+    """Multi-tool execution per turn (see tool_executor.py)."""
+
+    # Independent tool calls of one decision run concurrently on this many threads
+    max_parallel_calls: int = 4
+    # Calls beyond this in one decision are not run (the reply says so)
+    max_calls_per_turn: int = 8
+
+
+class SubjectResolutionSettings(BaseModel):
+    """Resolving "the task/goal called X" to rows (see subject_resolver.py)."""
+
+    # In-process title index answering exact and prefix matches without a query
+    cache_enabled: bool = Field(default_factory=lambda: os.getenv("SUBJECT_CACHE_ENABLED", "true").lower() == "true")
+    # The index is reloaded after this long, picking up writes made by other processes
+    cache_ttl_s: float = 300.0
+    # Tables with more titles than this are not cached (queries go to the trigram index)
+    max_cached_titles: int = 200_000
+    # pg_trgm similarity at or above which a title counts as a fuzzy match
+    similarity_threshold: float = 0.3
+
+
+class GoalSuggestionSettings(BaseModel):
+    """Goals offered (or linked) for a new task by embedding similarity (see goal_suggestions.py)."""
+
+    enabled: bool = Field(default_factory=lambda: os.getenv("GOAL_SUGGESTIONS_ENABLED", "true").lower() == "true")
+    # Vector table with one embedding per goal
+    table_name: str = "goal_embeddings"
+    # Goals offered at most
+    top_k: int = 3
+    # Goals less similar than this to the task are not offered
+    min_similarity: float = 0.35
+    # A best match this similar is linked without asking
+    auto_link_threshold: float = 0.8
+    # Goal changes waiting to be embedded; new ones are skipped when full
+    queue_size: int = 500
+
+
+class TracingSettings(BaseModel):
+    """Per-request span trees (see tracing.py)."""
+
+    enabled: bool = Field(default_factory=lambda: os.getenv("TRACING_ENABLED", "false").lower() == "true")
+    # GET /debug/traces/{request_id} has no access control and shows SQL text: only mount it where that is fine
+    debug_endpoint: bool = Field(default_factory=lambda: os.getenv("TRACING_DEBUG_ENDPOINT", "false").lower() == "true")
+    # "none" (in memory only, for /debug/traces), "file" (OTLP/JSON lines) or "otlp" (POST to a collector)
+    exporter: str = Field(default_factory=lambda: os.getenv("TRACING_EXPORTER", "none"))
+    file_path: str = Field(default_factory=lambda: os.getenv("TRACING_FILE", "traces.jsonl"))
+    otlp_endpoint: str = Field(default_factory=lambda: os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "http://localhost:4318/v1/traces"))
+    service_name: str = Field(default_factory=lambda: os.getenv("OTEL_SERVICE_NAME", "voice-command-api"))
+    # Requests whose traces are kept in memory for /debug/traces
+    max_traces: int = 500
+    # Spans beyond this in one request are counted but not kept
+    max_spans_per_trace: int = 2000
+    # SQL statements are cut to this length in span attributes
+    sql_statement_chars: int = 500
+
+
 class Settings(BaseModel):
     """Main settings class combining all sub-settings."""
 
     openai: OpenAISettings = Field(default_factory=OpenAISettings)
+    llama: LlamaSettings = Field(default_factory=LlamaSettings)
+    routing: ProviderRoutingSettings = Field(default_factory=ProviderRoutingSettings)
     database: DatabaseSettings = Field(default_factory=DatabaseSettings)
     vector_store: VectorStoreSettings = Field(default_factory=VectorStoreSettings)
+    prompt_budget: PromptBudgetSettings = Field(default_factory=PromptBudgetSettings)
+    latency: LatencySettings = Field(default_factory=LatencySettings)
+    replay: ReplaySettings = Field(default_factory=ReplaySettings)
+    rate_limit: RateLimitSettings = Field(default_factory=RateLimitSettings)
+    session_state: SessionStateSettings = Field(default_factory=SessionStateSettings)
+    chat_persistence: ChatPersistenceSettings = Field(default_factory=ChatPersistenceSettings)
+    memory: MemorySettings = Field(default_factory=MemorySettings)
+    recall: RecallSettings = Field(default_factory=RecallSettings)
+    tool_execution: ToolExecutionSettings = Field(default_factory=ToolExecutionSettings)
+    subject_resolution: SubjectResolutionSettings = Field(default_factory=SubjectResolutionSettings)
+    goal_suggestions: GoalSuggestionSettings = Field(default_factory=GoalSuggestionSettings)
+    tracing: TracingSettings = Field(default_factory=TracingSettings)
+
+    def provider_for(self, call_site: str) -> str:
+        """Return the provider routed to a call site."""
+        return self.routing.call_site_providers.get(call_site, self.routing.default_provider)
 
 
 @lru_cache()
@@ -1,3 +1,27 @@
+from sqlalchemy import event, text
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
+
+
+def ensure_extensions(connection):
+    """Postgres extensions the indexes rely on (pg_trgm for the title trigram indexes)."""
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+@event.listens_for(Base.metadata, "before_create")
+def _create_extensions(metadata, connection, **kwargs):
+    ensure_extensions(connection)
+
+
+def ensure_indexes(engine):
+    """
+    Create indexes declared on models whose tables already exist
+    (create_all only adds indexes when it creates the table).
+    """
+    with engine.begin() as connection:
+        ensure_extensions(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,123 @@
+# app/database/pagination.py
+"""
+Keyset-paginated list queries with sorting and sparse fields.
+
+GET /tasks/ and GET /goals/ used to return every row, with every column,
+in no particular order. A KeysetListing describes how one model is listed:
+
+- sort: one sortable column, "-" prefixed for descending; ties are broken
+  by id, so the order is total and pages never overlap or skip rows.
+- cursor: opaque (base64 JSON) position of the last row of a page, i.e.
+  its sort value and id. The next page starts strictly after it, so the
+  cost of a page does not grow with how deep the client has paged, unlike
+  OFFSET. A cursor is only valid for the sort it was issued for.
+- fields: only the requested columns are selected (plus the id and the
+  sort column, which the cursor needs).
+
+Filters are plain SQLAlchemy conditions built by the caller. The listing
+only builds the statement and turns its rows into a page, so the same code
+serves sync and async sessions.
+
+Nullable sort columns (due dates) keep NULLs last in both directions. The
+other sort columns compare (value, id) as a row, which the (column, id)
+indexes serve directly.
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, and_, literal, or_, select, tuple_
+from sqlalchemy.sql import Select
+
+
+class KeysetListing:
+    """How one model is listed: its sortable columns and the fields a client may select."""
+
+    def __init__(self, model, fields: Sequence[str], sortable: Sequence[str], nullable_sorts: Sequence[str] = ()):
+        self.model = model
+        self.fields = list(fields)
+        self.sortable = list(sortable)
+        self.nullable_sorts = set(nullable_sorts)
+
+    def parse_sort(self, sort: str) -> Tuple[str, bool]:
+        """(column, descending) from "column" or "-column"; ValueError for a column that cannot be sorted on."""
+        descending = sort.startswith("-")
+        column = sort.lstrip("-")
+        if column not in self.sortable:
+            raise ValueError(f"Cannot sort by '{column}'; use one of: {', '.join(self.sortable)}")
+        return column, descending
+
+    def parse_fields(self, fields: Optional[str]) -> List[str]:
+        """The requested fields of a comma-separated list, all fields when none are given."""
+        if not fields:
+            return list(self.fields)
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}; available: {', '.join(self.fields)}")
+        return requested
+
+    # -- cursors --------------------------------------------------------------
+
+    def encode_cursor(self, sort: str, value: Any, row_id: uuid.UUID) -> str:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        raw = json.dumps({"sort": sort, "value": value, "id": str(row_id)})
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor: str, sort: str) -> Tuple[Any, uuid.UUID]:
+        """Inverse of encode_cursor; ValueError for a malformed cursor or one issued for another sort."""
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            value, row_id = position["value"], uuid.UUID(position["id"])
+        except Exception as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+        if position.get("sort") != sort:
+            raise ValueError(f"The cursor was issued for sort '{position.get('sort')}', not '{sort}'")
+        column, _ = self.parse_sort(sort)
+        if value is not None and isinstance(getattr(self.model, column).type, DateTime):
+            value = datetime.fromisoformat(value)
+        return value, row_id
+
+    # -- queries --------------------------------------------------------------
+
+    def statement(self, conditions: Iterable, sort: str, fields: Sequence[str], limit: int,
+                  cursor: Optional[str] = None) -> Select:
+        """One page of rows matching the conditions (one row more than limit, to know whether more follow)."""
+        column_name, descending = self.parse_sort(sort)
+        column, row_id = getattr(self.model, column_name), self.model.id
+        names = list(dict.fromkeys(["id", column_name, *fields]))
+        nullable = column_name in self.nullable_sorts
+
+        statement = select(*(getattr(self.model, name) for name in names)).where(*conditions)
+        if cursor:
+            value, last_id = self.decode_cursor(cursor, sort)
+            after = (lambda a, b: a < b) if descending else (lambda a, b: a > b)
+            if value is None:
+                # Already in the trailing NULLs
+                statement = statement.where(and_(column.is_(None), after(row_id, last_id)))
+            elif nullable:
+                statement = statement.where(or_(after(column, value), and_(column == value, after(row_id, last_id)),
+                                                column.is_(None)))
+            else:
+                # Typed like the columns: asyncpg does not cast a timezone-aware value to a plain TIMESTAMP
+                position = tuple_(literal(value, column.type), literal(last_id, row_id.type))
+                statement = statement.where(after(tuple_(column, row_id), position))
+
+        order = column.desc() if descending else column.asc()
+        if nullable:
+            order = order.nulls_last()
+        return statement.order_by(order, row_id.desc() if descending else row_id.asc()).limit(limit + 1)
+
+    def page(self, rows: Sequence, sort: str, fields: Sequence[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """The items of a page (requested fields only) and the cursor of the next page (None on the last)."""
+        column_name, _ = self.parse_sort(sort)
+        rows = list(rows)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]._mapping
+            next_cursor = self.encode_cursor(sort, last[column_name], last["id"])
+        return [{name: row._mapping[name] for name in fields} for row in rows], next_cursor
@@ -1,6 +1,28 @@
+# app/database/session.py
+"""
+Database engines and sessions.
+
+Two engines share the same database and pool settings (DatabaseSettings):
+
+- `engine` / `SessionLocal` (sync, psycopg): the agent, its tools, the
+  background workers and the scripts.
+- `async_engine` / `AsyncSessionLocal` (asyncpg): the CRUD routers (tasks,
+  goals, time_sessions, conversations). Their handlers are `async def`, so
+  a request waiting on the database no longer holds one of Starlette's
+  threadpool threads; under load the pool, not the threadpool, is the limit.
+  Sync helpers shared with the agent (e.g. insert_sql_tasks) run on the
+  async connection through AsyncSession.run_sync.
+
+The session events registered on Session (subject index, goal embeddings)
+fire for both, since an AsyncSession wraps a regular Session.
+"""
+from typing import Any, AsyncIterator, Dict
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from app.config.settings import get_settings  
+from app.config.settings import DatabaseSettings, get_settings
 
 settings = get_settings()
 DATABASE_URL = settings.database.service_url
@@ -9,9 +31,36 @@ DATABASE_URL = settings.database.service_url
 if DATABASE_URL and DATABASE_URL.startswith('postgres://'):
     DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
 
-engine = create_engine(DATABASE_URL, echo=False)
+
+def async_database_url(url: str) -> str:
+    """The same database through the asyncpg driver (asyncpg takes ssl= where libpq takes sslmode=)."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "postgresql":
+        return url
+    query = dict(parsed.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return parsed.set(drivername="postgresql+asyncpg", query=query).render_as_string(hide_password=False)
+
+
+def pool_options(database: DatabaseSettings) -> Dict[str, Any]:
+    """Connection pool arguments for create_engine / create_async_engine."""
+    return {
+        "pool_size": database.pool_size,
+        "max_overflow": database.max_overflow,
+        "pool_timeout": database.pool_timeout,
+        "pool_pre_ping": database.pool_pre_ping,
+        "pool_recycle": database.pool_recycle,
+    }
+
+
+engine = create_engine(DATABASE_URL, echo=False, **pool_options(settings.database))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(async_database_url(DATABASE_URL), echo=False, **pool_options(settings.database))
+# Objects stay loaded after commit: an expired attribute would need a lazy load, which async sessions cannot do
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Dependency generator for FastAPI
 # Provides a database session to path operation functions and ensures cleanup
 
@@ -22,3 +71,8 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Async counterpart of get_db, for `async def` handlers."""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,162 @@
+# app/database/unit_of_work.py
+"""
+Unit of work: one database session, on one connection, per agent turn.
+
+The tool functions (sql_task_tools.py, goal_tools.py) used to open a
+session each, and the old get_db() helpers closed it before returning it,
+so every query checked a connection out of the pool again. One turn
+(search, update, goal suggestions...) opened several sessions.
+
+agent_step now runs inside unit_of_work(): the first tool call opens a
+session bound to one pooled connection and every later call in the turn
+reuses it. Tools still commit their own writes; committing ends the
+transaction but keeps the connection. A tool call that fails rolls back,
+reads included, so that a failed statement does not leave the shared
+session in an aborted transaction for the next call. The session and the
+connection are released when the turn ends.
+
+The session is only shared with the thread that opened the unit of work.
+Calls made from worker threads (parallel tool calls, prefetched lookups)
+get a session of their own, as before: a Session must not be used by two
+threads at once, and a prefetch may still be running after the turn.
+
+Every unit of work counts the sessions opened and the SQL statements run
+under it. The counts are logged, set on its trace span, and summed up in
+unit_of_work_stats (GET /metrics/llm, "database").
+"""
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Marks sessions owned by a unit of work, which release_session() leaves open
+_OWNED = "unit_of_work"
+
+
+class UnitOfWork:
+    """The shared session of one turn and its session/statement counts."""
+
+    def __init__(self, bind: Optional[Engine] = None):
+        self._bind = bind
+        self._owner = threading.get_ident()
+        self._lock = threading.Lock()
+        self._connection: Optional[Connection] = None
+        self._session: Optional[Session] = None
+        self.closed = False
+        self.sessions = 0
+        self.statements = 0
+
+    @property
+    def bind(self) -> Engine:
+        if self._bind is None:
+            # Imported here so that importing this module does not create the engines
+            from app.database.session import engine
+            self._bind = engine
+        return self._bind
+
+    def session(self) -> Session:
+        """The turn's session in the thread that opened the unit of work, a new session elsewhere."""
+        if self.closed or threading.get_ident() != self._owner:
+            self.count(sessions=1)
+            return Session(bind=self.bind, autoflush=False)
+        if self._session is None:
+            self._connection = self.bind.connect()
+            self._session = Session(bind=self._connection, autoflush=False)
+            self._session.info[_OWNED] = True
+            self.count(sessions=1)
+        return self._session
+
+    def count(self, sessions: int = 0, statements: int = 0) -> None:
+        with self._lock:
+            self.sessions += sessions
+            self.statements += statements
+
+    def close(self) -> None:
+        self.closed = True
+        if self._session is not None:
+            # Uncommitted changes of a failed tool call are rolled back here
+            self._session.close()
+            self._connection.close()
+            self._session = self._connection = None
+
+
+class _UnitOfWorkStats:
+    """Running totals over all units of work."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"units": 0, "sessions": 0, "statements": 0, "max_sessions": 0, "max_statements": 0}
+
+    def record(self, uow: UnitOfWork) -> None:
+        with self._lock:
+            self._stats["units"] += 1
+            self._stats["sessions"] += uow.sessions
+            self._stats["statements"] += uow.statements
+            self._stats["max_sessions"] = max(self._stats["max_sessions"], uow.sessions)
+            self._stats["max_statements"] = max(self._stats["max_statements"], uow.statements)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            stats: Dict[str, float] = dict(self._stats)
+        units = stats["units"] or 1
+        stats["avg_sessions"] = round(stats["sessions"] / units, 2)
+        stats["avg_statements"] = round(stats["statements"] / units, 2)
+        return stats
+
+
+unit_of_work_stats = _UnitOfWorkStats()
+
+_current_uow: contextvars.ContextVar[Optional[UnitOfWork]] = contextvars.ContextVar("unit_of_work", default=None)
+
+
+@contextmanager
+def unit_of_work(name: str = "turn", bind: Optional[Engine] = None):
+    """Share one session across the enclosed block; nested calls join the outer unit of work."""
+    if _current_uow.get() is not None:
+        yield _current_uow.get()
+        return
+    uow = UnitOfWork(bind)
+    token = _current_uow.set(uow)
+    try:
+        with span(f"unit_of_work {name}") as uow_span:
+            try:
+                yield uow
+            finally:
+                uow.close()
+                uow_span.set_attribute("db.sessions", uow.sessions)
+                uow_span.set_attribute("db.statements", uow.statements)
+    finally:
+        _current_uow.reset(token)
+        unit_of_work_stats.record(uow)
+        logger.info(f"{name} used {uow.sessions} database session(s) and ran {uow.statements} statement(s)")
+
+
+def current_session() -> Session:
+    """The session for a tool call: the unit of work's when there is one, else a new session."""
+    uow = _current_uow.get()
+    if uow is None:
+        from app.database.session import SessionLocal
+        return SessionLocal()
+    return uow.session()
+
+
+def release_session(db: Session) -> None:
+    """End of a tool call: close its session unless the unit of work owns it."""
+    if not db.info.get(_OWNED):
+        db.close()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    uow = _current_uow.get()
+    if uow is not None:
+        uow.count(statements=1)
@@ -5,6 +5,12 @@ from datetime import datetime
 from fastapi import HTTPException
 import pandas as pd
 from app.config.settings import get_settings
+from app.services.latency_control import DeadlineExceeded, call_deadline, call_with_deadline
+from app.services.llm_cassette import get_cassette
+from app.services.llm_metrics import CallTimer, usage_counts
+from app.services.prompt_builder import count_tokens
+from app.services.rate_limiter import find_rate_limit_error, get_rate_limiter, retry_after_seconds
+from app.services.tracing import traced
 from openai import OpenAI
 from timescale_vector import client
 
@@ -12,15 +18,22 @@ from timescale_vector import client
 class VectorStore:
     """A class for managing vector operations and database interactions."""
 
-    def __init__(self):
-        """Initialize the VectorStore with settings, OpenAI client, and Timescale Vector client."""
+    def __init__(self, table_name: Optional[str] = None):
+        """
+        Initialize the VectorStore with settings, OpenAI client, and Timescale Vector client.
+
+        Args:
+            table_name: Vector table to use (default: VectorStoreSettings.table_name).
+                Every table is time-partitioned by the time encoded in its UUIDv1 ids.
+        """
         self.settings = get_settings()
         self.openai_client = OpenAI(api_key=self.settings.openai.api_key)
         self.embedding_model = self.settings.openai.embedding_model
         self.vector_settings = self.settings.vector_store
+        self.table_name = table_name or self.vector_settings.table_name
         self.vec_client = client.Sync(
             self.settings.database.service_url,
-            self.vector_settings.table_name,
+            self.table_name,
             self.vector_settings.embedding_dimensions,
             time_partition_interval=self.vector_settings.time_partition_interval,
         )
@@ -36,17 +49,44 @@ class VectorStore:
             A list of floats representing the embedding.
         """
         text = text.replace("\n", " ")
-        start_time = time.time()
-        embedding = (
-            self.openai_client.embeddings.create(
-                input=[text],
-                model=self.embedding_model,
-            )
-            .data[0]
-            .embedding
-        )
-        elapsed_time = time.time() - start_time
-        logging.info(f"Embedding generated in {elapsed_time:.3f} seconds")
+        # Bounded by the "embedding" deadline, including the wait for quota
+        deadline = call_deadline("embedding")
+        if deadline <= 0:
+            raise DeadlineExceeded("No time left in the turn for call site 'embedding'")
+
+        cassette = get_cassette()
+        if cassette is not None and cassette.mode == "replay":
+            with CallTimer("embedding", "replay", self.embedding_model):
+                return call_with_deadline(
+                    "embedding", lambda timeout: cassette.replay_embedding(self.embedding_model, text), deadline=deadline
+                )
+
+        # Embeddings draw from the same OpenAI quota as completions
+        limiter = get_rate_limiter()
+        started = time.monotonic()
+        reserved_tokens = limiter.acquire("openai", count_tokens(text), timeout=deadline)
+
+        # CallTimer records latency and token usage under the "embedding" call site
+        with CallTimer("embedding", "openai", self.embedding_model) as timer:
+            try:
+                # Only the request gets a hedged duplicate when slower than usual, so quota is taken once
+                response = call_with_deadline(
+                    "embedding",
+                    lambda timeout: self.openai_client.embeddings.create(
+                        input=[text], model=self.embedding_model, timeout=timeout
+                    ),
+                    deadline=max(0.1, deadline - (time.monotonic() - started)),
+                )
+            except Exception as e:
+                rate_limit_error = find_rate_limit_error(e)
+                if rate_limit_error is not None:
+                    limiter.on_rate_limited("openai", retry_after_seconds(rate_limit_error))
+                raise
+            timer.set_usage(response.usage)
+        limiter.settle("openai", reserved_tokens, usage_counts(response.usage)[0])
+        embedding = response.data[0].embedding
+        if cassette is not None and cassette.mode == "record":
+            cassette.record_embedding(self.embedding_model, text, embedding)
         return embedding
 
     def create_tables(self) -> None:
@@ -61,6 +101,7 @@ class VectorStore:
         """Drop the StreamingDiskANN index in the database"""
         self.vec_client.drop_embedding_index()
 
+    @traced("vector.upsert")
     def upsert(self, df: pd.DataFrame) -> None:
         """
         Insert or update records in the database from a pandas DataFrame.
@@ -73,7 +114,7 @@ class VectorStore:
         records = df.to_records(index=False)
         self.vec_client.upsert(list(records))
         logging.info(
-            f"Inserted {len(df)} records into {self.vector_settings.table_name}"
+            f"Inserted {len(df)} records into {self.table_name}"
         )
     
     def update(self, df: pd.DataFrame) -> None:
@@ -97,6 +138,7 @@ class VectorStore:
             logging.error(f"Database connection error: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
             
+    @traced("vector.search")
     def search(
         self,
         query_text: str,
@@ -201,6 +243,7 @@ class VectorStore:
 
         return df
 
+    @traced("vector.delete")
     def delete(
         self,
         ids: List[str] = None,
@@ -234,14 +277,14 @@ class VectorStore:
 
         if delete_all:
             self.vec_client.delete_all()
-            logging.info(f"Deleted all records from {self.vector_settings.table_name}")
+            logging.info(f"Deleted all records from {self.table_name}")
         elif ids:
             self.vec_client.delete_by_ids(ids)
             logging.info(
-                f"Deleted {len(ids)} records from {self.vector_settings.table_name}"
+                f"Deleted {len(ids)} records from {self.table_name}"
             )
         elif metadata_filter:
             self.vec_client.delete_by_metadata(metadata_filter)
             logging.info(
-                f"Deleted records matching metadata filter from {self.vector_settings.table_name}"
+                f"Deleted records matching metadata filter from {self.table_name}"
             )
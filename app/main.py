@@ -1,11 +1,16 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
-from app.routers import voice, tasks, goals, time_session
+from app.routers import voice, tasks, goals, time_session, metrics, chat, conversation, debug
+from app.services.llm_metrics import set_request_id, request_id_var
 from app.services.agent_flow import run_agent_flow
-from app.database.base import Base
-from app.database.session import engine
+from app.services.chat_persistence import flush_chat_writer
+from app.services.tracing import trace_http_request
+from app.config.settings import get_settings
+from app.database.base import Base, ensure_indexes
+from app.database.session import async_engine, engine
 from dotenv import load_dotenv
 import os
+import uuid
 
 load_dotenv()
 
@@ -13,12 +18,45 @@ app = FastAPI(title="Voice Command API")
 
 # Create the database tables
 Base.metadata.create_all(bind=engine)
+ensure_indexes(engine)
 
 # Include your API routers
 app.include_router(voice.router)
 app.include_router(tasks.router, prefix="/tasks", tags=["tasks"])  # Add tasks router
 app.include_router(goals.router, prefix="/goals", tags=["goals"]) # Add goals router
 app.include_router(time_session.router)  # Add time_sessions router
+app.include_router(metrics.router)  # Model call metrics (/metrics)
+app.include_router(chat.router, tags=["chat"])  # /chat and the streaming /chat/stream
+app.include_router(conversation.router, prefix="/conversations", tags=["conversations"])
+if get_settings().tracing.debug_endpoint:
+    app.include_router(debug.router)  # Request traces (/debug/traces/{request_id})
+
+@app.on_event("shutdown")
+def flush_chat_turns():
+    """Write chat turns still queued by the write-behind writer before the process exits."""
+    flush_chat_writer()
+
+@app.on_event("shutdown")
+async def close_database_pools():
+    """Close the async engine's pooled connections."""
+    await async_engine.dispose()
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """
+    Give every request an ID (reuse the caller's X-Request-ID if sent).
+    Model calls made while serving the request are recorded under this ID,
+    see GET /metrics/llm/requests/{request_id}, and (with tracing enabled)
+    its span tree is kept under the same ID, see GET /debug/traces/{request_id}.
+    """
+    request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+    token = set_request_id(request_id)
+    try:
+        response = await trace_http_request(request_id, request, call_next)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
 
 # Mount the static UI directory last so API routes are matched first
 # app.mount("/", StaticFiles(directory="static/ui/dist", html=True), name="ui")
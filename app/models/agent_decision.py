@@ -1,7 +1,7 @@
-from typing import Literal, Union, Optional
+from typing import List, Literal, Union, Optional
 from pydantic import BaseModel, Field
-from app.models.task_models import CreateTask, TaskList, TaskUpdate, TaskDelete
-from app.models.goal_models import GoalCreate, GoalOut, GoalDelete
+from app.models.task_models import CreateTask, CreateTasksBulk, TaskList, TaskUpdate, TaskDelete
+from app.models.goal_models import GoalCreate, GoalOut, GoalDelete, GoalUpdate
 
 class AgentDecision(BaseModel):
     """
@@ -19,7 +19,7 @@ class AgentDecision(BaseModel):
     }
     """
     tool_name: Literal[
-        "create_task", "search_tasks_by_subject", "list_tasks_by_date_range", 
+        "create_task", "create_tasks_bulk", "search_tasks_by_subject", "list_tasks_by_date_range", 
         "delete_task", "update_task", "get_task_service", "list_tasks_by_goal_id",
         # Add goal tools
         "create_goal", "get_goal", "update_goal", "delete_goal", "list_goals",
@@ -28,9 +28,26 @@ class AgentDecision(BaseModel):
         "list_sql_tasks", "search_sql_tasks_by_subject", "list_sql_tasks_by_date_range"
     ]
     
-    tool_input: Union[CreateTask, TaskList, TaskUpdate, TaskDelete, GoalCreate, GoalOut, GoalDelete]
+    tool_input: Union[CreateTask, CreateTasksBulk, TaskList, TaskUpdate, TaskDelete, GoalCreate, GoalUpdate, GoalOut, GoalDelete]
     
     time_context: Optional[dict] = Field(
         default=None,
         description="Parsed time context from user query"
     )
+
+    depends_on: List[int] = Field(
+        default_factory=list,
+        description="Indexes of earlier calls in the same request whose results this call needs"
+    )
+
+
+class AgentDecisionList(BaseModel):
+    """
+    Several tool calls decided from one request, e.g. "create tasks A and B and mark C done".
+    A call can use an earlier call's result by writing "$<index>.<field>" in a tool_input value,
+    e.g. "goal_id": "$0.id" to link a task to the goal created by call 0.
+    """
+    calls: List[AgentDecision] = Field(
+        min_length=1,
+        description="Tool calls in the order the user asked for them"
+    )
@@ -16,8 +16,9 @@ def get_db():
         db.close()
 
 class ChatRequest(BaseModel):
-    conversation_id: Optional[uuid.UUID] = Field(description="The ID of the conversation the message belongs to")
+    conversation_id: Optional[uuid.UUID] = Field(default=None, description="The ID of the conversation the message belongs to")
     user_message: str = Field(description="The message to be sent to the agent")
+    user_id: Optional[uuid.UUID] = Field(default=None, description="The ID of the user sending the message")
 
 class ChatResponse(BaseModel):
     conversation_id: uuid.UUID = Field(description="The ID of the conversation the message belongs to")
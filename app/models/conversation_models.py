@@ -1,15 +1,16 @@
 # app/models/conversation_model.py
 
 import uuid
-from sqlalchemy import Column, Text, DateTime
+from sqlalchemy import Column, Text, DateTime, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import String
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
+from typing import ClassVar, Optional, List, Dict
 from datetime import datetime
 from enum import Enum
+import json
 
 from app.database.base import Base  # or however you import your Base
 
@@ -18,16 +19,41 @@ class ConversationMessageDB(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     conversation_id = Column(UUID(as_uuid=True), nullable=False)
-    user_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), nullable=True)  # chat clients do not always identify the user
     role = Column(String, nullable=False)  # "user", "assistant", "system"
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # History windows and keyset pages are read by (conversation_id, created_at, id)
+    __table_args__ = (
+        Index("ix_conversation_messages_conversation_created", "conversation_id", "created_at", "id"),
+    )
+
+class ConversationContextDB(Base):
+    """Persisted ConversationContext of one conversation, updated incrementally each turn."""
+    __tablename__ = "conversation_contexts"
+
+    conversation_id = Column(UUID(as_uuid=True), primary_key=True)
+    context = Column(Text, nullable=False)  # ConversationContext.to_compact()
+    # created_at of the newest message already folded into the context
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ConversationSummaryDB(Base):
+    """Rolling summary of the older part of a conversation (long-term memory), written in the background."""
+    __tablename__ = "conversation_summaries"
+
+    conversation_id = Column(UUID(as_uuid=True), primary_key=True)
+    summary = Column(Text, nullable=False)
+    # created_at of the newest message folded into the summary
+    summarized_until = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class MessageCreate(BaseModel):
     role: str  = Field(description="The role of the message sender. Must be one of 'user', 'assistant', or 'system'")
     content: str = Field(description="The content of the message")
-    conversation_id: Optional[uuid.UUID] = Field(description="The ID of the conversation the message belongs to")
-    user_id: Optional[uuid.UUID] = Field(description="The ID of the user who sent the message")
+    conversation_id: Optional[uuid.UUID] = Field(default=None, description="The ID of the conversation the message belongs to")
+    user_id: Optional[uuid.UUID] = Field(default=None, description="The ID of the user who sent the message")
 
 class MessageOut(BaseModel):
     id: uuid.UUID = Field(description="The unique identifier for the message")
@@ -37,6 +63,10 @@ class MessageOut(BaseModel):
     created_at: datetime = Field(description="The date and time the message was created")
     user_id: Optional[uuid.UUID] = Field(description="The ID of the user who sent the message")
 
+class MessagePage(BaseModel):
+    messages: List[MessageOut] = Field(description="Messages of the page, oldest first")
+    next_cursor: Optional[str] = Field(default=None, description="Cursor for the next page (see list_messages_page); None when there are no older messages")
+
 class IntentType(str, Enum):
     DISCUSS = "discuss"  # General discussion or information gathering
     PLAN = "plan"       # Planning or strategizing
@@ -51,10 +81,27 @@ class DiscussionPoint(BaseModel):
 
 class ConversationContext(BaseModel):
     """Enhanced context tracking for conversations"""
+
+    # Ring buffer sizes: the context is persisted and updated every turn, so it must stay bounded
+    MAX_DISCUSSION_POINTS: ClassVar[int] = 50
+    MAX_TOPIC_DETAILS: ClassVar[int] = 20  # per topic
+    MAX_TOPICS: ClassVar[int] = 10
+
     current_topic: Optional[str] = Field(
         default=None,
         description="The current topic being discussed"
     )
+    # Loaded each turn from conversation_summaries, so it is not part of the stored context
+    summary: Optional[str] = Field(
+        default=None,
+        exclude=True,
+        description="Rolling summary of the conversation before the recent history window"
+    )
+    recalled: List[str] = Field(
+        default_factory=list,
+        exclude=True,
+        description="Earlier messages relevant to the current turn (semantic recall, loaded per turn)"
+    )
     current_step: Optional[str] = Field(
         default=None,
         description="The current step in a multi-step process"
@@ -84,13 +131,38 @@ class ConversationContext(BaseModel):
             self.last_intent = response.detected_intent.primary_intent
         if response.topic_details:
             for topic, details in response.topic_details.items():
-                if topic not in self.topic_details:
-                    self.topic_details[topic] = []
-                self.topic_details[topic].extend(details)
+                self.add_topic_details(topic, details)
+
+    def add_topic_details(self, topic: str, details: List[str]):
+        """Append details to a topic, keeping the newest MAX_TOPIC_DETAILS per topic and MAX_TOPICS topics"""
+        entries = self.topic_details.setdefault(topic, [])
+        entries.extend(details)
+        del entries[:-self.MAX_TOPIC_DETAILS]
+        # Evict the oldest topics (dicts keep insertion order), never the current one
+        for old_topic in list(self.topic_details):
+            if len(self.topic_details) <= self.MAX_TOPICS:
+                break
+            if old_topic != self.current_topic:
+                del self.topic_details[old_topic]
+
+    def to_compact(self) -> str:
+        """Compact JSON for storage (default values are left out)"""
+        return json.dumps(self.model_dump(mode="json", exclude_defaults=True), separators=(",", ":"))
+
+    @classmethod
+    def from_compact(cls, data: Optional[str]) -> "ConversationContext":
+        return cls.model_validate_json(data) if data else cls()
 
     def to_prompt(self) -> str:
         """Convert context to a prompt section"""
         context_parts = []
+
+        # Long-term memory: what was said before the recent messages
+        if self.summary:
+            context_parts.append(f"Earlier in this conversation:\n{self.summary}")
+        if self.recalled:
+            recalled = "\n".join(f"- {message}" for message in self.recalled)
+            context_parts.append(f"Relevant earlier messages:\n{recalled}")
         
         # Add current topic and its details
         if self.current_topic:
@@ -120,6 +192,13 @@ class ConversationContext(BaseModel):
         """Add a new discussion point"""
         point = DiscussionPoint(content=content, type=point_type, order=order)
         self.discussion_points.append(point)
+        del self.discussion_points[:-self.MAX_DISCUSSION_POINTS]
+
+class ConversationSummary(BaseModel):
+    """Rolling summary produced by the background summarizer"""
+    summary: str = Field(
+        description="Updated summary of the conversation so far: decisions, facts, open questions and commitments"
+    )
 
 class Intent(BaseModel):
     """Model for classifying user intent in conversations"""
@@ -1,15 +1,21 @@
 # app/models/goal_models.py
 import uuid
-from sqlalchemy import Column, Text, DateTime, Boolean
+from sqlalchemy import Column, Text, DateTime, Boolean, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from app.database.base import Base
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 class GoalDB(Base):
     __tablename__ = "goals"
+    __table_args__ = (
+        # Trigram index: serves ILIKE '%subject%' and similarity matches (see subject_resolver.py)
+        Index("ix_goals_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        # Keyset pages in creation order (see pagination.py)
+        Index("ix_goals_created_at_id", "created_at", "id"),
+    )
 
     id = Column(UUID, primary_key=True, default=uuid.uuid4)
     title = Column(Text, nullable=False)
@@ -34,8 +40,18 @@ class GoalOut(BaseModel):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+class GoalPage(BaseModel):
+    goals: List[Dict[str, Any]] = Field(description="Goals of the page, with the requested fields only")
+    next_cursor: Optional[str] = Field(default=None, description="Cursor for the next page (see pagination.py); None on the last page")
+
+class GoalUpdate(BaseModel):
+    id: Optional[uuid.UUID] = None
+    subject: Optional[str] = Field(default=None, description="Title (or part of it) of the goal to update")
+    title: Optional[str] = None
+    description: Optional[str] = None
+    completed: Optional[bool] = None
+    target_date: Optional[datetime] = None
+
 class GoalDelete(BaseModel):
     id: Optional[uuid.UUID] = None
     subject: Optional[str] = None
-
-
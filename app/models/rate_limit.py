@@ -0,0 +1,19 @@
+# app/models/rate_limit.py
+from sqlalchemy import Column, Float, Text
+
+from app.database.base import Base
+
+
+class RateLimitBucketDB(Base):
+    """
+    Shared state of one provider's rate limit buckets (used by the "postgres" rate limit backend).
+    Times are epoch seconds so every process reads the same clock.
+    """
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(Text, primary_key=True)  # provider name, e.g. "openai"
+    requests = Column(Float, nullable=False)  # requests left in the bucket
+    tokens = Column(Float, nullable=False)  # tokens left in the bucket (may go negative after reconciling usage)
+    updated_at = Column(Float, nullable=False)  # last refill
+    paused_until = Column(Float, nullable=False, default=0.0)  # set from 429 Retry-After
+    rate_factor = Column(Float, nullable=False, default=1.0)  # share of the nominal rate currently allowed
@@ -0,0 +1,16 @@
+# app/models/session_state.py
+from sqlalchemy import Column, Float, Text
+
+from app.database.base import Base
+
+
+class SessionStateDB(Base):
+    """
+    One value of a conversation's session state (used by the "postgres" session state backend).
+    Times are epoch seconds so every process reads the same clock.
+    """
+    __tablename__ = "session_state"
+
+    key = Column(Text, primary_key=True)  # "<session key>:<name>", e.g. "<conversation id>:pending_goal_link"
+    value = Column(Text, nullable=False)  # JSON
+    expires_at = Column(Float, nullable=False, index=True)
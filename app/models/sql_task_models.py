@@ -1,16 +1,24 @@
-from sqlalchemy import Column, Text, DateTime, Boolean, String, ForeignKey
+from sqlalchemy import Column, Text, DateTime, Boolean, String, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database.base import Base
 from pydantic import BaseModel, Field   
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 import uuid
 
 
 class TaskDB(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Trigram index: serves ILIKE '%subject%' and similarity matches (see subject_resolver.py)
+        Index("ix_tasks_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        # Keyset pages and recent tasks (ORDER BY created_at DESC, id DESC LIMIT n), see pagination.py
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+        Index("ix_tasks_due_date_id", "due_date", "id"),
+        Index("ix_tasks_goal_id", "goal_id"),
+    )
 
     id = Column(UUID, primary_key=True, default=uuid.uuid4)
     title = Column(Text, nullable=False)
@@ -30,6 +38,12 @@ class TaskCreateSQL(BaseModel):
     priority: Optional[str] = Field(description="Priority of the task")
     goal_id: Optional[uuid.UUID] = Field(description="ID of the associated goal", default=None)
 
+class TaskBulkItemSQL(TaskCreateSQL):
+    goal_title: Optional[str] = Field(description="Title (or part of it) of the goal to link, when goal_id is not known", default=None)
+
+class TaskBulkCreateSQL(BaseModel):
+    tasks: List[TaskBulkItemSQL] = Field(description="Tasks to create, inserted in one statement", min_length=1, max_length=200)
+
 class TaskOutSQL(BaseModel):
     id: uuid.UUID
     title: str
@@ -41,6 +55,10 @@ class TaskOutSQL(BaseModel):
     created_at: Optional[datetime] = Field(description="Creation date of the task")
     updated_at: Optional[datetime] = Field(description="Last update date of the task")
 
+class TaskPage(BaseModel):
+    tasks: List[Dict[str, Any]] = Field(description="Tasks of the page, with the requested fields only")
+    next_cursor: Optional[str] = Field(default=None, description="Cursor for the next page (see pagination.py); None on the last page")
+
 class TaskUpdateSQL(BaseModel):
     id: Optional[uuid.UUID] = Field(description="ID of the task to update")
     title: Optional[str] = Field(description="New title of the task")
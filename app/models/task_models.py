@@ -18,6 +18,9 @@ class TaskBase(BaseModel):
 class CreateTask(TaskBase):
     pass
 
+class CreateTasksBulk(BaseModel):
+    tasks: List[CreateTask] = Field(description="Tasks to create, e.g. one per step of a plan", min_length=1)
+
 class TaskOut(TaskBase):
     id: str = Field(description="Unique identifier for the task")
 class TaskList(BaseModel):
@@ -1,15 +1,32 @@
 # app/routers/chat.py
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import contextvars
+import json
+import logging
 import uuid
 
 from app.database.session import get_db
-from app.models.conversation_models import MessageCreate, MessageOut
-from app.services.tools.conversation_tools import create_message, list_messages_in_conversation
+from app.database.unit_of_work import unit_of_work
+from app.models.conversation_models import ConversationContext, MessageOut
+from app.services.tools.conversation_tools import recent_history
+from app.config.settings import get_settings
 from app.models.chat_models import ChatRequest, ChatResponse
+from app.services.agent import TURN_TIMEOUT_MESSAGE, handle_pending_goal_link
 from app.services.agent_coordinator import coordinate_agents
+from app.services.chat_persistence import ChatTurn, get_chat_writer, new_message
+from app.services.conversation_agent import stream_conversation
+from app.services.conversation_context import refresh_conversation_context, update_context_from_message
+from app.services.conversation_memory import load_summary, schedule_summary
+from app.services.conversation_recall import recall_for_turn, schedule_recall_index
+from app.services.decision_prefetch import prefetch_session
+from app.services.latency_control import DeadlineExceeded, turn_deadline
+from app.services.session_state import conversation_session
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -17,44 +34,157 @@ router = APIRouter()
 def chat_with_agent(req: ChatRequest, db: Session = Depends(get_db)):
     """
     Multi-turn conversation endpoint that:
-    1. Stores user message
-    2. Retrieves *all* past conversation messages
-    3. Calls coordinate_agents(...) to route to Alfred or Germain
-    4. Stores assistant message
-    5. Returns AI message + conversation_id
+    1. Loads the conversation context and the recent history window (PromptBudgetSettings.history_messages)
+    2. Calls coordinate_agents(...) to route to Alfred or Germain
+    3. Hands the user message, assistant message and updated context to the chat writer
+       (one transaction, or write-behind; see chat_persistence.py)
+    4. Returns AI message + conversation_id
     """
     # 1) If conversation_id is not provided, generate a new one
     convo_id = req.conversation_id or uuid.uuid4()
+    user_msg = new_message(convo_id, "user", req.user_message, req.user_id)
+    context, conversation_context = _load_turn(db, convo_id, user_msg)
+
+    # 2) Call coordinator to route to appropriate agent
+    agent_reply = coordinate_agents(conversation_context, context, session_key=str(convo_id))
 
-    # 2) Store this new user message in the DB
-    user_msg = MessageCreate(
+    # 3) Store the turn; the reply does not wait for it in write-behind mode
+    assistant_msg = new_message(convo_id, "assistant", agent_reply, req.user_id, after=user_msg)
+    get_chat_writer().persist(ChatTurn(conversation_id=convo_id, messages=[user_msg, assistant_msg], context=context))
+    # Older messages are summarized, and new ones embedded for recall, in the background
+    schedule_summary(convo_id)
+    schedule_recall_index([user_msg, assistant_msg])
+
+    # 4) Return the conversation_id and response
+    return ChatResponse(
         conversation_id=convo_id,
-        role="user",
-        content=req.user_message
+        ai_message=agent_reply
     )
-    create_message(db, user_msg)
 
-    # 3) Retrieve all messages for this conversation
-    all_msgs = list_messages_in_conversation(db, convo_id)
 
-    # 4) Build conversation context list
-    conversation_context = []
-    for msg in all_msgs:
-        conversation_context.append({"role": msg.role, "content": msg.content})
+def _load_turn(db: Session, convo_id: uuid.UUID, user_msg: MessageOut) -> Tuple[ConversationContext, List[Dict[str, str]]]:
+    """Conversation context and prompt history for a turn whose user message is not stored yet."""
+    # Earlier turns of this conversation may still be queued for writing
+    if not get_chat_writer().wait_for(convo_id, get_settings().chat_persistence.flush_timeout_s):
+        logger.warning(f"Reading conversation {convo_id} before its earlier turns were written")
+    # Stored context plus any messages added since the last turn (conversation_context.py)
+    context = refresh_conversation_context(db, convo_id)
+    # Long-term memory: summary of the messages before the recent window (conversation_memory.py)
+    if get_settings().memory.enabled:
+        context.summary = load_summary(db, convo_id)
+    user_turn = {"role": user_msg.role, "content": user_msg.content}
+    update_context_from_message(context, user_turn)
+    # Only the history the prompt builder uses; the newest message is this turn
+    history = recent_history(db, convo_id, max(get_settings().prompt_budget.history_messages - 1, 0))
+    history.append(user_turn)
+    # Specific earlier turns relevant to this message (conversation_recall.py)
+    context.recalled = recall_for_turn(convo_id, user_msg.content, history)
+    return context, history
 
-    # 5) Call coordinator to route to appropriate agent
-    agent_reply = coordinate_agents(conversation_context)
 
-    # 6) Store the assistant's response
-    assistant_msg = MessageCreate(
-        conversation_id=convo_id,
-        role="assistant",
-        content=agent_reply
-    )
-    create_message(db, assistant_msg)
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
-    # 7) Return the conversation_id and response
-    return ChatResponse(
-        conversation_id=convo_id,
-        ai_message=agent_reply
+
+def _stream_reply(convo_id: uuid.UUID, user_msg: MessageOut, conversation_context: list,
+                  context: Optional[ConversationContext] = None) -> Iterator[str]:
+    """
+    Produce the SSE stream for one turn and hand the turn (user and assistant messages, and the
+    updated conversation context when given) to the chat writer once it is complete.
+
+    The turn runs under the same scopes as coordinate_agents: one overall deadline, a prefetch
+    session, the conversation's session state and one unit of work.
+
+    If the client disconnects (or the model fails) mid-stream, the turn is still stored with the
+    words sent so far, or with the user message alone when nothing was sent.
+
+    Events:
+    - "delta": {"text": ...} new words of Alfred's answer
+    - "final": {"conversation_id", "ai_message", "suggested_actions", "detected_intent", "requires_confirmation"}
+    """
+    # StreamingResponse runs each step of a sync generator in a new copy of the context, and the
+    # turn's scopes are context variables, so every step of the turn runs in this one context
+    turn = contextvars.copy_context()
+    steps = _stream_turn(convo_id, user_msg, conversation_context, context)
+    try:
+        while True:
+            try:
+                chunk = turn.run(next, steps)
+            except StopIteration:
+                return
+            yield chunk
+    finally:
+        turn.run(steps.close)
+
+
+def _stream_turn(convo_id: uuid.UUID, user_msg: MessageOut, conversation_context: list,
+                 context: Optional[ConversationContext]) -> Iterator[str]:
+    user_query = conversation_context[-1]["content"]
+    final: Dict[str, Any] = {"conversation_id": convo_id, "suggested_actions": None,
+                             "detected_intent": None, "requires_confirmation": False}
+    sent: List[str] = []
+
+    with turn_deadline(), prefetch_session(), conversation_session(str(convo_id)), unit_of_work("chat_stream"):
+        try:
+            # An answer to Germain's "link it to a goal?" question goes to Germain, as in coordinate_agents
+            goal_link_reply = handle_pending_goal_link(conversation_context)
+            if goal_link_reply is not None:
+                final["ai_message"] = f"Germain: {goal_link_reply}"
+            elif "germain" in user_query.lower():
+                # Actions are not streamed: the reply is only known once the tool has run
+                final["ai_message"] = coordinate_agents(conversation_context, context, session_key=str(convo_id))
+            else:
+                for event in stream_conversation(conversation_context, context):
+                    if event["event"] == "delta":
+                        sent.append(event["text"])
+                        yield _sse("delta", {"text": event["text"]})
+                        continue
+                    final["ai_message"] = f"Alfred: {event['message']}"
+                    completion = event["completion"]
+                    if completion is not None:
+                        final["suggested_actions"] = completion.suggested_actions
+                        final["detected_intent"] = completion.detected_intent.model_dump(mode="json")
+                        final["requires_confirmation"] = completion.requires_confirmation
+        except DeadlineExceeded as e:
+            logger.warning(f"Streamed turn ran out of time: {e}")
+            final["ai_message"] = f"Alfred: {''.join(sent)}" if sent else TURN_TIMEOUT_MESSAGE
+        finally:
+            # Also runs when the generator is closed because the client went away
+            reply = final.get("ai_message") or (f"Alfred: {''.join(sent)}" if sent else None)
+            _persist_streamed_turn(convo_id, user_msg, reply, context)
+
+    yield _sse("final", final)
+
+
+def _persist_streamed_turn(convo_id: uuid.UUID, user_msg: MessageOut, reply: Optional[str],
+                           context: Optional[ConversationContext]) -> None:
+    messages = [user_msg]
+    if reply is not None:
+        messages.append(new_message(convo_id, "assistant", reply, user_msg.user_id, after=user_msg))
+    try:
+        get_chat_writer().persist(ChatTurn(conversation_id=convo_id, messages=messages, context=context))
+        schedule_summary(convo_id)
+        schedule_recall_index(messages)
+    except Exception as e:
+        logger.error(f"Failed to store streamed chat turn: {e}")
+
+
+@router.post("/chat/stream")
+def stream_chat_with_agent(req: ChatRequest, db: Session = Depends(get_db)):
+    """
+    Streaming variant of /chat, as Server-Sent Events.
+
+    Alfred's answer is sent word by word ("delta" events) while the model is still writing it.
+    Structured fields (suggested actions, detected intent) follow in one "final" event, and the
+    turn is stored once the stream completes or is cut short.
+    """
+    convo_id = req.conversation_id or uuid.uuid4()
+    user_msg = new_message(convo_id, "user", req.user_message, req.user_id)
+    context, conversation_context = _load_turn(db, convo_id, user_msg)
+
+    return StreamingResponse(
+        _stream_reply(convo_id, user_msg, conversation_context, context),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -1,46 +1,59 @@
 # app/routers/conversations.py
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import uuid
 
-from app.database.session import SessionLocal
-from app.services.tools.conversation_tools import create_message, list_messages_in_conversation
-from app.models.conversation_models import MessageCreate, MessageOut
+from app.database.session import get_async_db
+from app.services.tools.conversation_tools import create_message, list_messages_in_conversation, list_messages_page
+from app.models.conversation_models import MessageCreate, MessageOut, MessagePage
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/messages", response_model=MessageOut)
-def add_conversation_message(
+async def add_conversation_message(
     msg_in: MessageCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Add a new message to a conversation. 
     If no conversation_id is provided, starts a new conversation_id.
     """
     try:
-        return create_message(db, msg_in)
+        return await db.run_sync(create_message, msg_in)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{conversation_id}/messages", response_model=List[MessageOut])
-def get_conversation_messages(
+async def get_conversation_messages(
     conversation_id: uuid.UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Return all messages in the specified conversation.
     """
     try:
-        return list_messages_in_conversation(db, conversation_id)
+        return await db.run_sync(list_messages_in_conversation, conversation_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{conversation_id}/messages/page", response_model=MessagePage)
+async def get_conversation_messages_page(
+    conversation_id: uuid.UUID,
+    limit: int = Query(50, ge=1, le=200),
+    after: Optional[str] = Query(None, description="Return messages newer than this cursor"),
+    before: Optional[str] = Query(None, description="Return messages older than this cursor"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Keyset-paginated messages of a conversation, oldest first.
+    Without a cursor, returns the latest `limit` messages; page back with `before=next_cursor`,
+    or fetch new messages since a position with `after`.
+    """
+    if after and before:
+        raise HTTPException(status_code=400, detail="Pass either 'after' or 'before', not both")
+    try:
+        return await db.run_sync(list_messages_page, conversation_id, limit=limit, after=after, before=before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,28 @@
+# app/routers/debug.py
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.services.tracing import render_waterfall, trace_store, waterfall
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+@router.get("/traces/{request_id}")
+def request_trace(request_id: str, format: str = "json"):
+    """
+    The span tree of one HTTP request (see the X-Request-ID response header) as a
+    waterfall: every span with its depth, offset from the start of the request
+    and duration. ?format=text renders it as a plain text timeline.
+    """
+    trace = trace_store.get(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"No trace recorded for request {request_id}")
+    rows = waterfall(trace)
+    if format == "text":
+        return PlainTextResponse(render_waterfall(rows))
+    return {
+        "request_id": trace.request_id,
+        "trace_id": trace.trace_id,
+        "duration_ms": max((row["start_ms"] + row["duration_ms"] for row in rows), default=0.0),
+        "dropped_spans": trace.dropped,
+        "spans": rows,
+    }
@@ -1,21 +1,28 @@
 # app/routers/goals.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.database.session import SessionLocal
-from app.models.goal_models import GoalDB, GoalCreate, GoalOut
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
+import uuid
+from app.database.pagination import KeysetListing
+from app.database.session import get_async_db
+from app.models.goal_models import GoalDB, GoalCreate, GoalOut, GoalPage
+# Registers the session events that keep goal embeddings in step with committed goal writes
+import app.services.goal_suggestions  # noqa: F401
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+GOAL_LISTING = KeysetListing(GoalDB, fields=GoalOut.model_fields, sortable=["created_at", "target_date", "title"],
+                             nullable_sorts=["target_date"])
+
+async def get_goal_or_404(db: AsyncSession, goal_id: uuid.UUID) -> GoalDB:
+    goal = await db.get(GoalDB, goal_id)
+    if not goal:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    return goal
 
 @router.post("/", response_model=GoalOut)
-def create_goal(goal_data: GoalCreate, db: Session = Depends(get_db)):
+async def create_goal(goal_data: GoalCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new goal in the 'goals' table.
     """
@@ -26,44 +33,60 @@ def create_goal(goal_data: GoalCreate, db: Session = Depends(get_db)):
         target_date=goal_data.target_date
     )
     db.add(new_goal)
-    db.commit()
-    db.refresh(new_goal)
+    await db.commit()
+    await db.refresh(new_goal)
     return new_goal
 
 
-@router.get("/", response_model=List[GoalOut])
-def list_goals(db: Session = Depends(get_db)):
+@router.get("/", response_model=GoalPage)
+async def list_goals(
+    completed: Optional[bool] = None,
+    target_after: Optional[datetime] = Query(None, description="Only goals with a target date at or after this time"),
+    target_before: Optional[datetime] = Query(None, description="Only goals with a target date before this time"),
+    sort: str = Query("-created_at", description="created_at, target_date or title; prefix with - for descending"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title (default: all)"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    List all goals.
+    One page of goals, filtered and sorted in the database (keyset pagination, see pagination.py).
+    Follow next_cursor, with the same filters and sort, for the next page.
     """
-    goals = db.query(GoalDB).all()
-    return goals
+    conditions = []
+    if completed is not None:
+        conditions.append(GoalDB.completed == completed)
+    if target_after is not None:
+        conditions.append(GoalDB.target_date >= target_after)
+    if target_before is not None:
+        conditions.append(GoalDB.target_date < target_before)
+    try:
+        selected = GOAL_LISTING.parse_fields(fields)
+        statement = GOAL_LISTING.statement(conditions, sort, selected, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.execute(statement)).all()
+    goals, next_cursor = GOAL_LISTING.page(rows, sort, selected, limit)
+    return GoalPage(goals=goals, next_cursor=next_cursor)
 
 
 @router.get("/{goal_id}", response_model=GoalOut)
-def get_goal(goal_id: str, db: Session = Depends(get_db)):
-    goal = db.query(GoalDB).get(goal_id)
-    if not goal:
-        raise HTTPException(status_code=404, detail="Goal not found")
-    return goal
+async def get_goal(goal_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
+    return await get_goal_or_404(db, goal_id)
 
 @router.delete("/{goal_id}")
-def delete_goal(goal_id: str, db: Session = Depends(get_db)):
-    goal = db.query(GoalDB).get(goal_id)
-    if not goal:
-        raise HTTPException(status_code=404, detail="Goal not found")
-    db.delete(goal)
-    db.commit()
+async def delete_goal(goal_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
+    goal = await get_goal_or_404(db, goal_id)
+    await db.delete(goal)
+    await db.commit()
     return {"message": f"Goal {goal_id} deleted."}
 
 @router.patch("/{goal_id}", response_model=GoalOut)
-def update_goal(goal_id: str, updates: GoalCreate, db: Session = Depends(get_db)):
+async def update_goal(goal_id: uuid.UUID, updates: GoalCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Partial update: any field in GoalCreate can be used to update the existing record.
     """
-    goal = db.query(GoalDB).get(goal_id)
-    if not goal:
-        raise HTTPException(status_code=404, detail="Goal not found")
+    goal = await get_goal_or_404(db, goal_id)
 
     if updates.title is not None:
         goal.title = updates.title
@@ -74,6 +97,6 @@ def update_goal(goal_id: str, updates: GoalCreate, db: Session = Depends(get_db)
     if updates.target_date is not None:
         goal.target_date = updates.target_date
 
-    db.commit()
-    db.refresh(goal)
+    await db.commit()
+    await db.refresh(goal)
     return goal
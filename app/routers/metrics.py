@@ -0,0 +1,44 @@
+# app/routers/metrics.py
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import List
+
+from app.services.llm_metrics import llm_metrics, LLMCallRecord
+from app.services.prompt_builder import get_prompt_token_stats
+from app.services.decision_prefetch import prefetch_stats
+from app.database.unit_of_work import unit_of_work_stats
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@router.get("", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """
+    Model call histograms (latency, time to first token, tokens) and counters
+    per call site, in the Prometheus text format.
+    """
+    return llm_metrics.prometheus_text()
+
+@router.get("/llm")
+def llm_call_summary():
+    """
+    JSON summary per call site: call/error/retry counts, latency and token
+    percentiles, plus prompt sizes and prompt-cache hit rate, and the
+    lookups started early from streamed decisions (hits and time saved), and
+    database sessions and statements per agent turn.
+    """
+    return {
+        "calls": llm_metrics.snapshot(),
+        "prompts": get_prompt_token_stats(),
+        "prefetch": prefetch_stats.snapshot(),
+        "database": unit_of_work_stats.snapshot(),
+    }
+
+@router.get("/llm/requests/{request_id}", response_model=List[LLMCallRecord])
+def llm_calls_for_request(request_id: str):
+    """
+    Every model call made while serving one HTTP request (see the X-Request-ID response header).
+    """
+    records = llm_metrics.calls_for_request(request_id)
+    if not records:
+        raise HTTPException(status_code=404, detail=f"No model calls recorded for request {request_id}")
+    return records
@@ -1,23 +1,29 @@
 # tasks.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import datetime
-from app.database.session import SessionLocal
-from app.models.sql_task_models import TaskDB, TaskCreateSQL, TaskOutSQL, TaskUpdateSQL
+from app.database.pagination import KeysetListing
+from app.database.session import get_async_db
+from app.models.sql_task_models import TaskDB, TaskCreateSQL, TaskOutSQL, TaskPage, TaskUpdateSQL, TaskBulkCreateSQL
+from app.services.tools.sql_task_tools import insert_sql_tasks
 import uuid
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# created_at is always set (server default), so only due_date sorts need NULL handling
+TASK_LISTING = KeysetListing(TaskDB, fields=TaskOutSQL.model_fields, sortable=["created_at", "due_date", "title"],
+                             nullable_sorts=["due_date"])
+
+async def get_task_or_404(db: AsyncSession, task_id: uuid.UUID) -> TaskDB:
+    task = await db.get(TaskDB, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
 
 @router.post("/", response_model=TaskOutSQL)
-def create_task(task_data: TaskCreateSQL, db: Session = Depends(get_db)):
+async def create_task(task_data: TaskCreateSQL, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new task in the 'tasks' table.
     """
@@ -30,54 +36,90 @@ def create_task(task_data: TaskCreateSQL, db: Session = Depends(get_db)):
         goal_id=task_data.goal_id
     )
     db.add(new_task)
-    db.commit()
-    db.refresh(new_task)
+    await db.commit()
+    await db.refresh(new_task)
     return new_task
 
-@router.get("/", response_model=List[TaskOutSQL])
-def list_tasks(db: Session = Depends(get_db)):
+@router.post("/bulk", response_model=List[TaskOutSQL])
+async def create_tasks_bulk(payload: TaskBulkCreateSQL, db: AsyncSession = Depends(get_async_db)):
+    """
+    Create many tasks in one transaction: a single multi-row INSERT ... RETURNING,
+    with every goal_id / goal_title resolved in one query. Nothing is created if a goal_id is unknown.
+    """
+    try:
+        created = await db.run_sync(insert_sql_tasks, payload.tasks)
+    except Exception:
+        await db.rollback()
+        raise
+    await db.commit()
+    return created
+
+@router.get("/", response_model=TaskPage)
+async def list_tasks(
+    completed: Optional[bool] = None,
+    goal_id: Optional[uuid.UUID] = None,
+    due_after: Optional[datetime] = Query(None, description="Only tasks due at or after this time"),
+    due_before: Optional[datetime] = Query(None, description="Only tasks due before this time"),
+    priority: Optional[List[str]] = Query(None, description="Only tasks with one of these priorities (repeatable)"),
+    sort: str = Query("-created_at", description="created_at, due_date or title; prefix with - for descending"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title (default: all)"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    List all tasks.
+    One page of tasks, filtered and sorted in the database (keyset pagination, see pagination.py).
+    Follow next_cursor, with the same filters and sort, for the next page.
     """
-    tasks = db.query(TaskDB).all()
-    return tasks
+    conditions = []
+    if completed is not None:
+        conditions.append(TaskDB.completed == completed)
+    if goal_id is not None:
+        conditions.append(TaskDB.goal_id == goal_id)
+    if due_after is not None:
+        conditions.append(TaskDB.due_date >= due_after)
+    if due_before is not None:
+        conditions.append(TaskDB.due_date < due_before)
+    if priority:
+        conditions.append(TaskDB.priority.in_(priority))
+    try:
+        selected = TASK_LISTING.parse_fields(fields)
+        statement = TASK_LISTING.statement(conditions, sort, selected, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.execute(statement)).all()
+    tasks, next_cursor = TASK_LISTING.page(rows, sort, selected, limit)
+    return TaskPage(tasks=tasks, next_cursor=next_cursor)
 
 @router.get("/goal/{goal_id}", response_model=List[TaskOutSQL])
-def list_tasks_by_goal(goal_id: str, db: Session = Depends(get_db)):
+async def list_tasks_by_goal(goal_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     List all tasks associated with a specific goal.
     """
     try:
         goal_uuid = uuid.UUID(goal_id)
-        tasks = db.query(TaskDB).filter(TaskDB.goal_id == goal_uuid).all()
-        return tasks
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid goal ID format")
+    tasks = await db.scalars(select(TaskDB).where(TaskDB.goal_id == goal_uuid))
+    return tasks.all()
 
 @router.get("/{task_id}", response_model=TaskOutSQL)
-def get_task(task_id: str, db: Session = Depends(get_db)):
-    task = db.query(TaskDB).get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return task
+async def get_task(task_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
+    return await get_task_or_404(db, task_id)
 
 @router.delete("/{task_id}")
-def delete_task(task_id: str, db: Session = Depends(get_db)):
-    task = db.query(TaskDB).get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    db.delete(task)
-    db.commit()
+async def delete_task(task_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
+    task = await get_task_or_404(db, task_id)
+    await db.delete(task)
+    await db.commit()
     return {"message": f"Task {task_id} deleted."}
 
 @router.patch("/{task_id}", response_model=TaskOutSQL)
-def update_task(task_id: str, updates: TaskUpdateSQL, db: Session = Depends(get_db)):
+async def update_task(task_id: uuid.UUID, updates: TaskUpdateSQL, db: AsyncSession = Depends(get_async_db)):
     """
     Partial update: any field in TaskUpdateSQL can be used to update the existing record.
     """
-    task = db.query(TaskDB).get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
+    task = await get_task_or_404(db, task_id)
 
     if updates.title is not None:
         task.title = updates.title
@@ -92,44 +134,39 @@ def update_task(task_id: str, updates: TaskUpdateSQL, db: Session = Depends(get_
     if updates.goal_id is not None:
         task.goal_id = updates.goal_id
 
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     return task
 
 @router.patch("/{task_id}/assign-goal/{goal_id}", response_model=TaskOutSQL)
-def assign_task_to_goal(task_id: str, goal_id: str, db: Session = Depends(get_db)):
+async def assign_task_to_goal(task_id: str, goal_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Assign a task to a specific goal.
     """
     try:
-        task = db.query(TaskDB).get(task_id)
-        if not task:
-            raise HTTPException(status_code=404, detail="Task not found")
-            
-        # Check if the goal exists
-        from app.models.goal_models import GoalDB
-        goal_uuid = uuid.UUID(goal_id)
-        goal = db.query(GoalDB).filter(GoalDB.id == goal_uuid).first()
-        if not goal:
-            raise HTTPException(status_code=404, detail="Goal not found")
-            
-        task.goal_id = goal_uuid
-        db.commit()
-        db.refresh(task)
-        return task
+        task_uuid, goal_uuid = uuid.UUID(task_id), uuid.UUID(goal_id)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid ID format")
+    task = await get_task_or_404(db, task_uuid)
+
+    # Check if the goal exists
+    from app.models.goal_models import GoalDB
+    goal = await db.get(GoalDB, goal_uuid)
+    if not goal:
+        raise HTTPException(status_code=404, detail="Goal not found")
+
+    task.goal_id = goal_uuid
+    await db.commit()
+    await db.refresh(task)
+    return task
 
 @router.patch("/{task_id}/remove-goal", response_model=TaskOutSQL)
-def remove_task_from_goal(task_id: str, db: Session = Depends(get_db)):
+async def remove_task_from_goal(task_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """
     Remove a task from its associated goal.
     """
-    task = db.query(TaskDB).get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-        
+    task = await get_task_or_404(db, task_id)
     task.goal_id = None
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     return task
\ No newline at end of file
@@ -1,17 +1,17 @@
 # app/routees/time_session.py
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session as DB
+from sqlalchemy.ext.asyncio import AsyncSession as DB
 from sqlalchemy import func # Import func for now()
 from uuid import UUID
 # Make sure timedelta is imported if needed for defaults/calcs
 from datetime import datetime, timezone, timedelta
 from app.models.time_session import TimeSessionDB, SessionStartIn, SessionStopIn, TimeSessionOut # SessionPauseIn might not be needed now
-from app.database.session import get_db
+from app.database.session import get_async_db
 
 router = APIRouter(prefix="/time_sessions", tags=["time_sessions"])
 
 @router.post("/", response_model=TimeSessionOut, status_code=201)
-def start_session(payload: SessionStartIn, db: DB = Depends(get_db)):
+async def start_session(payload: SessionStartIn, db: DB = Depends(get_async_db)):
     now = datetime.now(timezone.utc)
     sess = TimeSessionDB(
         task_id=payload.task_id,
@@ -23,13 +23,13 @@ def start_session(payload: SessionStartIn, db: DB = Depends(get_db)):
         # --- End Init ---
     )
     db.add(sess)
-    db.commit()
-    db.refresh(sess)
+    await db.commit()
+    await db.refresh(sess)
     return sess
 
 @router.patch("/{session_id}/pause", response_model=TimeSessionOut)
-def pause_session(session_id: UUID, db: DB = Depends(get_db)):
-    sess = db.get(TimeSessionDB, session_id)
+async def pause_session(session_id: UUID, db: DB = Depends(get_async_db)):
+    sess = await db.get(TimeSessionDB, session_id)
     if not sess:
         raise HTTPException(status_code=404, detail="Session not found")
     if sess.end_ts:
@@ -45,13 +45,13 @@ def pause_session(session_id: UUID, db: DB = Depends(get_db)):
     # Mark as paused by setting last_event_ts to None
     sess.last_event_ts = None
 
-    db.commit()
-    db.refresh(sess)
+    await db.commit()
+    await db.refresh(sess)
     return sess
 
 @router.patch("/{session_id}/resume", response_model=TimeSessionOut)
-def resume_session(session_id: UUID, db: DB = Depends(get_db)):
-    sess = db.get(TimeSessionDB, session_id)
+async def resume_session(session_id: UUID, db: DB = Depends(get_async_db)):
+    sess = await db.get(TimeSessionDB, session_id)
     if not sess:
         raise HTTPException(status_code=404, detail="Session not found")
     if sess.end_ts:
@@ -62,14 +62,14 @@ def resume_session(session_id: UUID, db: DB = Depends(get_db)):
     # Mark as running again by setting last_event_ts to now
     sess.last_event_ts = datetime.now(timezone.utc)
 
-    db.commit()
-    db.refresh(sess)
+    await db.commit()
+    await db.refresh(sess)
     return sess
 
 
 @router.patch("/{session_id}/stop", response_model=TimeSessionOut)
-def stop_session(session_id: UUID, payload: SessionStopIn, db: DB = Depends(get_db)):
-    sess = db.get(TimeSessionDB, session_id)
+async def stop_session(session_id: UUID, payload: SessionStopIn, db: DB = Depends(get_async_db)):
+    sess = await db.get(TimeSessionDB, session_id)
     if not sess:
         raise HTTPException(status_code=404, detail="Session not found")
     if sess.end_ts:
@@ -88,6 +88,6 @@ def stop_session(session_id: UUID, payload: SessionStopIn, db: DB = Depends(get_
     sess.duration = final_accumulated_duration # Set the final duration field
     sess.last_event_ts = None # Mark as no longer active
 
-    db.commit()
-    db.refresh(sess)
+    await db.commit()
+    await db.refresh(sess)
     return sess
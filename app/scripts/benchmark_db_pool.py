@@ -0,0 +1,138 @@
+"""
+Load benchmark for the database-backed routers.
+
+HTTP (default): sends GET requests to a running server with a fixed number
+of concurrent clients and prints throughput and latency percentiles. Run it
+against the server before and after a change (e.g. check out the previous
+commit, start uvicorn, run, then repeat on this one) with the same flags.
+
+    python -m app.scripts.benchmark_db_pool --url http://localhost:8000 --concurrency 100 --requests 5000
+
+--direct: no server. Runs the same query through the sync engine from a
+40-thread pool (what sync `def` handlers get from Starlette's threadpool)
+and through the async engine from coroutines, both with the pool settings
+in DatabaseSettings (DB_POOL_SIZE, DB_MAX_OVERFLOW, ...).
+
+    python -m app.scripts.benchmark_db_pool --direct --concurrency 100 --requests 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+# Default size of the threadpool that runs sync handlers (anyio's default limiter)
+THREADPOOL_SIZE = 40
+
+
+def report(label: str, latencies_ms: List[float], errors: int, elapsed_s: float) -> None:
+    done = len(latencies_ms)
+    if not done:
+        print(f"{label}: all {errors} requests failed")
+        return
+    quantiles = statistics.quantiles(latencies_ms, n=100) if done > 1 else latencies_ms * 99
+    print(
+        f"{label}: {done / elapsed_s:8.1f} req/s  p50 {quantiles[49]:7.1f} ms  "
+        f"p95 {quantiles[94]:7.1f} ms  p99 {quantiles[98]:7.1f} ms  errors {errors}"
+    )
+
+
+async def run_http(url: str, paths: List[str], concurrency: int, total: int) -> None:
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def client_loop(client: "httpx.AsyncClient") -> None:
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await client.get(paths[i % len(paths)])
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    report(f"HTTP {url} x{concurrency}", latencies, errors, elapsed)
+
+
+def run_sync_direct(concurrency: int, total: int) -> None:
+    from sqlalchemy import select
+
+    from app.database.session import SessionLocal
+    from app.models.sql_task_models import TaskDB
+
+    def one_request() -> float:
+        start = time.perf_counter()
+        with SessionLocal() as db:
+            db.scalars(select(TaskDB).limit(50)).all()
+        return (time.perf_counter() - start) * 1000
+
+    # More clients than threads queue for a thread, as requests do in front of sync handlers
+    with ThreadPoolExecutor(max_workers=min(concurrency, THREADPOOL_SIZE)) as pool:
+        start = time.perf_counter()
+        futures = [pool.submit(one_request) for _ in range(total)]
+        latencies, errors = [], 0
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+        elapsed = time.perf_counter() - start
+    report(f"sync engine, {THREADPOOL_SIZE} threads", latencies, errors, elapsed)
+
+
+async def run_async_direct(concurrency: int, total: int) -> None:
+    from sqlalchemy import select
+
+    from app.database.session import AsyncSessionLocal, async_engine
+    from app.models.sql_task_models import TaskDB
+
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def client_loop() -> None:
+        nonlocal errors
+        for _ in counter:
+            start = time.perf_counter()
+            try:
+                async with AsyncSessionLocal() as db:
+                    (await db.scalars(select(TaskDB).limit(50))).all()
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await async_engine.dispose()
+    report(f"async engine, x{concurrency}", latencies, errors, elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the running server")
+    parser.add_argument("--paths", nargs="+", default=["/tasks/", "/goals/"], help="Paths requested in turn")
+    parser.add_argument("--concurrency", type=int, default=100, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=5000, help="Total requests")
+    parser.add_argument("--direct", action="store_true", help="Compare the sync and async engines without a server")
+    args = parser.parse_args()
+
+    if args.direct:
+        run_sync_direct(args.concurrency, args.requests)
+        asyncio.run(run_async_direct(args.concurrency, args.requests))
+    else:
+        asyncio.run(run_http(args.url, args.paths, args.concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark subject resolution at 100k tasks.
+
+Offline (default): builds the in-process TitleIndex over synthetic titles and
+times exact and prefix lookups against a linear substring scan over the same
+titles (what "title ILIKE '%subject%'" does without an index).
+
+With --database: inserts the synthetic tasks into the configured database
+(one transaction, removed again at the end), then times the resolver's
+trigram query against the old unindexed ILIKE query and prints both plans.
+Run after the app has started once, so the pg_trgm index exists.
+
+    python -m app.scripts.benchmark_subject_resolution
+    python -m app.scripts.benchmark_subject_resolution --database --tasks 100000
+"""
+import argparse
+import random
+import time
+import uuid
+
+from app.services.subject_resolver import TitleIndex, normalize_title
+
+VERBS = ["Write", "Review", "Update", "Plan", "Fix", "Call", "Prepare", "Send", "Design", "Test"]
+OBJECTS = ["budget", "website", "report", "slides", "invoice", "roadmap", "newsletter", "backlog", "contract", "demo"]
+# Marks the benchmark rows so they can be removed afterwards
+MARKER = "subject-resolution-benchmark"
+
+
+def synthetic_titles(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [f"{rng.choice(VERBS)} {rng.choice(OBJECTS)} {i}" for i in range(count)]
+
+
+def time_per_call(fn, subjects, repeat: int = 3) -> float:
+    """Best average time per call over `repeat` runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for subject in subjects:
+            fn(subject)
+        best = min(best, (time.perf_counter() - start) / len(subjects))
+    return best * 1000
+
+
+def run_offline(titles, subjects) -> None:
+    start = time.perf_counter()
+    index = TitleIndex((uuid.uuid4(), title) for title in titles)
+    print(f"TitleIndex built over {len(index)} titles in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    keys = [normalize_title(title) for title in titles]
+    print(f"  exact lookup:   {time_per_call(lambda s: index.exact(s, 1), subjects):.4f} ms")
+    print(f"  prefix lookup:  {time_per_call(lambda s: index.prefix(s[:-2], 10), subjects):.4f} ms")
+    scan = lambda s: [k for k in keys if normalize_title(s) in k][:10]  # noqa: E731
+    print(f"  linear scan:    {time_per_call(scan, subjects[:20], repeat=1):.4f} ms")
+
+
+def run_database(titles, subjects) -> None:
+    from sqlalchemy import delete, func, select, text
+
+    from app.database.session import SessionLocal
+    from app.models.sql_task_models import TaskBulkItemSQL, TaskDB
+    from app.services.subject_resolver import get_subject_resolver
+    from app.services.tools.sql_task_tools import insert_sql_tasks
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        insert_sql_tasks(db, [
+            TaskBulkItemSQL(title=title, description=MARKER, due_date=None, priority=None) for title in titles
+        ])
+        db.commit()
+        print(f"Inserted {len(titles)} tasks in {time.perf_counter() - start:.1f} s")
+        db.execute(text("ANALYZE tasks"))
+
+        resolver = get_subject_resolver(TaskDB)
+        trigram = lambda s: resolver.resolve(db, s, 10, use_cache=False)  # noqa: E731
+        old = lambda s: db.execute(select(TaskDB.id).where(TaskDB.title.ilike(f"%{s}%")).limit(10)).all()  # noqa: E731
+        cached = lambda s: resolver.resolve(db, s, 10)  # noqa: E731
+        cached(subjects[0])  # load the index
+        fuzzy = [s.replace("e", "a", 1) for s in subjects[:20]]  # typos only the similarity match finds
+
+        print(f"  cached exact:          {time_per_call(cached, subjects):.3f} ms")
+        print(f"  trigram (ILIKE + %):   {time_per_call(trigram, subjects[:50]):.3f} ms")
+        print(f"  trigram, typo subject: {time_per_call(trigram, fuzzy):.3f} ms")
+        print(f"  old ILIKE:             {time_per_call(old, subjects[:50]):.3f} ms")
+
+        subject = subjects[0]
+        for label, query in [
+            ("trigram", select(TaskDB.id).where(TaskDB.title.ilike(f"%{subject}%"))
+                .order_by(func.similarity(TaskDB.title, subject).desc()).limit(10)),
+            ("old ILIKE", select(TaskDB.id).where(TaskDB.title.ilike(f"%{subject}%")).limit(10)),
+        ]:
+            compiled = query.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+            plan = db.execute(text(f"EXPLAIN ANALYZE {compiled}")).scalars().all()
+            print(f"\n{label} plan:\n  " + "\n  ".join(plan))
+    finally:
+        db.rollback()
+        db.execute(delete(TaskDB).where(TaskDB.description == MARKER))
+        db.commit()
+        db.close()
+        get_subject_resolver(TaskDB).invalidate()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=100_000, help="Number of synthetic tasks")
+    parser.add_argument("--lookups", type=int, default=200, help="Number of subjects looked up")
+    parser.add_argument("--database", action="store_true", help="Also benchmark against the configured database")
+    args = parser.parse_args()
+
+    titles = synthetic_titles(args.tasks)
+    subjects = random.Random(11).sample(titles, min(args.lookups, len(titles)))
+    run_offline(titles, subjects)
+    if args.database:
+        run_database(titles, subjects)
+
+
+if __name__ == "__main__":
+    main()
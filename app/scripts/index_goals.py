@@ -0,0 +1,25 @@
+"""
+Embed every goal into the goal suggestion index (GoalSuggestionSettings.table_name).
+
+New and changed goals are indexed automatically when their transaction
+commits; run this once for goals created before the index existed, or to
+rebuild it after changing the embedding model.
+
+    python -m app.scripts.index_goals
+"""
+from app.database.session import SessionLocal
+from app.models.goal_models import GoalDB
+from app.services.goal_suggestions import reindex_goals
+
+
+def main() -> None:
+    db = SessionLocal()
+    try:
+        count = reindex_goals(db.query(GoalDB).all())
+    finally:
+        db.close()
+    print(f"Indexed {count} goals")
+
+
+if __name__ == "__main__":
+    main()
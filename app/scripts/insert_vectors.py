@@ -2,6 +2,7 @@ from datetime import datetime
 
 import pandas as pd
 from app.database.vector_store import VectorStore
+from app.services.rate_limiter import CallPriority, call_priority
 from timescale_vector.client import uuid_from_time
 
 # Initialize VectorStore
@@ -31,7 +32,9 @@ def prepare_record(row):
         This is useful when your content already has an associated datetime.
     """
     content = f"Question: {row['question']}\nAnswer: {row['answer']}"
-    embedding = vec.get_embedding(content)
+    # Ingestion is batch work: it must not take quota from interactive chat and voice calls
+    with call_priority(CallPriority.BATCH):
+        embedding = vec.get_embedding(content)
     return pd.Series(
         {
             "id": str(uuid_from_time(datetime.now())),
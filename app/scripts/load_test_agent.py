@@ -0,0 +1,58 @@
+"""
+Offline load test of the agent pipeline.
+
+Runs many agent turns concurrently against a recorded cassette, so the
+numbers measure our own overhead (routing, prompt building, parsing, DB
+work) under load, with a synthetic and reproducible model latency.
+
+1. Record a cassette once with real providers:
+       LLM_REPLAY_MODE=record python -m app.scripts.load_test_agent --turns 5 --concurrency 1
+2. Replay it as often as needed, without network or API cost:
+       LLM_REPLAY_MODE=replay LLM_REPLAY_LATENCY_MS=800 python -m app.scripts.load_test_agent --turns 200 --concurrency 20
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.agent import agent_step
+from app.services.llm_metrics import Histogram, LATENCY_BUCKETS_MS, llm_metrics
+
+# Mix of discussion, query and action turns, cycled through by the workers
+SAMPLE_MESSAGES = [
+    "Let's talk about my goals for this quarter",
+    "What are my current tasks?",
+    "I want to plan the launch of the new website",
+    "Create a task called Review budget due Friday",
+    "List my tasks for next week",
+]
+
+
+def run_turn(index: int) -> float:
+    message = SAMPLE_MESSAGES[index % len(SAMPLE_MESSAGES)]
+    start = time.perf_counter()
+    agent_step([{"role": "user", "content": message}])
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=100, help="Total number of agent turns")
+    parser.add_argument("--concurrency", type=int, default=10, help="Turns running at the same time")
+    args = parser.parse_args()
+
+    turn_latency = Histogram(LATENCY_BUCKETS_MS)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for elapsed_ms in executor.map(run_turn, range(args.turns)):
+            turn_latency.observe(elapsed_ms)
+    total_s = time.perf_counter() - start
+
+    print(f"{args.turns} turns, concurrency {args.concurrency}: {args.turns / total_s:.1f} turns/s")
+    print(f"Turn latency (ms): {json.dumps(turn_latency.summary())}")
+    print("Per call site:")
+    print(json.dumps(llm_metrics.snapshot(), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
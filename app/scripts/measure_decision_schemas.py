@@ -0,0 +1,80 @@
+"""
+Compare the full AgentDecision schema with the narrowed per-family schemas.
+
+Always prints the schema size in tokens (offline). With --run, also sends
+sample action requests through parse_agent_decision twice, with narrowed
+schemas off and then on, and prints validation retries and prompt tokens
+for each run (use LLM_REPLAY_MODE=replay to run against a cassette).
+
+    python -m app.scripts.measure_decision_schemas
+    python -m app.scripts.measure_decision_schemas --run
+"""
+import argparse
+import json
+
+from app.config.settings import get_settings
+from app.models.agent_decision import AgentDecision
+from app.services.decision_schemas import NARROWED_DECISIONS
+from app.services.llm_metrics import llm_metrics
+from app.services.prompt_builder import count_tokens
+
+SAMPLE_QUERIES = [
+    "Create a task called Review budget due Friday",
+    "Update task Project X set priority to high",
+    "Mark my dentist appointment as completed",
+    "Delete the task Buy groceries",
+    "Show my tasks for next week",
+    "Create a goal called Run a marathon",
+    "Change the target date of my marathon goal to June",
+    "List my goals",
+]
+
+
+def schema_tokens(model) -> int:
+    return count_tokens(json.dumps(model.model_json_schema()))
+
+
+def decision_totals() -> dict:
+    stats = llm_metrics.snapshot().get("decision", {})
+    prompt = stats.get("prompt_tokens") or {"count": 0, "avg": None}
+    return {
+        "calls": stats.get("calls", 0),
+        "retries": stats.get("retries", 0),
+        "prompt_tokens": (prompt["avg"] or 0) * prompt["count"],
+    }
+
+
+def run_queries(narrow: bool) -> dict:
+    # Imported here so the schema comparison works without a database
+    from app.services.agent import parse_agent_decision
+
+    get_settings().prompt_budget.narrow_decision_schemas = narrow
+    before = decision_totals()
+    for query in SAMPLE_QUERIES:
+        try:
+            parse_agent_decision(query)
+        except Exception as e:
+            print(f"  failed: {query!r}: {e}")
+    after = decision_totals()
+    return {name: after[name] - before[name] for name in after}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--run", action="store_true", help="Also send the sample requests to the model")
+    args = parser.parse_args()
+
+    print(f"AgentDecision (full): {schema_tokens(AgentDecision)} schema tokens")
+    for family, model in NARROWED_DECISIONS.items():
+        print(f"  {family:<12} {model.__name__:<22} {schema_tokens(model)} schema tokens")
+
+    if args.run:
+        for narrow in (False, True):
+            totals = run_queries(narrow)
+            label = "narrowed" if narrow else "full"
+            print(f"{label:>8}: {totals['calls']} calls, {totals['retries']} retries, "
+                  f"{totals['prompt_tokens']:.0f} prompt tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,26 @@
 # app/services/agent.py
 import json
+from instructor.exceptions import InstructorRetryException
 from pydantic import ValidationError
-from app.models.agent_decision import AgentDecision
+from app.models.agent_decision import AgentDecision, AgentDecisionList
 from app.models.conversation_models import ConversationResponse, EnhancedConversationResponse, Intent, IntentType, ConversationContext
-from app.models.task_models import TaskUpdate
+from app.models.task_models import CreateTask, CreateTasksBulk, TaskDelete, TaskList, TaskUpdate
+from app.models.goal_models import GoalCreate, GoalDelete, GoalOut, GoalUpdate
 from app.services.llm_factory import LLMFactory
+from app.services.prompt_builder import PromptBuilder
+from app.services.latency_control import DeadlineExceeded, turn_deadline
+from app.services.decision_prefetch import current_prefetch_session, prefetch_session, prefetched
+from app.services.decision_schemas import decision_model_for, is_multi_action, to_agent_decision
+from app.services.prompt_templates import get_template
+from app.services.tool import TOOLS, ToolResult
+from app.services.tool_executor import aggregate_results, execute_tool_calls, in_multi_call
+from app.services.conversation_context import extract_context_from_messages
+from app.services.goal_suggestions import should_auto_link, suggest_goals
+from app.services.tracing import span, traced
+from app.services.session_state import PENDING_GOAL_LINK, conversation_session, get_session_store
 from app.config.settings import get_settings
-from app.services.tools.task_adapters import create_task, search_tasks_by_subject, get_task_service, update_task, list_tasks_by_date_range, delete_task, list_reccent_tasks
+from app.database.unit_of_work import unit_of_work
+from app.services.tools.task_adapters import create_task, create_tasks_bulk, search_tasks_by_subject, get_task_service, update_task, list_tasks_by_date_range, delete_task, list_reccent_tasks
 from app.services.tools.goal_tools import create_goal, get_goal, update_goal, delete_goal, list_goals, search_goals_by_subject
 from app.services.time_utils import TimeParser
 from typing import List, Dict, Optional
@@ -14,144 +28,44 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# Simple state storage for pending goal linking (replace with more robust session management if needed)
-pending_goal_link: Dict = {}
+# Reply used when a turn runs past its overall deadline
+TURN_TIMEOUT_MESSAGE = "Sorry, that took longer than expected. Could you try again in a moment?"
 
 
-def extract_context_from_messages(messages: List[Dict]) -> ConversationContext:
-    """Extract conversation context from message history"""
-    context = ConversationContext()
-    
-    # Analyze messages to build context
-    for msg in messages:
-        content = msg.get("content", "").lower()
-        
-        # Try to identify current topic and its details
-        if "algorithmic trading" in content:
-            context.current_topic = "algorithmic trading strategy"
-            # Extract details about algorithmic trading
-            if msg["role"] == "assistant":
-                lines = content.split("\n")
-                trading_details = []
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith(("•", "-", "*", "1.", "2.", "3.", "4.", "5.", "6.", "7.", "8.")):
-                        clean_point = line.strip("•-*123456789. ")
-                        if clean_point:
-                            trading_details.append(clean_point)
-                            context.add_discussion_point(clean_point, "strategy_step")
-                if trading_details:
-                    if "algorithmic trading strategy" not in context.topic_details:
-                        context.topic_details["algorithmic trading strategy"] = []
-                    context.topic_details["algorithmic trading strategy"].extend(trading_details)
-        
-        # Extract steps and discussion points
-        if msg["role"] == "assistant":
-            lines = content.split("\n")
-            current_type = "general"
-            for line in lines:
-                line = line.strip()
-                if "market research" in line.lower():
-                    current_type = "market_research"
-                elif "define objectives" in line.lower():
-                    current_type = "objectives"
-                elif "analyze data" in line.lower():
-                    current_type = "data_analysis"
-                elif "develop" in line.lower() and "strategy" in line.lower():
-                    current_type = "strategy_development"
-                elif "test" in line.lower():
-                    current_type = "testing"
-                elif "monitor" in line.lower():
-                    current_type = "monitoring"
-                
-                if line.startswith(("•", "-", "*", "1.", "2.", "3.", "4.", "5.", "6.", "7.", "8.")):
-                    clean_point = line.strip("•-*123456789. ")
-                    if clean_point:
-                        context.add_discussion_point(clean_point, current_type)
-    
-    return context
-
+@traced()
 def parse_agent_decision(user_query: str) -> AgentDecision:
     """
     Uses a zero-shot approach: instructs the LLM to produce JSON matching the AgentDecision schema.
     We assume that our LLM client automatically parses the output into an AgentDecision instance.
     """
     
-    provider = "openai"  # or "anthropic", "llama", etc.
-    factory = LLMFactory(provider=provider)
+    # Provider (hosted or local) is routed per call site, see ProviderRoutingSettings
+    factory = LLMFactory.for_call_site("decision")
     
     time_context = TimeParser.extract_time_context(user_query)
-    system_prompt = f"""
-    You are an AI that decides which tool to call for a user's request.
-    Current time context: {time_context.get('formatted_date', 'not specified')}
-    
-    TOOL SELECTION GUIDELINES:
-    TASK TOOLS:
-    - Use "create_task" for requests to create a new task
-    - Use "search_tasks_by_subject" for queries about finding tasks without changing them
-    - Use "update_task" for ANY request to change, modify, or update an existing task
-    - Use "delete_task" for requests to remove a task
-    - Use "list_tasks_by_date_range" for requests to see tasks within a time period
-    - Use "get_task_service" only when a specific task ID is mentioned
-   
-    When creating tasks:
-    1. Use explicit due dates from the query
-    2. Fall back to parsed time context when no date is specified
-    3. Set due_date to None only if no time references exist
-    
-    For updating tasks:
-    1. ALWAYS use "update_task" when the user mentions updating, changing, modifying, or setting a property
-    2. NEVER set "id" directly - use "subject" instead to specify which task to update 
-    3. Extract the task title/subject from the query (the part before "set", "change", "update", etc.)
-    4. Determine which specific fields to update based on the request
-    5. Set completed=true when the user wants to mark a task as done
-    
-    Example update requests:
-    - "Update Task Project X set priority to high" → update_task with {{ "subject": "Project X", "priority": "high" }}
-    - "Change the due date of my homework task to Friday" → update_task with {{ "subject": "homework", "due_date": "(Friday's date)" }}
-    - "Mark my dentist appointment as completed" → update_task with {{ "subject": "dentist appointment", "completed": true }}
-    
-    GOAL TOOLS:
-    - Use "create_goal" for requests to create a new goal
-    - Use "get_goal" for requests to get a specific goal
-    - Use "update_goal" for ANY request to change, modify, or update an existing goal
-    - Use "delete_goal" for requests to remove a goal
-    - Use "list_goals" for requests to see all goals
-
-    When creating goals:
-    1. Use explicit due dates from the query
-    2. Fall back to parsed time context when no date is specified
-    3. Set due_date to None only if no time references exist
-    
-    Example update requests:
-    - "Update Goal Project X set priority to high" → update_goal with {{ "subject": "Project X", "priority": "high" }}
-    - "Change the due date of my homework goal to Friday" → update_goal with {{ "subject": "homework", "due_date": "(Friday's date)" }}
-    - "Mark my dentist appointment as completed" → update_goal with {{ "subject": "dentist appointment", "completed": true }}
-    
-    
-    
-    
-
-
-    Return JSON with time_context included:
-    {{
-      "tool_name": "create_task" | "search_tasks_by_subject" | "get_task_service" | "list_tasks_by_date_range" | "delete_task" | "update_task",
-      "tool_input": appropriate fields, no extra keys,
-      "time_context": {time_context}
-    }}
-    Do not include any extra text or disclaimers.
-    """
     
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_query}
-    ]
+    # Static tool guide first (cacheable prefix), the per-request time context last
+    messages = (
+        PromptBuilder.from_template("decision")
+        .add_volatile("Current time context", time_context.get('formatted_date', 'not specified'))
+        .add_history([{"role": "user", "content": user_query}])
+        .build()
+    )
     
-    # Call the LLM using our factory and let it parse the output using our Pydantic model.
-    completion = factory.create_completion(
-        response_model=AgentDecision,
-        messages=messages
+    # Ask for the narrowed schema of the tool family picked from keywords (full AgentDecision if unclear)
+    response_model = (
+        decision_model_for(user_query) if get_settings().prompt_budget.narrow_decision_schemas else AgentDecision
     )
+    try:
+        completion = _request_decision(factory, response_model, messages)
+    except (InstructorRetryException, ValidationError) as e:
+        if response_model is AgentDecision:
+            raise
+        # The keyword guess was probably wrong: let the model choose among all tools
+        logger.warning(f"Narrowed decision {response_model.__name__} failed, retrying with the full schema: {e}")
+        completion = _request_decision(factory, AgentDecision, messages)
+    if response_model is not AgentDecision and isinstance(completion, response_model):
+        completion = to_agent_decision(completion)
     
     # If completion is already an AgentDecision, return it.
     if isinstance(completion, AgentDecision):
@@ -167,212 +81,329 @@ def parse_agent_decision(user_query: str) -> AgentDecision:
     except (json.JSONDecodeError, ValidationError) as e:
         raise ValueError(f"Invalid or incomplete JSON from LLM: {e}")
 
-def agent_execute(decision: AgentDecision) -> str:
-    if decision.tool_name == "create_task":
-        # Get time context from the decision
-        time_context = getattr(decision, 'time_context', None)
-        
-        # Merge time context into task creation
-        if time_context and 'formatted_date' in time_context:
-            if not decision.tool_input.due_date:
-                decision.tool_input.due_date = time_context['formatted_date']
-        
-        # Create the task first
-        new_task = create_task(decision.tool_input)
-        logger.info(f"Created task '{new_task.title}' with id {new_task.id}")
-
-        # Check if there are goals to potentially link
-        goals = list_goals()
-        if goals:
-            # Format the prompt message for the user
-            prompt_message = f"Created task '{new_task.title}'. Would you like to link it to a goal?\n"
-            goal_options = []
-            for i, goal in enumerate(goals, start=1):
-                goal_options.append(f"\n {i}. {goal.title}")
-            prompt_message += "\n".join(goal_options)
-            prompt_message += "\n\nPlease respond with the goal Title or 'No'."
-
-            # Store the necessary state for the next turn
-            # Ensure IDs are strings here if the models expect strings later
-            pending_goal_link['user_session'] = {
-                "task_id": str(new_task.id),
-                "task_title": new_task.title,
-                "goals": [{"id": str(g.id), "title": g.title} for g in goals]
-            }
-            logger.info(f"Stored pending goal link state for task {new_task.id}")
-            # Return the prompt message to the user
-            return prompt_message
-        else:
-            # No goals exist, just return the creation confirmation
-            logger.info("No goals found to link.")
-            return f"Created task '{new_task.title}' with due date {new_task.due_date}"
-
-    elif decision.tool_name == "search_tasks_by_subject":
-        tasks = search_tasks_by_subject(decision.tool_input.subject)
-        message = "Found the specified task."
-        if not tasks:
-            tasks = list_reccent_tasks()
-            message = "The specified task was not found. Here are the recent tasks:"
-        titles = ", ".join(t.title for t in tasks)
-        return f"{message} {len(tasks)} tasks: {titles}"
-    elif decision.tool_name == "get_task_service":
-        task = get_task_service(decision.tool_input.id)
-        return f"Task: {task.title}, due: {task.due_date}"
-    elif decision.tool_name == "list_tasks_by_date_range":
-        tasks = list_tasks_by_date_range(decision.tool_input.start_date, decision.tool_input.end_date)
-        if not tasks:
-            return "No tasks found."
-        titles = ", ".join(t.title for t in tasks)
-        return f"Found {len(tasks)} tasks: {titles}"
-    elif decision.tool_name == "delete_task":
-        # Ensure we have a subject
-        if not hasattr(decision.tool_input, "subject"):
-            return "Cannot delete task: No subject provided"
-        
+@traced()
+def parse_agent_decisions(user_query: str) -> List[AgentDecision]:
+    """
+    Decide every tool call a request asks for. Requests that look like several actions
+    (is_multi_action) get one AgentDecisionList call; anything else, or a failed list,
+    goes through parse_agent_decision as a single call.
+    """
+    if not is_multi_action(user_query):
+        return [parse_agent_decision(user_query)]
+
+    factory = LLMFactory.for_call_site("decision")
+    time_context = TimeParser.extract_time_context(user_query)
+    # Same static decision guide as single calls (shared cached prefix), plus the multi-call rules
+    messages = (
+        PromptBuilder.from_template("decision")
+        .add_system(get_template("decision_multi").instructions)
+        .add_volatile("Current time context", time_context.get('formatted_date', 'not specified'))
+        .add_history([{"role": "user", "content": user_query}])
+        .build()
+    )
+    try:
+        decisions = factory.create_completion(
+            response_model=AgentDecisionList,
+            messages=messages,
+            call_site="decision"
+        )
+    except (InstructorRetryException, ValidationError) as e:
+        logger.warning(f"Multi-call decision failed, falling back to a single call: {e}")
+        return [parse_agent_decision(user_query)]
+    for decision in decisions.calls:
+        decision.time_context = time_context
+    logger.info(f"Decided {len(decisions.calls)} tool calls: {[d.tool_name for d in decisions.calls]}")
+    return decisions.calls
+
+def _request_decision(factory: LLMFactory, response_model, messages: List[Dict[str, str]]):
+    session = current_prefetch_session()
+    if session is not None and get_settings().latency.stream_decision:
+        # Stream the decision and start the subject lookup as soon as tool_name and subject are decoded;
+        # agent_execute then picks the result up through prefetched(). The last item is the full decision.
+        completion = None
+        for completion in factory.stream_completion(
+            response_model=response_model,
+            messages=messages,
+            call_site="decision"
+        ):
+            session.observe(completion)
+        return completion
+    # Call the LLM using our factory and let it parse the output using our Pydantic model.
+    return factory.create_completion(
+        response_model=response_model,
+        messages=messages,
+        call_site="decision"
+    )
+
+# ---------------------------------------------------------------------------
+# Tools (registered in TOOLS, dispatched by tool_name; see app/services/tool.py)
+# ---------------------------------------------------------------------------
+
+@TOOLS.register("create_task", "Create a new task", CreateTask)
+def _create_task_tool(decision: AgentDecision) -> ToolResult:
+    # Get time context from the decision
+    time_context = getattr(decision, 'time_context', None)
+    
+    # Merge time context into task creation
+    if time_context and 'formatted_date' in time_context:
+        if not decision.tool_input.due_date:
+            decision.tool_input.due_date = time_context['formatted_date']
+    
+    # Create the task first
+    new_task = create_task(decision.tool_input)
+    logger.info(f"Created task '{new_task.title}' with id {new_task.id}")
+
+    # A task created for a goal needs no suggestion; several calls ask no follow-up (one question per turn)
+    if new_task.goal_id or in_multi_call():
+        return ToolResult(message=f"Created task '{new_task.title}' with due date {new_task.due_date}", data=new_task)
+
+    # Only the goals closest to the task are offered (see goal_suggestions.py)
+    goals = suggest_goals(new_task.title, new_task.description)
+    if should_auto_link(goals):
+        best = goals[0]
         try:
-            subject = decision.tool_input.subject
-            result = delete_task(subject)
-            return f"Found task {subject} and deleted it: {result.message}"
-        except ValueError as e:
-            return str(e)  # Return the "No task found" message
+            new_task = update_task(TaskUpdate(id=new_task.id, subject=new_task.title, goal_id=best.id))
+            logger.info(f"Auto-linked task {new_task.id} to goal {best.id} (similarity {best.similarity:.2f})")
+            return ToolResult(message=f"Created task '{new_task.title}' and linked it to goal '{best.title}'.", data=new_task)
         except Exception as e:
-            return f"Error deleting task: {str(e)}"
-    elif decision.tool_name == "update_task":
-        print(f"Decision: {decision}")
-        if hasattr(decision.tool_input, "subject") and decision.tool_input.subject:
-            subject = decision.tool_input.subject
-            tasks = search_tasks_by_subject(subject, limit=1)
-            if not tasks:
-                return f"No task found matching '{subject}'"
-            task_id = tasks[0].id
-            print(f"Task ID: {task_id}")
-            # Update the ID in the tool input
-            decision.tool_input.id = task_id
-        else:
-            return "Cannot update task: No subject provided"
+            # The goal may be gone since it was indexed: ask instead
+            logger.warning(f"Could not auto-link task {new_task.id} to goal {best.id}: {e}")
+
+    if goals:
+        # Format the prompt message for the user
+        prompt_message = f"Created task '{new_task.title}'. Would you like to link it to a goal?\n"
+        goal_options = []
+        for i, goal in enumerate(goals, start=1):
+            goal_options.append(f"\n {i}. {goal.title}")
+        prompt_message += "\n".join(goal_options)
+        prompt_message += "\n\nPlease respond with the goal Title or 'No'."
+
+        # Store the offered goals for the next turn (per conversation, see session_state.py)
+        get_session_store().set(PENDING_GOAL_LINK, {
+            "task_id": str(new_task.id),
+            "task_title": new_task.title,
+            "goals": [{"id": g.id, "title": g.title} for g in goals]
+        })
+        logger.info(f"Stored pending goal link state for task {new_task.id}")
+        # Return the prompt message to the user
+        return ToolResult(message=prompt_message, data=new_task)
+    else:
+        # No goal close to the task, just return the creation confirmation
+        logger.info("No goal close enough to suggest.")
+        return ToolResult(message=f"Created task '{new_task.title}' with due date {new_task.due_date}", data=new_task)
+
+
+@TOOLS.register("create_tasks_bulk", "Create several tasks in one transaction", CreateTasksBulk)
+def _create_tasks_bulk_tool(decision: AgentDecision) -> ToolResult:
+    time_context = getattr(decision, 'time_context', None)
+    tasks = decision.tool_input.tasks
+    if time_context and 'formatted_date' in time_context:
+        for task in tasks:
+            if not task.due_date:
+                task.due_date = time_context['formatted_date']
+
+    # No goal link follow-up here: the question is about a single task
+    created = create_tasks_bulk(tasks)
+    logger.info(f"Created {len(created)} tasks in bulk")
+    titles = "\n".join(f"- {t.title}" for t in created)
+    return ToolResult(message=f"Created {len(created)} tasks:\n{titles}", data=created)
+
+
+@TOOLS.register("search_tasks_by_subject", "Find tasks by subject", TaskList)
+def _search_tasks_tool(decision: AgentDecision) -> ToolResult:
+    tasks = prefetched(search_tasks_by_subject, decision.tool_input.subject)
+    message = "Found the specified task."
+    if not tasks:
+        tasks = list_reccent_tasks()
+        message = "The specified task was not found. Here are the recent tasks:"
+    titles = ", ".join(t.title for t in tasks)
+    return ToolResult(message=f"{message} {len(tasks)} tasks: {titles}", data=tasks[0] if tasks else None)
+
+
+@TOOLS.register("get_task_service", "Get a task by ID", TaskList)
+def _get_task_tool(decision: AgentDecision) -> ToolResult:
+    task = get_task_service(decision.tool_input.id)
+    return ToolResult(message=f"Task: {task.title}, due: {task.due_date}", data=task)
+
+
+@TOOLS.register("list_tasks_by_date_range", "List tasks due in a date range", TaskList)
+def _list_tasks_by_date_range_tool(decision: AgentDecision) -> ToolResult:
+    tasks = list_tasks_by_date_range(decision.tool_input.start_date, decision.tool_input.end_date)
+    if not tasks:
+        return ToolResult(message="No tasks found.")
+    titles = ", ".join(t.title for t in tasks)
+    return ToolResult(message=f"Found {len(tasks)} tasks: {titles}", data=tasks)
+
+
+@TOOLS.register("delete_task", "Delete a task by subject", TaskDelete)
+def _delete_task_tool(decision: AgentDecision) -> ToolResult:
+    # Ensure we have a subject
+    if not hasattr(decision.tool_input, "subject"):
+        return ToolResult(message="Cannot delete task: No subject provided", ok=False)
+    
+    try:
+        subject = decision.tool_input.subject
+        result = delete_task(subject)
+        return ToolResult(message=f"Found task {subject} and deleted it: {result.message}", data=result)
+    except ValueError as e:
+        return ToolResult(message=str(e), ok=False)  # Return the "No task found" message
+    except Exception as e:
+        return ToolResult(message=f"Error deleting task: {str(e)}", ok=False)
+
+
+@TOOLS.register("update_task", "Update a task found by subject", TaskUpdate)
+def _update_task_tool(decision: AgentDecision) -> ToolResult:
+    logger.info(f"Decision: {decision}")
+    if hasattr(decision.tool_input, "subject") and decision.tool_input.subject:
+        subject = decision.tool_input.subject
+        tasks = prefetched(search_tasks_by_subject, subject, limit=1)
+        if not tasks:
+            return ToolResult(message=f"No task found matching '{subject}'", ok=False)
+        task_id = tasks[0].id
+        # Update the ID in the tool input
+        decision.tool_input.id = task_id
+    else:
+        return ToolResult(message="Cannot update task: No subject provided", ok=False)
+    
+    try:
+        updated_task = update_task(decision.tool_input)
+        changes = []
+        if decision.tool_input.title is not None:
+            changes.append("title")
+        if decision.tool_input.description is not None:
+            changes.append("description")
+        if decision.tool_input.due_date is not None:
+            changes.append("due date")
+        if decision.tool_input.priority is not None:
+            changes.append("priority")
+        if decision.tool_input.completed is not None:
+            completion_status = "marked complete" if decision.tool_input.completed else "marked incomplete"
+            changes.append(completion_status)
         
-        try:
-            updated_task = update_task(decision.tool_input)
-            changes = []
-            if decision.tool_input.title is not None:
-                changes.append("title")
-            if decision.tool_input.description is not None:
-                changes.append("description")
-            if decision.tool_input.due_date is not None:
-                changes.append("due date")
-            if decision.tool_input.priority is not None:
-                changes.append("priority")
-            if decision.tool_input.completed is not None:
-                completion_status = "marked complete" if decision.tool_input.completed else "marked incomplete"
-                changes.append(completion_status)
-            
-            changes_text = ", ".join(changes)
-            return f"Updated task '{updated_task.title}' ({changes_text})"
-        except Exception as e:
-            return f"Error updating task: {str(e)}"
-            
-    elif decision.tool_name == "create_goal":
-        new_goal = create_goal(decision.tool_input)
-        return f"Created goal '{new_goal.title}'"
-    elif decision.tool_name == "get_goal":
-        goal = get_goal(decision.tool_input.id)
-        return f"Goal: {goal.title}, Description: {goal.description}, Completed: {goal.completed}"
-    elif decision.tool_name == "update_goal":
-        # Find goal by subject if provided
-        if hasattr(decision.tool_input, "subject") and decision.tool_input.subject:
-            subject = decision.tool_input.subject
-            goals = search_goals_by_subject(subject, limit=1)
-            if not goals:
-                return f"No goal found matching '{subject}'"
-            goal_id = goals[0].id
-            # Update the ID in the tool input
-            decision.tool_input.id = goal_id
+        changes_text = ", ".join(changes)
+        return ToolResult(message=f"Updated task '{updated_task.title}' ({changes_text})", data=updated_task)
+    except Exception as e:
+        return ToolResult(message=f"Error updating task: {str(e)}", ok=False)
+
+
+@TOOLS.register("create_goal", "Create a new goal", GoalCreate)
+def _create_goal_tool(decision: AgentDecision) -> ToolResult:
+    new_goal = create_goal(decision.tool_input)
+    return ToolResult(message=f"Created goal '{new_goal.title}'", data=new_goal)
+
+
+@TOOLS.register("get_goal", "Get a goal by ID", GoalOut)
+def _get_goal_tool(decision: AgentDecision) -> ToolResult:
+    goal = get_goal(decision.tool_input.id)
+    return ToolResult(message=f"Goal: {goal.title}, Description: {goal.description}, Completed: {goal.completed}", data=goal)
+
+
+@TOOLS.register("update_goal", "Update a goal found by subject", GoalUpdate)
+def _update_goal_tool(decision: AgentDecision) -> ToolResult:
+    # Find goal by subject if provided
+    if hasattr(decision.tool_input, "subject") and decision.tool_input.subject:
+        subject = decision.tool_input.subject
+        goals = prefetched(search_goals_by_subject, subject, limit=1)
+        if not goals:
+            return ToolResult(message=f"No goal found matching '{subject}'", ok=False)
+        goal_id = goals[0].id
+        # Update the ID in the tool input
+        decision.tool_input.id = goal_id
+    
+    try:
+        updated_goal = update_goal(decision.tool_input)
+        changes = []
+        if getattr(decision.tool_input, 'title', None) is not None:
+            changes.append("title")
+        if getattr(decision.tool_input, 'description', None) is not None:
+            changes.append("description")
+        if getattr(decision.tool_input, 'target_date', None) is not None:
+            changes.append("target date")
+        if getattr(decision.tool_input, 'completed', None) is not None:
+            completion_status = "marked complete" if decision.tool_input.completed else "marked incomplete"
+            changes.append(completion_status)
         
-        try:
-            updated_goal = update_goal(decision.tool_input)
-            changes = []
-            if getattr(decision.tool_input, 'title', None) is not None:
-                changes.append("title")
-            if getattr(decision.tool_input, 'description', None) is not None:
-                changes.append("description")
-            if getattr(decision.tool_input, 'target_date', None) is not None:
-                changes.append("target date")
-            if getattr(decision.tool_input, 'completed', None) is not None:
-                completion_status = "marked complete" if decision.tool_input.completed else "marked incomplete"
-                changes.append(completion_status)
-            
-            changes_text = ", ".join(changes)
-            return f"Updated goal '{updated_goal.title}' ({changes_text})"
-        except Exception as e:
-            return f"Error updating goal: {str(e)}"
-    elif decision.tool_name == "delete_goal":
-        # First check if we have a subject attribute instead of an id
-        if hasattr(decision.tool_input, "subject") and decision.tool_input.subject:
-            subject = decision.tool_input.subject
-            goals = search_goals_by_subject(subject, limit=1)
-            if not goals:
-                return f"No goal found matching '{subject}'"
-            goal_id = str(goals[0].id)
-        # If we have neither id nor subject, we can't proceed
-        elif not hasattr(decision.tool_input, "id") or decision.tool_input.id is None:
-            return "Cannot delete goal: No goal ID or subject provided"
-        else:
-            goal_id = decision.tool_input.id
-            
-        result = delete_goal(goal_id)
-        return f"Goal deleted: {result.message}"
-    elif decision.tool_name == "list_goals":
-        goals = list_goals()
+        changes_text = ", ".join(changes)
+        return ToolResult(message=f"Updated goal '{updated_goal.title}' ({changes_text})", data=updated_goal)
+    except Exception as e:
+        return ToolResult(message=f"Error updating goal: {str(e)}", ok=False)
+
+
+@TOOLS.register("delete_goal", "Delete a goal by subject or ID", GoalDelete)
+def _delete_goal_tool(decision: AgentDecision) -> ToolResult:
+    # First check if we have a subject attribute instead of an id
+    if hasattr(decision.tool_input, "subject") and decision.tool_input.subject:
+        subject = decision.tool_input.subject
+        goals = prefetched(search_goals_by_subject, subject, limit=1)
         if not goals:
-            return "You don't have any goals yet."
-        return f"Found {len(goals)} goals: {', '.join([goal.title for goal in goals])}"
+            return ToolResult(message=f"No goal found matching '{subject}'", ok=False)
+        goal_id = str(goals[0].id)
+    # If we have neither id nor subject, we can't proceed
+    elif not hasattr(decision.tool_input, "id") or decision.tool_input.id is None:
+        return ToolResult(message="Cannot delete goal: No goal ID or subject provided", ok=False)
     else:
-        return "Unknown tool. Be more specific with your request."
+        goal_id = decision.tool_input.id
+        
+    result = delete_goal(goal_id)
+    return ToolResult(message=f"Goal deleted: {result.message}", data=result)
+
+
+@TOOLS.register("list_goals", "List all goals")
+def _list_goals_tool(decision: AgentDecision) -> ToolResult:
+    goals = list_goals()
+    if not goals:
+        return ToolResult(message="You don't have any goals yet.")
+    return ToolResult(message=f"Found {len(goals)} goals: {', '.join([goal.title for goal in goals])}", data=goals)
+
+
+def run_tool(decision: AgentDecision) -> ToolResult:
+    """Run one decided tool call through the registry."""
+    tool = TOOLS.get(decision.tool_name)
+    if tool is None:
+        return ToolResult(message="Unknown tool. Be more specific with your request.", ok=False)
+    with span(f"tool {decision.tool_name}") as tool_span:
+        result = tool.func(decision)
+        tool_span.set_attribute("tool.ok", result.ok)
+        return result
+
+
+def agent_execute(decision: AgentDecision) -> str:
+    return run_tool(decision).message
+
+
+@traced()
+def agent_execute_all(decisions: List[AgentDecision]) -> str:
+    """Run every call of a decision (independent ones in parallel) and return one combined reply."""
+    limit = get_settings().tool_execution.max_calls_per_turn
+    results = execute_tool_calls(decisions[:limit], run_tool)
+    return aggregate_results(results, dropped=max(0, len(decisions) - limit))
 
+
+@traced()
 def classify_intent(user_query: str, conversation_messages: List[Dict], context: ConversationContext) -> Intent:
     """Classifies the user's intent using the LLM with context awareness"""
-    provider = "openai"
-    factory = LLMFactory(provider=provider)
-    
-    context_prompt = context.to_prompt()
-    
-    system_prompt = f"""
-    You are an intent classifier for a project management assistant.
-    
-    Current Conversation Context:
-    {context_prompt}
-    
-    INTENT GUIDELINES:
-    1. DISCUSS - User wants to talk about, explore, or understand something
-    2. PLAN - User wants to strategize, organize, or prepare something
-    3. ACTION - User explicitly wants to create, update, or delete something
-    4. QUERY - User wants to retrieve information
-    
-    Consider the conversation context when determining intent.
-    If discussing algorithmic trading strategy and user mentions tasks/steps,
-    classify as PLAN unless there's an explicit action command mentioning to Germain to do something.
+    factory = LLMFactory.for_call_site("intent")
     
-    Examples:
-    - "Let's talk about my goals" -> DISCUSS
-    - "I want to plan my tasks" -> PLAN
-    - "Tell Germain to create a new goal called Project X" -> ACTION
-    - "What are my current tasks?" -> QUERY
-    - "Let's set tasks for these steps" -> PLAN (when discussing strategy steps)
-    
-    Return the intent classification as JSON matching the Intent model.
-    """
-    
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_query}
-    ]
+    # Static classifier instructions first; the context section (volatile) comes last
+    # and is trimmed (oldest lines first) if the prompt goes over budget
+    messages = (
+        PromptBuilder.from_template("intent")
+        .add_context("Current Conversation Context", context.to_prompt())
+        .add_history([{"role": "user", "content": user_query}])
+        .build()
+    )
     
     try:
         completion = factory.create_completion(
             response_model=Intent,
-            messages=messages
+            messages=messages,
+            call_site="intent",
+            # Re-run low-confidence classifications on the larger model
+            escalate_if=lambda intent: intent.confidence < factory.settings.escalation_min_confidence
         )
         return completion
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error(f"Error in intent classification: {str(e)}")
         return Intent(
@@ -382,68 +413,101 @@ def classify_intent(user_query: str, conversation_messages: List[Dict], context:
             requires_confirmation=False
         )
 
-def agent_step(conversation_messages: List[Dict]) -> str:
+def agent_step(conversation_messages: List[Dict], context: Optional[ConversationContext] = None,
+               session_key: Optional[str] = None) -> str:
+    """
+    Run one agent turn. Pass the stored conversation context (conversation_context.py) to skip
+    rebuilding it from the whole history, and the conversation ID as session_key so follow-up
+    state (a pending goal link) is kept per conversation (session_state.py). All model calls in
+    the turn share one overall deadline (LatencySettings.turn_deadline_ms); if it runs out we
+    answer with a fallback.
+    Lookups started while the decision streams are scoped to the turn (decision_prefetch.py).
+    Tool calls in the turn share one database session (unit_of_work.py).
+    """
+    with turn_deadline(), prefetch_session(), conversation_session(session_key), span("agent_step"), \
+            unit_of_work("agent_step"):
+        try:
+            return _agent_step(conversation_messages, context)
+        except DeadlineExceeded as e:
+            logger.warning(f"Agent turn ran out of time: {e}")
+            return TURN_TIMEOUT_MESSAGE
+
+def handle_pending_goal_link(conversation_messages: List[Dict]) -> Optional[str]:
+    """
+    Answer to a pending "link the new task to a goal?" question (session_state.PENDING_GOAL_LINK),
+    or None when the conversation has no pending question. Called before anything else by every
+    chat entry point (agent_step, agent_coordinator.coordinate_agents and the /chat/stream
+    route), since the question may have been asked on any of them.
+    """
+    store = get_session_store()
+    state = store.get(PENDING_GOAL_LINK)
+    if state is None:
+        return None
+    # 1. Read the raw response
+    raw_user_response = conversation_messages[-1]["content"].strip()
+    # 2. Normalize the response (strip, remove trailing period, lowercase)
+    normalized_response = raw_user_response.rstrip('.').lower()
+    
+    task_id = state['task_id']
+    task_title = state['task_title']
+    goals = state['goals']
+    
+    logger.info(f"Handling raw response '{raw_user_response}' (normalized: '{normalized_response}') for pending goal link for task {task_id}")
+
+    # 3. Check the NORMALIZED response for 'no'
+    if normalized_response == 'no' or normalized_response == 'nope':
+        store.delete(PENDING_GOAL_LINK)
+        logger.info(f"User chose not to link goal for task {task_id}. State cleared.")
+        return f"Okay, task '{task_title}' created without linking a goal."
+    else:
+        # 4. If not 'no', treat the normalized response as the potential goal title
+        try:
+            goal_title = normalized_response # Already normalized
+
+            if goal_title in [goal['title'].lower() for goal in goals]:
+                #find the goal in the list of goals
+                selected_goal = next(goal for goal in goals if goal['title'].lower() == goal_title)
+                goal_id_to_link = selected_goal['id']
+                goal_title_to_link = selected_goal['title']
+                
+                task_update_payload = TaskUpdate(subject=task_title, id=task_id, goal_id=goal_id_to_link)
+                update_task(task_update_payload)
+                
+                store.delete(PENDING_GOAL_LINK)
+                logger.info(f"Successfully linked task {task_id} to goal {goal_id_to_link}. State cleared.")
+                return f"Linked task '{task_title}' to goal '{goal_title_to_link}'."
+            else:
+                logger.warning(f"Invalid goal title {goal_title} provided for task {task_id}.")
+                return f"Invalid goal title. Please choose a title from the list or say 'No'."
+        except ValueError:
+            # Add debug log INSIDE the exception handler
+            logger.warning(f"Could not parse goal title from response '{raw_user_response}'.")
+            # Re-prompt with the simplified instruction
+            # Construct the simplified prompt message again
+            prompt_message = f"Created task '{task_title}'. Would you like to link it to a goal?\n"
+            goal_options = []
+            for i, goal in enumerate(goals, start=1):
+                goal_options.append(f"{i}. {goal['title']}")
+            prompt_message += "\n".join(goal_options)
+            prompt_message += "\n\nPlease respond with the goal title or 'No'."
+            return f"Invalid response. {prompt_message}"
+        except Exception as e:
+            logger.error(f"Error linking goal for task {task_id}: {str(e)}", exc_info=True)
+            # Clear state on unexpected error to prevent loop
+            store.delete(PENDING_GOAL_LINK)
+            return f"An error occurred while linking the goal: {str(e)}"
+
+def _agent_step(conversation_messages: List[Dict], context: Optional[ConversationContext] = None) -> str:
     # Check for pending goal linking state first
-    if 'user_session' in pending_goal_link:
-        state = pending_goal_link['user_session']
-        # 1. Read the raw response
-        raw_user_response = conversation_messages[-1]["content"].strip()
-        # 2. Normalize the response (strip, remove trailing period, lowercase)
-        normalized_response = raw_user_response.rstrip('.').lower()
-        
-        task_id = state['task_id']
-        task_title = state['task_title']
-        goals = state['goals']
-        
-        logger.info(f"Handling raw response '{raw_user_response}' (normalized: '{normalized_response}') for pending goal link for task {task_id}")
-
-        # 3. Check the NORMALIZED response for 'no'
-        if normalized_response == 'no' or normalized_response == 'nope':
-            del pending_goal_link['user_session']
-            logger.info(f"User chose not to link goal for task {task_id}. State cleared.")
-            return f"Okay, task '{task_title}' created without linking a goal."
-        else:
-            # 4. If not 'no', treat the normalized response as the potential goal title
-            try:
-                goal_title = normalized_response # Already normalized
-
-                if goal_title in [goal['title'].lower() for goal in goals]:
-                    #find the goal in the list of goals
-                    selected_goal = next(goal for goal in goals if goal['title'].lower() == goal_title)
-                    goal_id_to_link = selected_goal['id']
-                    goal_title_to_link = selected_goal['title']
-                    
-                    task_update_payload = TaskUpdate(subject=task_title, id=task_id, goal_id=goal_id_to_link)
-                    update_task(task_update_payload)
-                    
-                    del pending_goal_link['user_session']
-                    logger.info(f"Successfully linked task {task_id} to goal {goal_id_to_link}. State cleared.")
-                    return f"Linked task '{task_title}' to goal '{goal_title_to_link}'."
-                else:
-                    logger.warning(f"Invalid goal title {goal_title} provided for task {task_id}.")
-                    return f"Invalid goal title. Please choose a title from the list or say 'No'."
-            except ValueError:
-                # Add debug log INSIDE the exception handler
-                logger.warning(f"Could not parse goal title from response '{raw_user_response}'.")
-                # Re-prompt with the simplified instruction
-                # Construct the simplified prompt message again
-                prompt_message = f"Created task '{task_title}'. Would you like to link it to a goal?\n"
-                goal_options = []
-                for i, goal in enumerate(goals, start=1):
-                    goal_options.append(f"{i}. {goal['title']}")
-                prompt_message += "\n".join(goal_options)
-                prompt_message += "\n\nPlease respond with the goal title or 'No'."
-                return f"Invalid response. {prompt_message}"
-            except Exception as e:
-                logger.error(f"Error linking goal for task {task_id}: {str(e)}", exc_info=True)
-                # Clear state on unexpected error to prevent loop
-                if 'user_session' in pending_goal_link: del pending_goal_link['user_session']
-                return f"An error occurred while linking the goal: {str(e)}"
+    reply = handle_pending_goal_link(conversation_messages)
+    if reply is not None:
+        return reply
 
     # ---- If no pending state, proceed with normal flow ----
     logger.info("No pending goal link state found, proceeding with normal flow.")
-    # Extract and maintain conversation context
-    context = extract_context_from_messages(conversation_messages)
+    # Use the stored context when given, otherwise extract it from the history
+    if context is None:
+        context = extract_context_from_messages(conversation_messages)
     
     # Get the latest user message
     user_query = conversation_messages[-1]["content"]
@@ -453,43 +517,26 @@ def agent_step(conversation_messages: List[Dict]) -> str:
     
     # If it's not an ACTION intent, handle as conversation
     if intent.primary_intent != IntentType.ACTION:
-        provider = "openai"
-        factory = LLMFactory(provider=provider)
-        
-        # Include conversation context in the system prompt
-        context_section = context.to_prompt()
+        factory = LLMFactory.for_call_site("conversation")
         
-        system_prompt = f"""
-        You are Alfred, a helpful project management assistant. You are currently in {intent.primary_intent.value.upper()} mode.
-        
-        CURRENT CONVERSATION CONTEXT:
-        {context_section}
-        
-        CONVERSATION GUIDELINES:
-        1. For DISCUSS: Engage in open dialogue, ask questions, understand user's needs
-        2. For PLAN: Help break down goals, suggest approaches, discuss priorities
-        3. For QUERY: Provide clear, concise information about existing items
-        
-        IMPORTANT RULES:
-        - Maintain conversation continuity - reference previous points
-        - If discussing algorithmic trading strategy, refer to the specific steps previously mentioned
-        - When user wants to create tasks, suggest specific tasks for each step
-        - Keep responses focused on the current topic
-        - Provide clear, actionable next steps
-        
-        Current conversation intent: {intent.primary_intent.value}
-        Confidence: {intent.confidence}
-        """
-        
-        # Include full conversation history
-        conv_messages = [{"role": "system", "content": system_prompt}]
-        for m in conversation_messages[-5:]:  # Last 5 messages for context
-            conv_messages.append({"role": m["role"], "content": m["content"]})
+        # Static Alfred instructions first, then the conversation context and the
+        # per-turn mode/intent values, then the recent history window.
+        # The builder drops the oldest messages first when over the token budget.
+        conv_messages = (
+            PromptBuilder.from_template("conversation")
+            .add_context("CURRENT CONVERSATION CONTEXT", context.to_prompt())
+            .add_volatile("Current mode", intent.primary_intent.value.upper())
+            .add_volatile("Current conversation intent", intent.primary_intent.value)
+            .add_volatile("Confidence", intent.confidence)
+            .add_history(conversation_messages)
+            .build()
+        )
         
         try:
             completion = factory.create_completion(
                 response_model=EnhancedConversationResponse,
-                messages=conv_messages
+                messages=conv_messages,
+                call_site="conversation"
             )
             
             # Update conversation context
@@ -498,18 +545,6 @@ def agent_step(conversation_messages: List[Dict]) -> str:
             # Format response with context awareness
             response = completion.response
             
-            # If we're discussing algorithmic trading and tasks, ensure we reference the specific steps
-            if (context.current_topic == "algorithmic trading strategy" and 
-                any(word in user_query.lower() for word in ["task", "step", "plan"])):
-                response = "Based on our discussion about the algorithmic trading strategy, let's create specific tasks for each step:\n\n"
-                for point in context.discussion_points:
-                    if point.type in ["strategy_step", "market_research", "objectives", "data_analysis", 
-                                    "strategy_development", "testing", "monitoring"]:
-                        response += f"For {point.content}, we should:\n"
-                        response += "1. [Specific task suggestion]\n"
-                        response += "2. [Another task suggestion]\n\n"
-                response += "\nWould you like to create tasks for any specific step? Just say 'Create task for [step]' and I'll help you set it up."
-            
             # Add suggested next steps if available
             if completion.suggested_actions:
                 if not any(step in response for step in completion.suggested_actions):
@@ -520,6 +555,8 @@ def agent_step(conversation_messages: List[Dict]) -> str:
             
             return response
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error in conversation handling: {str(e)}")
             if context.current_topic:
@@ -537,11 +574,12 @@ def agent_step(conversation_messages: List[Dict]) -> str:
         # For now, we'll just proceed with the action
         pass
     
-    # Process as tool-based command
+    # Process as tool-based command (several calls run together, see tool_executor.py)
     try:
-        decision = parse_agent_decision(user_query)
-        result = agent_execute(decision)
-        return result
+        decisions = parse_agent_decisions(user_query)
+        return agent_execute_all(decisions)
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         # Log the specific error for debugging
         logger.error(f"Error processing action request '{user_query}': {str(e)}", exc_info=True)
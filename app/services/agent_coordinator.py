@@ -1,19 +1,44 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from app.services.conversation_agent import handle_conversation
-from app.services.agent import parse_agent_decision, agent_execute
+from app.services.agent import (parse_agent_decisions, agent_execute_all, handle_pending_goal_link,
+                                TURN_TIMEOUT_MESSAGE)
+from app.services.latency_control import DeadlineExceeded, turn_deadline
+from app.services.decision_prefetch import prefetch_session
+from app.services.session_state import conversation_session
+from app.services.tracing import span
+from app.database.unit_of_work import unit_of_work
 from app.models.conversation_models import ConversationContext
 import logging
 
 logger = logging.getLogger(__name__)
 
-def coordinate_agents(conversation_messages: List[Dict], context: Optional[ConversationContext] = None) -> str:
+def coordinate_agents(conversation_messages: List[Dict], context: Optional[ConversationContext] = None,
+                      session_key: Optional[str] = None) -> str:
     """
     Coordinates between Alfred (conversation) and Germain (task execution) based on explicit mentions.
     
     Rules:
     - If message contains "Germain", it's an action request
     - Otherwise, Alfred handles the conversation
+
+    All model calls in the turn share one overall deadline (see latency_control.turn_deadline).
+    Session state written by Germain's tools is scoped to session_key (see session_state.py).
+    Germain's tool calls share one database session (see unit_of_work.py).
     """
+    with turn_deadline(), prefetch_session(), conversation_session(session_key), span("coordinate_agents"), \
+            unit_of_work("coordinate_agents"):
+        try:
+            return _coordinate_agents(conversation_messages, context)
+        except DeadlineExceeded as e:
+            logger.warning(f"Coordinated turn ran out of time: {e}")
+            return TURN_TIMEOUT_MESSAGE
+
+def _coordinate_agents(conversation_messages: List[Dict], context: Optional[ConversationContext] = None) -> str:
+    # An answer to Germain's "link it to a goal?" question goes to Germain, whatever it mentions
+    reply = handle_pending_goal_link(conversation_messages)
+    if reply is not None:
+        return f"Germain: {reply}"
+
     # Get the latest user message
     user_query = conversation_messages[-1]["content"].lower()
     
@@ -22,10 +47,12 @@ def coordinate_agents(conversation_messages: List[Dict], context: Optional[Conve
         try:
             # Remove "Germain" from the query to clean it up
             clean_query = user_query.replace("germain", "").strip()
-            # Parse and execute the action
-            decision = parse_agent_decision(clean_query)
-            result = agent_execute(decision)
+            # Parse and execute the action(s)
+            decisions = parse_agent_decisions(clean_query)
+            result = agent_execute_all(decisions)
             return f"Germain: {result}"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error in task execution: {str(e)}")
             return "Germain: I apologize, but I couldn't process that action. Could you please rephrase your request? For example: 'Germain create task Write documentation'"
@@ -36,6 +63,8 @@ def coordinate_agents(conversation_messages: List[Dict], context: Optional[Conve
         # Even if conversation agent suggests an action, don't execute it
         # Just return the response to guide the user
         return f"Alfred: {response}"
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error(f"Error in conversation: {str(e)}")
         return "Alfred: I'm here to help. What would you like to discuss?" 
\ No newline at end of file
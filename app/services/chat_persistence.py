@@ -0,0 +1,186 @@
+# app/services/chat_persistence.py
+"""
+Persistence of chat turns.
+
+A turn used to commit the user message, re-read the conversation, run the
+agent, then commit the assistant message and the context separately:
+several commits and refresh round trips on the request's critical path.
+Now the chat endpoints build the turn in memory (message IDs and
+created_at are assigned here, so ordering does not depend on when rows
+reach the database) and hand it to a writer once the reply is known:
+
+- TransactionalChatWriter ("transaction", default): user message,
+  assistant message and the conversation context are written in one
+  transaction before replying.
+- WriteBehindChatWriter ("write_behind"): the turn is queued and a single
+  background thread writes it, one transaction per turn in FIFO order.
+  The reply never waits on the database. Before reading a conversation, a
+  turn waits for that conversation's earlier writes (wait_for), so history
+  and context are never read stale. The queue is bounded (callers block
+  rather than drop turns), failed writes are retried with backoff, and
+  flush() drains the queue at shutdown.
+
+Write-behind trades durability for latency, which is why it is opt-in:
+the queue is in memory, so turns still queued when the process dies are
+lost, and a turn that fails max_attempts writes is dropped (and logged).
+The FIFO order and wait_for only cover this process. With several
+workers, two turns of one conversation served by different processes are
+not ordered against each other; run a single worker, or route each
+conversation to one worker, when using it.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.config.settings import get_settings
+from app.models.conversation_models import ConversationContext, ConversationMessageDB, MessageOut
+from app.services.conversation_context import stage_conversation_context
+
+logger = logging.getLogger(__name__)
+
+
+class ChatTurn(BaseModel):
+    """Messages of one turn (oldest first) and the conversation context after it."""
+    conversation_id: uuid.UUID
+    messages: List[MessageOut] = Field(default_factory=list)
+    context: Optional[ConversationContext] = None
+
+
+def new_message(conversation_id: uuid.UUID, role: str, content: str, user_id: Optional[uuid.UUID] = None,
+                after: Optional[MessageOut] = None) -> MessageOut:
+    """A message stamped now; pass `after` to make sure it sorts after an earlier message of the turn."""
+    created_at = datetime.now(timezone.utc)
+    if after is not None and created_at <= after.created_at:
+        created_at = after.created_at + timedelta(microseconds=1)
+    return MessageOut(id=uuid.uuid4(), conversation_id=conversation_id, role=role, content=content,
+                      created_at=created_at, user_id=user_id)
+
+
+def write_turn(db, turn: ChatTurn) -> None:
+    """Write the turn's messages and context in one transaction."""
+    try:
+        db.add_all([ConversationMessageDB(**message.model_dump()) for message in turn.messages])
+        if turn.context is not None:
+            # The turn's messages are already folded into the context, so the watermark moves past them
+            last_message_at = turn.messages[-1].created_at if turn.messages else None
+            stage_conversation_context(db, turn.conversation_id, turn.context, last_message_at)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _session_factory():
+    # Imported here so that importing this module does not open a database engine
+    from app.database.session import SessionLocal
+    return SessionLocal
+
+
+class TransactionalChatWriter:
+    """Writes each turn synchronously, in one transaction."""
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self._session_factory = session_factory
+
+    def persist(self, turn: ChatTurn) -> None:
+        db = (self._session_factory or _session_factory())()
+        try:
+            write_turn(db, turn)
+        finally:
+            db.close()
+
+    def wait_for(self, conversation_id: uuid.UUID, timeout: Optional[float] = None) -> bool:
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+
+class WriteBehindChatWriter:
+    """Queues turns and writes them from one background thread, in order."""
+
+    def __init__(self, session_factory: Optional[Callable] = None, queue_size: int = 1000,
+                 max_attempts: int = 5, retry_delay_s: float = 0.5):
+        self._session_factory = session_factory
+        self.max_attempts = max_attempts
+        self.retry_delay_s = retry_delay_s
+        self._queue: "queue.Queue[ChatTurn]" = queue.Queue(maxsize=queue_size)
+        # Turns queued but not yet written, per conversation
+        self._pending: Dict[uuid.UUID, int] = defaultdict(int)
+        self._idle = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+        self._thread.start()
+
+    def persist(self, turn: ChatTurn) -> None:
+        # Snapshot the context: the caller may keep using (and mutating) it after this returns
+        turn = turn.model_copy(update={"context": turn.context.model_copy(deep=True) if turn.context else None})
+        with self._idle:
+            self._pending[turn.conversation_id] += 1
+        self._queue.put(turn)
+
+    def wait_for(self, conversation_id: uuid.UUID, timeout: Optional[float] = None) -> bool:
+        """Wait until the conversation's queued turns are written; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending.get(conversation_id), timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued turn is written; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def _write(self, turn: ChatTurn) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            db = None
+            try:
+                db = (self._session_factory or _session_factory())()
+                write_turn(db, turn)
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error(f"Dropping chat turn of conversation {turn.conversation_id} after {attempt} attempts: {e}")
+                    return
+                logger.warning(f"Chat turn write failed (attempt {attempt}), retrying: {e}")
+                time.sleep(self.retry_delay_s * 2 ** (attempt - 1))
+            finally:
+                if db is not None:
+                    db.close()
+
+    def _run(self) -> None:
+        while True:
+            turn = self._queue.get()
+            try:
+                self._write(turn)
+            finally:
+                with self._idle:
+                    self._pending[turn.conversation_id] -= 1
+                    if not self._pending[turn.conversation_id]:
+                        del self._pending[turn.conversation_id]
+                    self._idle.notify_all()
+                self._queue.task_done()
+
+
+@lru_cache()
+def get_chat_writer():
+    settings = get_settings().chat_persistence
+    if settings.mode == "write_behind":
+        writer = WriteBehindChatWriter(queue_size=settings.queue_size, max_attempts=settings.max_attempts)
+        # Last chance to write queued turns if the app exits without its shutdown hook
+        atexit.register(writer.flush, settings.flush_timeout_s)
+        return writer
+    return TransactionalChatWriter()
+
+
+def flush_chat_writer() -> None:
+    """Write every queued turn (called on app shutdown)."""
+    timeout = get_settings().chat_persistence.flush_timeout_s
+    if not get_chat_writer().flush(timeout):
+        logger.error(f"Chat turns still queued after waiting {timeout}s at shutdown")
@@ -1,10 +1,78 @@
 from app.models.conversation_models import EnhancedConversationResponse, Intent, IntentType, ConversationContext
+from app.services.latency_control import DeadlineExceeded
 from app.services.llm_factory import LLMFactory
-from typing import List, Dict, Optional, Tuple
+from app.services.prompt_builder import PromptBuilder
+from app.services.tracing import traced
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+ACTION_VERBS = ["create", "add", "make", "set up", "generate", "delete", "remove", "update", "change", "modify"]
+ACTION_OBJECTS = ["task", "goal", "reminder", "project", "todo"]
+ACTION_HANDOFF_MESSAGE = "I understand you want to take action on a task or goal. Let me help with that."
+FALLBACK_MESSAGE = "I'm here to help. What would you like to discuss?"
+
+
+def _is_task_action(user_query: str) -> bool:
+    """Check if the message is clearly a direct task/goal action (e.g. "create a task")."""
+    lower_query = user_query.lower()
+    for verb in ACTION_VERBS:
+        for obj in ACTION_OBJECTS:
+            if f"{verb} {obj}" in lower_query or f"{verb} a {obj}" in lower_query or f"{verb} the {obj}" in lower_query:
+                return True
+    return False
+
+
+def _build_messages(conversation_messages: List[Dict], context: ConversationContext) -> List[Dict[str, str]]:
+    # Generate a system prompt based on context
+    context_section = context.to_prompt() or "No prior context available."
+
+    # Prepare conversation messages under the "conversation" token budget.
+    # Oldest history goes first, then the oldest context lines.
+    return (
+        PromptBuilder.from_template("alfred_chat", call_site="conversation")
+        .add_context("CURRENT CONVERSATION CONTEXT", context_section)
+        .add_history(conversation_messages)
+        .build()
+    )
+
+
+def _apply_completion(completion: EnhancedConversationResponse, user_query: str, context: ConversationContext) -> str:
+    """Update the context from a finished completion and return the text shown to the user."""
+    # Update context
+    context.update_from_response(completion)
+
+    # Analyze the response for steps or points
+    lines = completion.response.split("\n")
+    current_type = "general"
+
+    for line in lines:
+        line = line.strip()
+        if line and len(line) > 10:
+            if line.startswith(("•", "-", "*", "1.", "2.", "3.", "4.", "5.", "6.", "7.", "8.")):
+                clean_point = line.strip("•-*123456789. ")
+                if clean_point:
+                    context.add_discussion_point(clean_point, current_type)
+
+                    # Add to topic details if relevant
+                    if context.current_topic and len(clean_point) > 10:
+                        context.add_topic_details(context.current_topic, [clean_point])
+
+    response = completion.response
+
+    # Add suggested next steps if available
+    if completion.suggested_actions:
+        if not any(step in response for step in completion.suggested_actions):
+            action_suggestions = "\n\nNext steps:"
+            for action in completion.suggested_actions:
+                action_suggestions += f"\n- {action}"
+            response += action_suggestions
+
+    return response
+
+
+@traced()
 def handle_conversation(conversation_messages: List[Dict], context: Optional[ConversationContext] = None) -> Tuple[str, bool, ConversationContext]:
     """
     Handles general conversational interactions with the user.
@@ -26,106 +94,71 @@ def handle_conversation(conversation_messages: List[Dict], context: Optional[Con
     # Get the latest user message
     user_query = conversation_messages[-1]["content"]
     
-    # First, determine if this is a direct action request that should go to task agent
-    action_verbs = ["create", "add", "make", "set up", "generate", "delete", "remove", "update", "change", "modify"]
-    action_objects = ["task", "goal", "reminder", "project", "todo"]
-    
-    # Check if this is clearly a task action
-    is_task_action = False
-    lower_query = user_query.lower()
-    
-    # Look for explicit task actions
-    for verb in action_verbs:
-        for obj in action_objects:
-            if f"{verb} {obj}" in lower_query or f"{verb} a {obj}" in lower_query or f"{verb} the {obj}" in lower_query:
-                is_task_action = True
-                break
-        if is_task_action:
-            break
-    
     # If it's a clear task action, let the coordinator know to pass to task agent
-    if is_task_action:
-        return (
-            "I understand you want to take action on a task or goal. Let me help with that.",
-            True,
-            context
-        )
+    if _is_task_action(user_query):
+        return ACTION_HANDOFF_MESSAGE, True, context
     
     # Otherwise, handle as conversation
-    provider = "openai"
-    factory = LLMFactory(provider=provider)
-    
-    # Generate a system prompt based on context
-    context_section = context.to_prompt() if context.to_prompt() else "No prior context available."
-    
-    system_prompt = f"""
-    You are Alfred, a helpful assistant that specializes in conversations and planning.
-    
-    CURRENT CONVERSATION CONTEXT:
-    {context_section}
-    
-    CONVERSATION GUIDELINES:
-    1. Engage in natural, helpful conversation with the user
-    2. Help the user think through plans and goals
-    3. Maintain the conversation topic and follow logical transitions
-    4. If the user mentions "algorithmic trading strategy", be sure to reference our previous discussions
-    5. Don't create, modify, or delete tasks/goals directly - suggest that as next steps instead
-    
-    Your primary role is to discuss, plan, and help the user think through their ideas.
-    When the user is ready to create specific tasks or goals, guide them to use specific commands.
-    """
-    
-    # Prepare conversation messages
-    conv_messages = [{"role": "system", "content": system_prompt}]
-    # Include the last 5 messages for context
-    for m in conversation_messages[-5:]:
-        conv_messages.append({"role": m["role"], "content": m["content"]})
+    factory = LLMFactory.for_call_site("conversation")
+    conv_messages = _build_messages(conversation_messages, context)
     
     try:
         completion = factory.create_completion(
             response_model=EnhancedConversationResponse,
-            messages=conv_messages
+            messages=conv_messages,
+            call_site="conversation"
         )
+        return _apply_completion(completion, user_query, context), False, context
         
-        # Update context
-        context.update_from_response(completion)
-        
-        # Extract relevant information from the response
-        if "algorithmic trading" in user_query.lower() and "algorithmic trading strategy" not in context.topic_details:
-            context.current_topic = "algorithmic trading strategy"
-            context.topic_details["algorithmic trading strategy"] = []
-        
-        # Analyze the response for steps or points
-        lines = completion.response.split("\n")
-        current_type = "general"
-        
-        for line in lines:
-            line = line.strip()
-            if line and len(line) > 10:
-                if line.startswith(("•", "-", "*", "1.", "2.", "3.", "4.", "5.", "6.", "7.", "8.")):
-                    clean_point = line.strip("•-*123456789. ")
-                    if clean_point:
-                        context.add_discussion_point(clean_point, current_type)
-                        
-                        # Add to topic details if relevant
-                        if context.current_topic and len(clean_point) > 10:
-                            if context.current_topic not in context.topic_details:
-                                context.topic_details[context.current_topic] = []
-                            context.topic_details[context.current_topic].append(clean_point)
-        
-        response = completion.response
-        
-        # Add suggested next steps if available
-        if completion.suggested_actions:
-            if not any(step in response for step in completion.suggested_actions):
-                action_suggestions = "\n\nNext steps:"
-                for action in completion.suggested_actions:
-                    action_suggestions += f"\n- {action}"
-                response += action_suggestions
-        
-        return response, False, context
-        
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error(f"Error in conversation handling: {str(e)}")
         # Fallback response
-        return "I'm here to help. What would you like to discuss?", False, context 
\ No newline at end of file
+        return FALLBACK_MESSAGE, False, context
+
+
+def stream_conversation(conversation_messages: List[Dict], context: Optional[ConversationContext] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of handle_conversation.
+
+    Yields events as the model writes its answer:
+    - {"event": "delta", "text": ...}: new text of the `response` field, as soon as it arrives
+    - {"event": "final", "message": ..., "is_action": ..., "completion": ..., "context": ...}: once,
+      at the end, with the full text (including suggested next steps) and the structured fields.
+      If the model fails mid-answer, the final message is the text streamed so far (the fallback
+      message when nothing was streamed) and completion is None. DeadlineExceeded is raised.
+    """
+    if not context:
+        context = ConversationContext()
+    user_query = conversation_messages[-1]["content"]
+
+    if _is_task_action(user_query):
+        yield {"event": "final", "message": ACTION_HANDOFF_MESSAGE, "is_action": True, "completion": None, "context": context}
+        return
+
+    factory = LLMFactory.for_call_site("conversation")
+    conv_messages = _build_messages(conversation_messages, context)
+
+    streamed = ""  # text of `response` already sent as deltas
+    completion = None
+    try:
+        for partial in factory.stream_completion(
+            response_model=EnhancedConversationResponse,
+            messages=conv_messages,
+            call_site="conversation",
+        ):
+            text = partial.response or ""
+            if len(text) > len(streamed):
+                yield {"event": "delta", "text": text[len(streamed):]}
+                streamed = text
+            completion = partial
+        message = _apply_completion(completion, user_query, context)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Error in streamed conversation: {str(e)}")
+        # The client already shows the streamed words, so end with them rather than the fallback
+        completion, message = None, streamed or FALLBACK_MESSAGE
+
+    yield {"event": "final", "message": message, "is_action": False, "completion": completion, "context": context}
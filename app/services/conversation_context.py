@@ -0,0 +1,116 @@
+# app/services/conversation_context.py
+"""
+Incremental, persisted ConversationContext.
+
+Rebuilding the context from the whole history on every turn made each turn
+O(history length). Instead, the context of a conversation is stored in the
+conversation_contexts table (compact JSON) together with a watermark: the
+created_at of the newest message already folded in. Each turn only the
+messages newer than the watermark are read and applied, and the context's
+lists are bounded ring buffers (see ConversationContext.MAX_*), so the cost
+of a turn no longer grows with the conversation.
+"""
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.conversation_models import ConversationContext, ConversationContextDB, ConversationMessageDB
+
+logger = logging.getLogger(__name__)
+
+BULLET_PREFIXES = ("•", "-", "*", "1.", "2.", "3.", "4.", "5.", "6.", "7.", "8.")
+
+
+def _step_type(line: str, current_type: str) -> str:
+    """Kind of step an assistant line starts (the previous kind carries over otherwise)"""
+    if "market research" in line:
+        return "market_research"
+    elif "define objectives" in line:
+        return "objectives"
+    elif "analyze data" in line:
+        return "data_analysis"
+    elif "develop" in line and "strategy" in line:
+        return "strategy_development"
+    elif "test" in line:
+        return "testing"
+    elif "monitor" in line:
+        return "monitoring"
+    return current_type
+
+
+def update_context_from_message(context: ConversationContext, msg: Dict) -> None:
+    """
+    Fold one message into the context (the steps and points of assistant replies).
+    Topics come from the structured responses, and relevant earlier turns from
+    semantic recall (conversation_recall.py), rather than from keyword matching here.
+    """
+    if msg.get("role") != "assistant":
+        return
+
+    current_type = "general"
+    for line in msg.get("content", "").lower().split("\n"):
+        line = line.strip()
+        current_type = _step_type(line, current_type)
+        if not line.startswith(BULLET_PREFIXES):
+            continue
+        clean_point = line.strip("•-*123456789. ")
+        if clean_point:
+            context.add_discussion_point(clean_point, current_type)
+
+
+def extract_context_from_messages(messages: List[Dict], context: Optional[ConversationContext] = None) -> ConversationContext:
+    """Build (or extend) a context from a list of messages."""
+    context = context or ConversationContext()
+    for msg in messages:
+        update_context_from_message(context, msg)
+    return context
+
+
+def _watermark(row: Optional[ConversationContextDB]) -> Optional[datetime]:
+    return row.last_message_at if row else None
+
+
+def refresh_conversation_context(db: Session, conversation_id: uuid.UUID) -> ConversationContext:
+    """
+    Load the stored context and fold in only the messages added since the last turn.
+    The updated context and watermark are saved before returning.
+    """
+    row = db.get(ConversationContextDB, conversation_id)
+    context = ConversationContext.from_compact(row.context if row else None)
+
+    query = db.query(ConversationMessageDB).filter(ConversationMessageDB.conversation_id == conversation_id)
+    if _watermark(row) is not None:
+        query = query.filter(ConversationMessageDB.created_at > row.last_message_at)
+    new_messages = query.order_by(ConversationMessageDB.created_at.asc()).all()
+
+    for msg in new_messages:
+        update_context_from_message(context, {"role": msg.role, "content": msg.content})
+    if new_messages:
+        logger.info(f"Folded {len(new_messages)} new messages into the context of conversation {conversation_id}")
+        save_conversation_context(db, conversation_id, context, new_messages[-1].created_at)
+    return context
+
+
+def stage_conversation_context(db: Session, conversation_id: uuid.UUID, context: ConversationContext,
+                               last_message_at: Optional[datetime] = None) -> None:
+    """Add the context update to the session's transaction without committing it."""
+    row = db.get(ConversationContextDB, conversation_id)
+    if row is None:
+        row = ConversationContextDB(conversation_id=conversation_id)
+        db.add(row)
+    row.context = context.to_compact()
+    if last_message_at is not None:
+        row.last_message_at = last_message_at
+
+
+def save_conversation_context(db: Session, conversation_id: uuid.UUID, context: ConversationContext,
+                              last_message_at: Optional[datetime] = None) -> None:
+    """
+    Store the context. Pass last_message_at to move the watermark, e.g. past an assistant
+    reply whose content was already applied from the structured response.
+    """
+    stage_conversation_context(db, conversation_id, context, last_message_at)
+    db.commit()
@@ -0,0 +1,170 @@
+# app/services/conversation_memory.py
+"""
+Long-term conversation memory.
+
+Prompts see the recent history window (PromptBudgetSettings.history_messages)
+verbatim. Everything older is folded into one rolling summary per
+conversation (conversation_summaries table), which is loaded into
+ConversationContext.summary each turn and rendered at the top of the
+context section. The summary is capped at MemorySettings.max_summary_tokens,
+so the prompt stays the same size however long the conversation runs.
+
+Summarization never runs on the request path: chat turns only call
+schedule_summary(), and a background worker checks whether enough messages
+(MemorySettings.segment_messages) have fallen out of the window since the
+last summary. If so, it asks the "summary" call site for an updated summary
+of (previous summary + that segment), at batch priority so it yields the
+provider quota to interactive calls.
+"""
+import logging
+import queue
+import threading
+import uuid
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.models.conversation_models import ConversationMessageDB, ConversationSummary, ConversationSummaryDB
+from app.services.rate_limiter import CallPriority, call_priority
+
+logger = logging.getLogger(__name__)
+
+
+def load_summary(db: Session, conversation_id: uuid.UUID) -> Optional[str]:
+    """The conversation's rolling summary, or None if nothing has been summarized yet."""
+    row = db.get(ConversationSummaryDB, conversation_id)
+    return row.summary if row else None
+
+
+def summarize_segment(previous: Optional[str], messages: List[ConversationMessageDB]) -> str:
+    """Fold a segment of messages into the previous summary with one model call."""
+    # Imported here so the worker module does not pull in the provider clients on import
+    from app.services.llm_factory import LLMFactory
+    from app.services.prompt_builder import PromptBuilder
+
+    max_tokens = get_settings().memory.max_summary_tokens
+    transcript = "\n".join(f"{m.role}: {m.content}" for m in messages)
+    prompt = (
+        PromptBuilder.from_template("summary")
+        .add_volatile("Word limit", int(max_tokens * 0.75))
+        .add_volatile("Current summary", previous or "(empty)")
+        .add_history([{"role": "user", "content": transcript}])
+        .build()
+    )
+    completion = LLMFactory.for_call_site("summary").create_completion(
+        response_model=ConversationSummary,
+        messages=prompt,
+        call_site="summary",
+        max_tokens=max_tokens,
+    )
+    return completion.summary.strip()
+
+
+def update_summary(db: Session, conversation_id: uuid.UUID,
+                   summarize: Callable[[Optional[str], List[ConversationMessageDB]], str] = summarize_segment) -> int:
+    """
+    Summarize the messages that fell out of the recent history window since the last summary,
+    one segment at a time. Returns the number of messages folded in (0 if fewer than a segment).
+    """
+    settings = get_settings()
+    segment = settings.memory.segment_messages
+    keep_recent = settings.prompt_budget.history_messages
+
+    row = db.get(ConversationSummaryDB, conversation_id)
+    query = db.query(ConversationMessageDB).filter(ConversationMessageDB.conversation_id == conversation_id)
+    if row is not None and row.summarized_until is not None:
+        query = query.filter(ConversationMessageDB.created_at > row.summarized_until)
+    pending = query.order_by(ConversationMessageDB.created_at.asc(), ConversationMessageDB.id.asc()).all()
+    # The recent window is sent verbatim with every prompt, so it is not summarized yet
+    older = pending[:-keep_recent] if keep_recent else pending
+
+    folded = 0
+    while len(older) - folded >= segment:
+        messages = older[folded:folded + segment]
+        summary = summarize(row.summary if row else None, messages)
+        if row is None:
+            row = ConversationSummaryDB(conversation_id=conversation_id)
+            db.add(row)
+        row.summary = summary
+        row.summarized_until = messages[-1].created_at
+        db.commit()
+        folded += len(messages)
+
+    if folded:
+        logger.info(f"Summarized {folded} messages of conversation {conversation_id}")
+    return folded
+
+
+class ConversationSummarizer:
+    """Background worker that updates conversation summaries outside the request path."""
+
+    def __init__(self, session_factory: Optional[Callable] = None, queue_size: int = 500):
+        self._session_factory = session_factory
+        self._queue: "queue.Queue[uuid.UUID]" = queue.Queue(maxsize=queue_size)
+        self._scheduled = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="conversation-summarizer", daemon=True)
+        self._thread.start()
+
+    def schedule(self, conversation_id: uuid.UUID) -> bool:
+        """Queue a conversation for a summary check. Never blocks; returns False if skipped."""
+        with self._lock:
+            if conversation_id in self._scheduled:
+                return True
+            try:
+                self._queue.put_nowait(conversation_id)
+            except queue.Full:
+                # The next turn of the conversation schedules it again
+                logger.warning(f"Summarizer queue full, skipping conversation {conversation_id}")
+                return False
+            self._scheduled.add(conversation_id)
+            return True
+
+    def join(self) -> None:
+        """Wait until every scheduled conversation has been processed."""
+        self._queue.join()
+
+    def _session(self):
+        if self._session_factory is None:
+            # Imported here so that importing this module does not open a database engine
+            from app.database.session import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _process(self, conversation_id: uuid.UUID) -> None:
+        # Write-behind chat turns must be in the database before they can be summarized
+        from app.services.chat_persistence import get_chat_writer
+        get_chat_writer().wait_for(conversation_id, get_settings().chat_persistence.flush_timeout_s)
+
+        db = self._session()
+        try:
+            with call_priority(CallPriority.BATCH):
+                update_summary(db, conversation_id)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to summarize conversation {conversation_id}: {e}")
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        while True:
+            conversation_id = self._queue.get()
+            with self._lock:
+                self._scheduled.discard(conversation_id)
+            try:
+                self._process(conversation_id)
+            finally:
+                self._queue.task_done()
+
+
+@lru_cache()
+def get_summarizer() -> ConversationSummarizer:
+    return ConversationSummarizer(queue_size=get_settings().memory.queue_size)
+
+
+def schedule_summary(conversation_id: uuid.UUID) -> None:
+    """Ask the background summarizer to check the conversation (no-op when memory is disabled)."""
+    if get_settings().memory.enabled:
+        get_summarizer().schedule(conversation_id)
@@ -0,0 +1,173 @@
+# app/services/conversation_recall.py
+"""
+Semantic recall over past conversation messages.
+
+The summary (conversation_memory.py) keeps the gist of older turns, but a
+question like "what did we decide about the trading strategy last month?"
+needs the specific turn. Every chat message is therefore embedded in the
+background into a time-partitioned vector table (RecallSettings.table_name,
+through VectorStore): record ids are UUIDv1 built from the message's
+created_at, so searches only scan the partitions inside the lookback window
+(uuid_time_filter).
+
+At the start of a turn the context builder embeds the user message and
+pulls the candidate_k nearest earlier messages of the same conversation.
+It weights each by recency (half-life decay) and keeps the top_k as
+ConversationContext.recalled. This replaces the hard-coded topic keywords
+that used to be scanned for in every message.
+"""
+import logging
+import queue
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from app.config.settings import get_settings
+from app.models.conversation_models import MessageOut
+from app.services.rate_limiter import CallPriority, call_priority
+from app.services.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def rank_recalled(results: Sequence[Tuple[Any, ...]], now: datetime, half_life_days: float,
+                  top_k: int, exclude: Iterable[str] = ()) -> List[str]:
+    """
+    Order vector search results (id, metadata, contents, embedding, distance) by
+    similarity x recency and return the top_k message texts, oldest first.
+    """
+    excluded = set(exclude)
+    scored = []
+    for _, metadata, contents, _, distance in results:
+        if contents in excluded:
+            continue
+        created_at = _as_utc(datetime.fromisoformat(metadata["created_at"]))
+        age_days = max(0.0, (now - created_at).total_seconds() / 86400)
+        score = (1 - float(distance)) * 0.5 ** (age_days / half_life_days)
+        scored.append((score, created_at, f"{metadata.get('role', 'user')}: {contents}"))
+    best = sorted(scored, key=lambda item: item[0], reverse=True)[:top_k]
+    return [text for _, _, text in sorted(best, key=lambda item: item[1])]
+
+
+class ConversationRecall:
+    """Embeds messages in the background and recalls the relevant ones for a turn."""
+
+    def __init__(self, vector_store=None, queue_size: int = 1000):
+        self._vector_store = vector_store
+        self._store_lock = threading.Lock()
+        self._table_ready = False
+        self._queue: "queue.Queue[MessageOut]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="conversation-recall-indexer", daemon=True)
+        self._thread.start()
+
+    @property
+    def vector_store(self):
+        with self._store_lock:
+            if self._vector_store is None:
+                # Imported here so that importing this module does not open a database connection
+                from app.database.vector_store import VectorStore
+                self._vector_store = VectorStore(table_name=get_settings().recall.table_name)
+            return self._vector_store
+
+    # -- indexing -------------------------------------------------------------
+
+    def schedule_index(self, messages: Iterable[MessageOut]) -> None:
+        """Queue messages for embedding. Never blocks; messages are skipped when the queue is full."""
+        min_chars = get_settings().recall.min_chars
+        for message in messages:
+            if len(message.content.strip()) < min_chars:
+                continue
+            try:
+                self._queue.put_nowait(message)
+            except queue.Full:
+                logger.warning(f"Recall index queue full, skipping message {message.id}")
+
+    def join(self) -> None:
+        """Wait until every queued message has been embedded."""
+        self._queue.join()
+
+    def index_message(self, message: MessageOut) -> None:
+        from timescale_vector.client import uuid_from_time
+
+        store = self.vector_store
+        if not self._table_ready:
+            store.create_tables()
+            self._table_ready = True
+        # Indexing is batch work: it must not take quota from interactive calls
+        with call_priority(CallPriority.BATCH):
+            embedding = store.get_embedding(message.content)
+        record = {
+            # UUIDv1 from the message time: the record lands in that time partition
+            "id": str(uuid_from_time(message.created_at)),
+            "metadata": {
+                "conversation_id": str(message.conversation_id),
+                "message_id": str(message.id),
+                "role": message.role,
+                "created_at": message.created_at.isoformat(),
+            },
+            "contents": message.content,
+            "embedding": embedding,
+        }
+        store.upsert(pd.DataFrame([record]))
+
+    def _run(self) -> None:
+        while True:
+            message = self._queue.get()
+            try:
+                self.index_message(message)
+            except Exception as e:
+                logger.error(f"Failed to index message {message.id} for recall: {e}")
+            finally:
+                self._queue.task_done()
+
+    # -- recall ---------------------------------------------------------------
+
+    def recall(self, conversation_id: uuid.UUID, query: str, exclude: Iterable[str] = (),
+               now: Optional[datetime] = None) -> List[str]:
+        """Earlier messages of the conversation most relevant to `query`, recency weighted."""
+        settings = get_settings().recall
+        now = now or datetime.now(timezone.utc)
+        results = self.vector_store.search(
+            query,
+            limit=settings.candidate_k,
+            metadata_filter={"conversation_id": str(conversation_id)},
+            time_range=(now - timedelta(days=settings.lookback_days), now),
+            return_dataframe=False,
+        )
+        return rank_recalled(results, now, settings.recency_half_life_days, settings.top_k, exclude)
+
+
+@lru_cache()
+def get_conversation_recall() -> ConversationRecall:
+    return ConversationRecall(queue_size=get_settings().recall.queue_size)
+
+
+def schedule_recall_index(messages: Iterable[MessageOut]) -> None:
+    """Embed the turn's messages in the background (no-op when recall is disabled)."""
+    if get_settings().recall.enabled:
+        get_conversation_recall().schedule_index(messages)
+
+
+@traced()
+def recall_for_turn(conversation_id: uuid.UUID, query: str, history: List[dict]) -> List[str]:
+    """
+    Relevant earlier messages for the context builder. Messages already in the history window are
+    left out, and a failure never breaks the turn (the prompt is just built without recall).
+    """
+    settings = get_settings()
+    # A conversation that still fits in the history window has nothing to recall
+    if not settings.recall.enabled or len(history) < settings.prompt_budget.history_messages:
+        return []
+    try:
+        return get_conversation_recall().recall(conversation_id, query, exclude=[m["content"] for m in history])
+    except Exception as e:
+        logger.warning(f"Recall failed for conversation {conversation_id}: {e}")
+        return []
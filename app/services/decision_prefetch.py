@@ -0,0 +1,160 @@
+# app/services/decision_prefetch.py
+"""
+Early lookups while the AgentDecision is still streaming.
+
+For an action like "update task Project X set priority to high", the
+decision call returns JSON such as:
+
+    {"tool_name": "update_task", "tool_input": {"subject": "Project X", "priority": "high"}, ...}
+
+agent_execute then resolves "Project X" to a task in the database. With
+streaming, `tool_name` and `subject` are usually known well before the
+rest of the JSON arrives, so the lookup can start right away, in parallel
+with the remaining tokens.
+
+How it works:
+- agent_step / coordinate_agents open a `prefetch_session()` for the turn.
+- parse_agent_decision passes every partial decision to `observe()`.
+  Once the tool name is known and the subject is complete, the matching
+  lookup (see PREFETCH_LOOKUPS) is started in a background thread.
+- agent_execute runs its lookups through `prefetched(fn, *args)`: if the
+  same call was prefetched, it waits for that result instead of running it
+  again. Anything that was not prefetched (or a different subject in the
+  final decision) runs normally, so a wrong guess only costs a wasted query.
+"""
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.services.tools.goal_tools import search_goals_by_subject
+from app.services.tools.task_adapters import search_tasks_by_subject
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="prefetch")
+
+# tool_name -> (lookup, whether it needs the subject, extra kwargs) with the exact call agent_execute makes
+PREFETCH_LOOKUPS: Dict[str, Tuple[Callable, bool, Dict[str, Any]]] = {
+    "search_tasks_by_subject": (search_tasks_by_subject, True, {}),
+    "update_task": (search_tasks_by_subject, True, {"limit": 1}),
+    "update_goal": (search_goals_by_subject, True, {"limit": 1}),
+    "delete_goal": (search_goals_by_subject, True, {"limit": 1}),
+}
+
+
+class _PrefetchStats:
+    """Running counters to measure what prefetching saves."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, "hits": 0, "misses": 0, "saved_ms": 0.0}
+
+    def add(self, **deltas) -> None:
+        with self._lock:
+            for name, value in deltas.items():
+                self._stats[name] += value
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._stats)
+
+
+prefetch_stats = _PrefetchStats()
+
+
+def _timed(fn: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, (time.perf_counter() - start) * 1000
+
+
+def _key(fn: Callable, args: tuple, kwargs: Dict[str, Any]) -> tuple:
+    return fn.__name__, args, tuple(sorted(kwargs.items()))
+
+
+class PrefetchSession:
+    """Lookups started for one turn, keyed by the exact call they stand for."""
+
+    def __init__(self):
+        self._futures: Dict[tuple, Tuple[Future, float]] = {}
+        self._last_dump: Optional[dict] = None
+        self._last_subject: Optional[str] = None
+
+    def start(self, fn: Callable, *args, **kwargs) -> None:
+        key = _key(fn, args, kwargs)
+        if key in self._futures:
+            return
+        context = contextvars.copy_context()
+        self._futures[key] = (_executor.submit(context.run, _timed, fn, *args, **kwargs), time.perf_counter())
+        prefetch_stats.add(started=1)
+        logger.info(f"Prefetching {fn.__name__}{args} while the decision streams")
+
+    def observe(self, partial) -> None:
+        """Inspect a partial decision and start its lookup once tool name and subject are final."""
+        tool_name = getattr(partial, "tool_name", None)
+        if tool_name not in PREFETCH_LOOKUPS:
+            return
+        fn, needs_subject, kwargs = PREFETCH_LOOKUPS[tool_name]
+        if not needs_subject:
+            self.start(fn, **kwargs)
+            return
+
+        subject = getattr(getattr(partial, "tool_input", None), "subject", None)
+        dump = partial.model_dump() if hasattr(partial, "model_dump") else None
+        # Only the string being written can grow. If the subject did not change while
+        # something else did, the subject's string is closed and safe to look up.
+        if subject and subject == self._last_subject and dump != self._last_dump:
+            self.start(fn, subject, **kwargs)
+        self._last_subject, self._last_dump = subject, dump
+
+    def result(self, fn: Callable, *args, **kwargs) -> Any:
+        entry = self._futures.pop(_key(fn, args, kwargs), None)
+        if entry is None:
+            prefetch_stats.add(misses=1)
+            return fn(*args, **kwargs)
+        future, started_at = entry
+        head_start_ms = (time.perf_counter() - started_at) * 1000
+        value, duration_ms = future.result()
+        # The part of the lookup that ran before agent_execute needed it is latency taken off the turn
+        saved_ms = min(duration_ms, head_start_ms)
+        prefetch_stats.add(hits=1, saved_ms=saved_ms)
+        logger.info(f"Prefetch hit for {fn.__name__}{args}, ran {saved_ms:.0f}ms ahead of agent_execute")
+        return value
+
+    def close(self) -> None:
+        for future, _ in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+
+
+_current_session: contextvars.ContextVar[Optional[PrefetchSession]] = contextvars.ContextVar(
+    "prefetch_session", default=None
+)
+
+
+@contextmanager
+def prefetch_session():
+    """Scope prefetched lookups to one turn; unused ones are cancelled at the end."""
+    session = PrefetchSession()
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
+        session.close()
+
+
+def current_prefetch_session() -> Optional[PrefetchSession]:
+    return _current_session.get()
+
+
+def prefetched(fn: Callable, *args, **kwargs) -> Any:
+    """Call fn(*args, **kwargs), reusing the prefetched result of the same call if there is one."""
+    session = _current_session.get()
+    if session is None:
+        return fn(*args, **kwargs)
+    return session.result(fn, *args, **kwargs)
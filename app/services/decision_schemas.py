@@ -0,0 +1,124 @@
+# app/services/decision_schemas.py
+"""
+Narrowed response models for the decision call.
+
+AgentDecision.tool_input is a Union of every tool input model, so each
+decision call sends the whole union's JSON schema, and the model sometimes
+fills in the wrong member (which triggers instructor validation retries).
+
+Most action requests say plainly what they want ("create a task ...",
+"delete goal ..."). We first pick the tool family locally with a keyword
+match, then ask for a response model that only allows that family's tool
+names and input schema. When no family matches, the full AgentDecision is
+used as before.
+
+Narrowed results are converted back to AgentDecision (to_agent_decision)
+so agent_execute does not change. Prompt sizes and retries per schema can
+be compared with app/scripts/measure_decision_schemas.py.
+"""
+import re
+from typing import Dict, List, Literal, Optional, Tuple, Type
+
+from pydantic import BaseModel, Field, create_model
+
+from app.models.agent_decision import AgentDecision
+from app.models.goal_models import GoalCreate, GoalDelete, GoalUpdate
+from app.models.task_models import CreateTask, CreateTasksBulk, TaskDelete, TaskList, TaskUpdate
+
+# family -> (allowed tool names, input model)
+TOOL_FAMILIES: Dict[str, Tuple[List[str], Type[BaseModel]]] = {
+    "task_create": (["create_task"], CreateTask),
+    "task_create_bulk": (["create_tasks_bulk"], CreateTasksBulk),
+    "task_update": (["update_task"], TaskUpdate),
+    "task_delete": (["delete_task"], TaskDelete),
+    "task_query": (["search_tasks_by_subject", "list_tasks_by_date_range"], TaskList),
+    "goal_create": (["create_goal"], GoalCreate),
+    "goal_update": (["update_goal"], GoalUpdate),
+    "goal_delete": (["delete_goal"], GoalDelete),
+    # GoalDelete is the {id, subject} lookup that get_goal needs; list_goals ignores it
+    "goal_query": (["list_goals", "get_goal"], GoalDelete),
+}
+
+# Verb groups. A request is narrowed only when exactly one of delete/create/update matches
+# ("create a task to update the site" is left to the full decision); query needs neither.
+_ACTIONS = [
+    ("delete", {"delete", "remove", "cancel", "drop", "erase"}),
+    # "set up" is read as one word, so it is a create and not a "set" update
+    ("create", {"create", "add", "make", "schedule", "setup"}),
+    ("update", {"update", "change", "modify", "set", "mark", "rename", "move", "complete", "finish", "reschedule"}),
+    ("query", {"list", "show", "find", "search", "what", "which", "get", "display", "due"}),
+]
+_GOAL_WORDS = {"goal", "goals", "objective", "objectives"}
+
+
+def _words(user_query: str) -> List[str]:
+    return re.findall(r"[a-z]+", re.sub(r"\bset\s+up\b", "setup", user_query.lower()))
+
+
+def select_tool_family(user_query: str) -> Optional[str]:
+    """
+    Pick the tool family from keywords, or None when the request is ambiguous.
+    A wrong family forces the model into the wrong tool, so mixed verbs
+    ("add a step to remove clutter") fall back to the full AgentDecision.
+    """
+    words = set(_words(user_query))
+    # A task ID lookup (get_task_service) is rare and not covered by a family
+    if "id" in words:
+        return None
+    target = "goal" if words & _GOAL_WORDS else "task"
+    actions = [action for action, verbs in _ACTIONS if action != "query" and words & verbs]
+    if not actions:
+        actions = ["query"] if words & dict(_ACTIONS)["query"] else []
+    if len(actions) != 1:
+        return None
+    action = actions[0]
+    # "Create tasks for each of these steps" is one bulk insert
+    if action == "create" and target == "task" and "tasks" in words:
+        return "task_create_bulk"
+    return f"{target}_{action}"
+
+
+def is_multi_action(user_query: str) -> bool:
+    """
+    True when the request likely asks for several tool calls: more than one action verb
+    ("create task A and mark B done") or a create over plural goals ("create goals A, B and C").
+    Several tasks are one create_tasks_bulk call (see select_tool_family).
+    """
+    words = _words(user_query)
+    verbs = {verb for action, group in _ACTIONS if action != "query" for verb in group}
+    if sum(word in verbs for word in words) > 1:
+        return True
+    create_verbs = dict(_ACTIONS)["create"]
+    return bool(set(words) & create_verbs) and "goals" in words
+
+
+def _build_model(family: str) -> Type[BaseModel]:
+    tool_names, input_model = TOOL_FAMILIES[family]
+    name = "".join(part.capitalize() for part in family.split("_")) + "Decision"
+    return create_model(
+        name,
+        __doc__=f"Decision restricted to the {family.replace('_', ' ')} tools.",
+        tool_name=(Literal[tuple(tool_names)], ...),
+        tool_input=(input_model, ...),
+        time_context=(Optional[dict], Field(default=None, description="Parsed time context from user query")),
+    )
+
+
+NARROWED_DECISIONS: Dict[str, Type[BaseModel]] = {family: _build_model(family) for family in TOOL_FAMILIES}
+
+
+def decision_model_for(user_query: str) -> Type[BaseModel]:
+    """Return the narrowed decision model for the query, or the full AgentDecision."""
+    family = select_tool_family(user_query)
+    return NARROWED_DECISIONS[family] if family else AgentDecision
+
+
+def to_agent_decision(decision: BaseModel) -> AgentDecision:
+    """Convert a narrowed decision to the AgentDecision that agent_execute expects."""
+    if isinstance(decision, AgentDecision):
+        return decision
+    return AgentDecision(
+        tool_name=decision.tool_name,
+        tool_input=decision.tool_input,
+        time_context=decision.time_context,
+    )
@@ -0,0 +1,222 @@
+# app/services/goal_suggestions.py
+"""
+Goal suggestions for new tasks.
+
+After a task is created, the agent used to offer every goal as a numbered
+list and store the whole list in session state. With hundreds of goals that
+is a slow query, a reply nobody wants to hear read out, and a big state.
+
+Instead every goal is embedded (title + description) into its own vector
+table (GoalSuggestionSettings.table_name), kept in step with GoalDB by the
+session events below: goals created, renamed or deleted in a committed
+transaction are re-embedded or removed in the background. When a task is
+created, the task's text is embedded and the top_k nearest goals are
+looked up:
+
+- a best match at or above auto_link_threshold is linked right away,
+- otherwise the matches above min_similarity (at most top_k) are offered,
+- and with no close goal nothing is asked.
+
+Goals that existed before the table was introduced are indexed with
+python -m app.scripts.index_goals.
+"""
+import logging
+import queue
+import threading
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+import pandas as pd
+from pydantic import BaseModel
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.models.goal_models import GoalDB
+from app.services.rate_limiter import CallPriority, call_priority
+from app.services.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Goal records all live in one time partition; the record id is derived from the goal id
+_RECORD_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class GoalSuggestion(BaseModel):
+    """A goal close to a task's text; similarity is 1 - cosine distance."""
+    id: str
+    title: str
+    similarity: float
+
+
+def goal_text(title: str, description: Optional[str] = None) -> str:
+    """The text embedded for a goal or task."""
+    return f"{title}\n{description}" if description else title
+
+
+def record_id(goal_id) -> str:
+    """Stable UUIDv1 vector record id for a goal, so re-embedding a goal replaces its record."""
+    from timescale_vector.client import uuid_from_time
+
+    value = uuid.UUID(str(goal_id)).int
+    return str(uuid_from_time(_RECORD_TIME, node=value & (2 ** 48 - 1), clock_seq=(value >> 48) & 0x3FFF))
+
+
+class GoalIndex:
+    """Embeds goals in the background and finds the goals nearest to a text."""
+
+    def __init__(self, vector_store=None, queue_size: int = 500):
+        self._vector_store = vector_store
+        self._store_lock = threading.Lock()
+        self._table_ready = False
+        self._queue: "queue.Queue[Tuple[str, str, Optional[str], Optional[str]]]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="goal-indexer", daemon=True)
+        self._thread.start()
+
+    @property
+    def vector_store(self):
+        with self._store_lock:
+            if self._vector_store is None:
+                # Imported here so that importing this module does not open a database connection
+                from app.database.vector_store import VectorStore
+                self._vector_store = VectorStore(table_name=get_settings().goal_suggestions.table_name)
+            if not self._table_ready:
+                self._vector_store.create_tables()
+                self._table_ready = True
+            return self._vector_store
+
+    # -- indexing -------------------------------------------------------------
+
+    def schedule_upsert(self, goal_id, title: str, description: Optional[str] = None) -> None:
+        self._schedule(("upsert", str(goal_id), title, description))
+
+    def schedule_delete(self, goal_id) -> None:
+        self._schedule(("delete", str(goal_id), None, None))
+
+    def _schedule(self, item) -> None:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # The goal is picked up again by the next change or by app.scripts.index_goals
+            logger.warning(f"Goal index queue full, skipping {item[0]} of goal {item[1]}")
+
+    def join(self) -> None:
+        """Wait until every scheduled change has been applied."""
+        self._queue.join()
+
+    def index_goal(self, goal_id, title: str, description: Optional[str] = None) -> None:
+        store = self.vector_store
+        # Indexing is batch work: it must not take quota from interactive calls
+        with call_priority(CallPriority.BATCH):
+            embedding = store.get_embedding(goal_text(title, description))
+        record = {
+            "id": record_id(goal_id),
+            "metadata": {"goal_id": str(goal_id), "title": title},
+            "contents": goal_text(title, description),
+            "embedding": embedding,
+        }
+        store.upsert(pd.DataFrame([record]))
+
+    def remove_goal(self, goal_id) -> None:
+        self.vector_store.delete(ids=[record_id(goal_id)])
+
+    def _run(self) -> None:
+        while True:
+            action, goal_id, title, description = self._queue.get()
+            try:
+                if action == "upsert":
+                    self.index_goal(goal_id, title, description)
+                else:
+                    self.remove_goal(goal_id)
+            except Exception as e:
+                logger.error(f"Failed to {action} goal {goal_id} in the goal index: {e}")
+            finally:
+                self._queue.task_done()
+
+    # -- suggestions ----------------------------------------------------------
+
+    def nearest(self, text: str, limit: int) -> List[GoalSuggestion]:
+        """The goals nearest to the text, most similar first."""
+        results = self.vector_store.search(text, limit=limit, return_dataframe=False)
+        return [
+            GoalSuggestion(id=metadata["goal_id"], title=metadata["title"], similarity=1 - float(distance))
+            for _, metadata, _, _, distance in results
+        ]
+
+
+@lru_cache()
+def get_goal_index() -> GoalIndex:
+    return GoalIndex(queue_size=get_settings().goal_suggestions.queue_size)
+
+
+@traced()
+def suggest_goals(title: str, description: Optional[str] = None) -> List[GoalSuggestion]:
+    """
+    Goals worth offering for a new task, best first (at most top_k, all above min_similarity).
+    Returns [] when suggestions are disabled or the index is unavailable; task creation never fails on it.
+    """
+    settings = get_settings().goal_suggestions
+    if not settings.enabled:
+        return []
+    try:
+        suggestions = get_goal_index().nearest(goal_text(title, description), settings.top_k)
+    except Exception as e:
+        logger.warning(f"Goal suggestions unavailable: {e}")
+        return []
+    return [s for s in suggestions if s.similarity >= settings.min_similarity]
+
+
+def should_auto_link(suggestions: List[GoalSuggestion]) -> bool:
+    """True when the best suggestion is close enough to link without asking."""
+    return bool(suggestions) and suggestions[0].similarity >= get_settings().goal_suggestions.auto_link_threshold
+
+
+def reindex_goals(goals: Iterable[GoalDB]) -> int:
+    """Embed the given goals now (used to index goals created before the index existed)."""
+    index = get_goal_index()
+    count = 0
+    for goal in goals:
+        index.index_goal(goal.id, goal.title, goal.description)
+        count += 1
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Keeping the index in step with committed goal writes
+# ---------------------------------------------------------------------------
+
+_PENDING_KEY = "goal_index_changes"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_goal_changes(session: Session, flush_context) -> None:
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for goal in session.deleted:
+        if isinstance(goal, GoalDB):
+            pending[str(goal.id)] = None
+    for goal in list(session.new) + list(session.dirty):
+        if not isinstance(goal, GoalDB) or goal in session.deleted:
+            continue
+        state = inspect(goal)
+        if goal in session.new or state.attrs.title.history.has_changes() or state.attrs.description.history.has_changes():
+            pending[str(goal.id)] = (goal.title, goal.description)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_goal_changes(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or not get_settings().goal_suggestions.enabled:
+        return
+    index = get_goal_index()
+    for goal_id, change in pending.items():
+        if change is None:
+            index.schedule_delete(goal_id)
+        else:
+            index.schedule_upsert(goal_id, *change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_goal_changes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
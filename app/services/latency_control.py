@@ -0,0 +1,170 @@
+# app/services/latency_control.py
+"""
+Latency control for model and embedding calls.
+
+Three mechanisms keep one slow provider response from stalling a turn:
+
+1. Per-call deadlines: every call site has a deadline (LatencySettings).
+   The remaining time is also passed to the provider client as its
+   timeout, so an abandoned HTTP request ends on its own.
+2. Hedged requests: if a call is still running after its observed p95
+   latency (from llm_metrics), a duplicate request is sent. The first
+   valid response wins and the other one is abandoned (cancelled if it
+   has not started yet). Only the provider request is duplicated: the
+   callers take rate limit quota, record usage and write the cassette
+   once per call.
+3. Turn deadline: agent code wraps a whole turn in `with turn_deadline():`.
+   Per-call deadlines are clamped to the time left in the turn, and a call
+   with no time left fails fast with DeadlineExceeded so the caller can
+   fall back gracefully. Code that catches Exception around model calls
+   must let DeadlineExceeded through, so the turn ends with its timeout
+   answer instead of carrying on past the deadline.
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, List, Optional, TypeVar
+
+from app.config.settings import get_settings
+from app.services.llm_metrics import llm_metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Shared pool for model calls. Hedging needs at most two threads per call.
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+
+# Absolute (time.monotonic) end of the current turn, if one is active
+_turn_deadline_at: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("turn_deadline_at", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call (or the whole turn) runs out of time."""
+
+
+@contextmanager
+def turn_deadline(seconds: Optional[float] = None):
+    """
+    Bound all model calls made inside the block to one overall deadline.
+    Nested blocks keep the earlier (outer) deadline if it is tighter.
+    """
+    if seconds is None:
+        seconds = get_settings().latency.turn_deadline_ms / 1000
+    deadline_at = time.monotonic() + seconds
+    outer = _turn_deadline_at.get()
+    if outer is not None:
+        deadline_at = min(deadline_at, outer)
+    token = _turn_deadline_at.set(deadline_at)
+    try:
+        yield
+    finally:
+        _turn_deadline_at.reset(token)
+
+
+def remaining_turn_time() -> Optional[float]:
+    """Seconds left in the current turn, or None outside of a turn."""
+    deadline_at = _turn_deadline_at.get()
+    if deadline_at is None:
+        return None
+    return deadline_at - time.monotonic()
+
+
+def call_deadline(call_site: str) -> float:
+    """Deadline (seconds) for one call: the call site deadline clamped to the turn budget."""
+    settings = get_settings().latency
+    deadline = settings.deadlines_ms.get(call_site, settings.default_deadline_ms) / 1000
+    turn_remaining = remaining_turn_time()
+    if turn_remaining is not None:
+        deadline = min(deadline, turn_remaining)
+    return deadline
+
+
+def _hedge_delay(call_site: str) -> Optional[float]:
+    """Seconds to wait before sending a hedged duplicate, or None to not hedge."""
+    settings = get_settings().latency
+    if not settings.hedge_enabled or llm_metrics.sample_count(call_site) < settings.hedge_min_samples:
+        return None
+    p95_ms = llm_metrics.percentile(call_site, settings.hedge_percentile)
+    return p95_ms / 1000 if p95_ms is not None else None
+
+
+def _submit(fn: Callable[[float], T], timeout: float) -> Future:
+    # Each attempt runs in its own copy of the caller's context (request ID, turn deadline...)
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, fn, timeout)
+
+
+def call_with_deadline(
+    call_site: str,
+    fn: Callable[[float], T],
+    deadline: Optional[float] = None,
+    hedge_after: Optional[float] = None,
+    hedge: bool = True,
+) -> T:
+    """
+    Run fn(timeout_seconds) under the call site's deadline, hedging slow calls.
+
+    Args:
+        call_site: Name used to look up the deadline and the observed latency.
+        fn: The provider call. It receives the time left, to pass on as the client timeout.
+        deadline: Override the deadline in seconds (defaults to settings, clamped to the turn).
+        hedge_after: Override the hedge delay in seconds (defaults to the observed p95).
+        hedge: Set to False to never send a duplicate (e.g. for a capacity-limited local server).
+
+    Raises:
+        DeadlineExceeded: if no valid response arrives in time.
+        The last call's exception if every attempt failed before the deadline.
+    """
+    deadline = call_deadline(call_site) if deadline is None else deadline
+    if deadline <= 0:
+        raise DeadlineExceeded(f"No time left in the turn for call site '{call_site}'")
+    if not hedge:
+        hedge_after = None
+    elif hedge_after is None:
+        hedge_after = _hedge_delay(call_site)
+    if hedge_after is not None and hedge_after >= deadline:
+        hedge_after = None  # a hedge sent at the deadline would be useless
+
+    start = time.monotonic()
+    pending: List[Future] = [_submit(fn, deadline)]
+    hedged = False
+    last_error: Optional[BaseException] = None
+
+    while pending:
+        elapsed = time.monotonic() - start
+        # Wake up at the hedge point (if not hedged yet), otherwise at the deadline
+        wake_at = hedge_after if (hedge_after is not None and not hedged) else deadline
+        done, not_done = wait(pending, timeout=max(0.0, wake_at - elapsed), return_when=FIRST_COMPLETED)
+        pending = list(not_done)
+
+        for future in done:
+            error = future.exception()
+            if error is None:
+                # First valid response wins; abandon the other attempt
+                for other in pending:
+                    other.cancel()
+                if hedged:
+                    logger.info(f"Hedged call for '{call_site}' answered after {(time.monotonic() - start) * 1000:.0f}ms")
+                return future.result()
+            last_error = error
+            logger.warning(f"Call attempt for '{call_site}' failed: {error}")
+
+        elapsed = time.monotonic() - start
+        if not hedged and hedge_after is not None and elapsed >= hedge_after and elapsed < deadline:
+            # Slower than usual: send a duplicate with whatever time is left
+            hedged = True
+            logger.info(f"Call for '{call_site}' passed its p{get_settings().latency.hedge_percentile:.0f} "
+                        f"({hedge_after * 1000:.0f}ms), sending a hedged request")
+            pending.append(_submit(fn, deadline - elapsed))
+            continue
+
+        if elapsed >= deadline:
+            for future in pending:
+                future.cancel()
+            raise DeadlineExceeded(f"Call site '{call_site}' exceeded its {deadline * 1000:.0f}ms deadline")
+
+    # Every attempt failed before the deadline
+    raise last_error
@@ -0,0 +1,155 @@
+# app/services/llm_cassette.py
+"""
+Record/replay of model calls ("cassettes").
+
+With ReplaySettings.mode = "record", every structured completion and every
+embedding is saved to a JSON cassette file. With mode = "replay", LLMFactory
+and VectorStore answer from that file instead of calling the provider, after
+a configurable synthetic latency.
+
+This lets us run the agent pipeline (routing, parsing, DB work) offline and
+under high concurrency, without paying for or waiting on real model calls.
+
+Lookup order when replaying a completion:
+1. exact match on (call site, response model, messages)
+2. otherwise the most recent recording for (call site, response model),
+   because prompts contain volatile values (dates, context) that rarely
+   match exactly between runs.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel
+
+from app.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when the cassette has no recording for a call."""
+
+
+def _hash(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Cassette:
+    """A JSON file of recorded completions and embeddings, safe to share between threads."""
+
+    def __init__(self, path: str, mode: str = "replay", latency_ms: int = 0, latency_jitter_ms: int = 0,
+                 call_site_latency_ms: Optional[Dict[str, int]] = None, seed: int = 42):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of {CASSETTE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.call_site_latency_ms = call_site_latency_ms or {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Any]] = {"completions": {}, "latest": {}, "embeddings": {}}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._data.update(json.load(f))
+            logger.info(
+                f"Loaded cassette {path}: {len(self._data['completions'])} completions, "
+                f"{len(self._data['embeddings'])} embeddings"
+            )
+
+    # -- keys ---------------------------------------------------------------
+
+    @staticmethod
+    def _completion_key(call_site: str, response_model: Type[BaseModel], messages: List[Dict[str, str]]) -> str:
+        return _hash({"call_site": call_site, "model": response_model.__name__, "messages": messages})
+
+    @staticmethod
+    def _latest_key(call_site: str, response_model: Type[BaseModel]) -> str:
+        return f"{call_site}:{response_model.__name__}"
+
+    @staticmethod
+    def _embedding_key(model: str, text: str) -> str:
+        return _hash({"model": model, "text": text})
+
+    # -- record -------------------------------------------------------------
+
+    def record_completion(self, call_site: str, response_model: Type[BaseModel],
+                          messages: List[Dict[str, str]], completion: BaseModel) -> None:
+        data = completion.model_dump(mode="json")
+        with self._lock:
+            self._data["completions"][self._completion_key(call_site, response_model, messages)] = data
+            self._data["latest"][self._latest_key(call_site, response_model)] = data
+            self._save()
+
+    def record_embedding(self, model: str, text: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._data["embeddings"][self._embedding_key(model, text)] = embedding
+            self._save()
+
+    def _save(self) -> None:
+        # Write to a temp file first so a crash never leaves a half-written cassette
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self.path)
+
+    # -- replay -------------------------------------------------------------
+
+    def _sleep(self, call_site: str) -> None:
+        latency = self.call_site_latency_ms.get(call_site, self.latency_ms)
+        if self.latency_jitter_ms:
+            with self._lock:
+                latency += self._random.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def replay_completion(self, call_site: str, response_model: Type[BaseModel],
+                          messages: List[Dict[str, str]]) -> BaseModel:
+        with self._lock:
+            data = self._data["completions"].get(self._completion_key(call_site, response_model, messages))
+            if data is None:
+                data = self._data["latest"].get(self._latest_key(call_site, response_model))
+        if data is None:
+            raise CassetteMiss(f"No recorded {response_model.__name__} for call site '{call_site}' in {self.path}")
+        self._sleep(call_site)
+        return response_model.model_validate(data)
+
+    def replay_embedding(self, model: str, text: str) -> List[float]:
+        with self._lock:
+            embedding = self._data["embeddings"].get(self._embedding_key(model, text))
+        if embedding is None:
+            # Unknown text: derive a stable pseudo-embedding so vector search still runs
+            dimensions = get_settings().vector_store.embedding_dimensions
+            rng = random.Random(self._embedding_key(model, text))
+            embedding = [rng.uniform(-1, 1) for _ in range(dimensions)]
+        self._sleep("embedding")
+        return embedding
+
+
+@lru_cache()
+def get_cassette() -> Optional[Cassette]:
+    """Return the process-wide cassette, or None when record/replay is off."""
+    settings = get_settings().replay
+    if settings.mode == "off":
+        return None
+    logger.info(f"LLM cassette in '{settings.mode}' mode: {settings.cassette_path}")
+    return Cassette(
+        settings.cassette_path,
+        mode=settings.mode,
+        latency_ms=settings.latency_ms,
+        latency_jitter_ms=settings.latency_jitter_ms,
+        call_site_latency_ms=settings.call_site_latency_ms,
+        seed=settings.seed,
+    )
@@ -1,18 +1,63 @@
-from typing import Any, Dict, List, Type
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Type
 
 import instructor
 from anthropic import Anthropic
+from instructor.exceptions import InstructorRetryException
 from openai import OpenAI
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 import logging
 from app.config.settings import get_settings
+from app.services.latency_control import DeadlineExceeded, call_deadline, call_with_deadline
+from app.services.llm_cassette import get_cassette
+from app.services.llm_metrics import CallTimer, usage_counts
+from app.services.prompt_builder import count_message_tokens, count_tokens, record_provider_usage
+from app.services.rate_limiter import find_rate_limit_error, get_rate_limiter, retry_after_seconds
 
 logger = logging.getLogger(__name__)
+
+# Timer of the call running in the current thread/task, so instructor hooks
+# (which only receive the error) can count validation retries on it.
+_current_call: contextvars.ContextVar[Optional[CallTimer]] = contextvars.ContextVar("current_llm_call", default=None)
+
+
+# One semaphore per provider with a max_concurrency setting (e.g. a local CPU server)
+_provider_slots: Dict[str, threading.BoundedSemaphore] = {}
+_provider_slots_lock = threading.Lock()
+
+
+@contextmanager
+def _concurrency_slot(provider: str, max_concurrency: Optional[int], timeout: float):
+    """Hold one of the provider's call slots for the duration of the block."""
+    if not max_concurrency:
+        yield
+        return
+    with _provider_slots_lock:
+        slots = _provider_slots.setdefault(provider, threading.BoundedSemaphore(max_concurrency))
+    if not slots.acquire(timeout=timeout):
+        raise DeadlineExceeded(f"No free '{provider}' slot within {timeout * 1000:.0f}ms")
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+def _count_validation_retry(error: Exception) -> None:
+    """instructor 'parse:error' hook: the response failed validation and will be retried."""
+    timer = _current_call.get()
+    if timer is not None:
+        timer.add_retry()
+
+
 class LLMFactory:
     def __init__(self, provider: str):
         self.provider = provider
         self.settings = getattr(get_settings(), provider)
         self.client = self._initialize_client()
+        self.client.on("parse:error", _count_validation_retry)
 
     def _initialize_client(self) -> Any:
         client_initializers = {
@@ -22,7 +67,7 @@ class LLMFactory:
             ),
             "llama": lambda s: instructor.from_openai(
                 OpenAI(base_url=s.base_url, api_key=s.api_key),
-                mode=instructor.Mode.JSON,
+                mode=instructor.Mode(s.instructor_mode),
             ),
         }
 
@@ -31,16 +76,194 @@ class LLMFactory:
             return initializer(self.settings)
         raise ValueError(f"Unsupported LLM provider: {self.provider}")
 
+    @classmethod
+    def for_call_site(cls, call_site: str) -> "LLMFactory":
+        """Create a factory for the provider routed to this call site (see ProviderRoutingSettings)."""
+        return cls(provider=get_settings().provider_for(call_site))
+
+    def resolve_model(self, call_site: str) -> str:
+        """Return the model routed to this call site (see call_site_models in settings)."""
+        return self.settings.call_site_models.get(call_site, self.settings.default_model)
+
+    def _can_escalate(self, model: str) -> bool:
+        escalation_model = self.settings.escalation_model
+        return bool(escalation_model) and escalation_model != model
+
     def create_completion(
-        self, response_model: Type[BaseModel], messages: List[Dict[str, str]], **kwargs
+        self,
+        response_model: Type[BaseModel],
+        messages: List[Dict[str, str]],
+        call_site: str = "default",
+        escalate_if: Optional[Callable[[Any], bool]] = None,
+        **kwargs,
     ) -> Any:
+        """
+        Run a structured completion and return the parsed response_model instance.
+
+        call_site names the caller (e.g. "intent", "decision"). It picks the model from
+        the settings routing map and lets usage be tracked per call site.
+
+        If validation fails on a smaller model, or escalate_if(result) returns True
+        (e.g. low confidence), the call is retried once on the escalation model.
+        """
+        completion_params = {
+            "model": kwargs.get("model") or self.resolve_model(call_site),
+            "temperature": kwargs.get("temperature", self.settings.temperature),
+            "max_retries": kwargs.get("max_retries", self.settings.max_retries),
+            "max_tokens": kwargs.get("max_tokens", self.settings.max_tokens),
+            "response_model": response_model,
+            "messages": messages,
+        }
+        model = completion_params["model"]
+        try:
+            completion = self._run_completion(completion_params, call_site)
+        except (InstructorRetryException, ValidationError) as e:
+            if not self._can_escalate(model):
+                raise
+            logger.warning(
+                f"Validation failed on {model} for call site '{call_site}', "
+                f"escalating to {self.settings.escalation_model}: {e}"
+            )
+            return self._run_completion({**completion_params, "model": self.settings.escalation_model}, call_site)
+
+        if escalate_if and self._can_escalate(model) and escalate_if(completion):
+            logger.info(
+                f"Result from {model} for call site '{call_site}' did not pass its check, "
+                f"escalating to {self.settings.escalation_model}"
+            )
+            completion = self._run_completion({**completion_params, "model": self.settings.escalation_model}, call_site)
+        return completion
+
+    def _run_completion(self, completion_params: Dict[str, Any], call_site: str) -> Any:
+        # Logging the full params (every message) at INFO was slow and noisy; keep a short debug line.
+        # The per-call summary (latency, tokens, retries) is logged by llm_metrics.
+        logger.debug(
+            f"Completion for '{call_site}': model={completion_params['model']} "
+            f"messages={len(completion_params['messages'])} response_model={completion_params['response_model'].__name__}"
+        )
+        # Bounded by the call site deadline (and the turn deadline), including the wait for quota
+        deadline = call_deadline(call_site)
+        if deadline <= 0:
+            raise DeadlineExceeded(f"No time left in the turn for call site '{call_site}'")
+        # Slow requests get a hedged duplicate, except to a capacity-capped (local) server,
+        # where the duplicate would only queue behind the first one
+        hedge = not self.settings.max_concurrency
+
+        cassette = get_cassette()
+        if cassette is not None and cassette.mode == "replay":
+            # Offline: answer from the recorded cassette (its synthetic latency stands in for the provider's)
+            with CallTimer(call_site, "replay", completion_params["model"]):
+                return call_with_deadline(
+                    call_site,
+                    lambda timeout: cassette.replay_completion(
+                        call_site, completion_params["response_model"], completion_params["messages"]
+                    ),
+                    deadline=deadline,
+                    hedge=hedge,
+                )
+
+        # Wait for our share of the provider quota (interactive calls go before batch work)
+        limiter = get_rate_limiter()
+        started = time.monotonic()
+        estimated_tokens = count_message_tokens(completion_params["messages"]) + (completion_params["max_tokens"] or 0)
+        reserved_tokens = limiter.acquire(self.provider, estimated_tokens, timeout=deadline)
+
+        with _concurrency_slot(self.provider, self.settings.max_concurrency,
+                               max(0.1, deadline - (time.monotonic() - started))), \
+                CallTimer(call_site, self.provider, completion_params["model"]) as timer:
+            token = _current_call.set(timer)
+            try:
+                # Only the provider request is hedged, so quota, usage and the cassette are accounted once.
+                # create_with_completion also returns the raw provider response, which carries the usage report.
+                # The timeout makes an abandoned (hedged or timed-out) HTTP request end on its own.
+                completion, raw_completion = call_with_deadline(
+                    call_site,
+                    lambda timeout: self.client.chat.completions.create_with_completion(
+                        **completion_params, timeout=timeout
+                    ),
+                    deadline=max(0.1, deadline - (time.monotonic() - started)),
+                    hedge=hedge,
+                )
+            except Exception as e:
+                rate_limit_error = find_rate_limit_error(e)
+                if rate_limit_error is not None:
+                    limiter.on_rate_limited(self.provider, retry_after_seconds(rate_limit_error))
+                raise
+            finally:
+                _current_call.reset(token)
+            usage = getattr(raw_completion, "usage", None)
+            timer.set_usage(usage)
+        prompt_tokens, completion_tokens, _ = usage_counts(usage)
+        limiter.settle(self.provider, reserved_tokens, prompt_tokens + completion_tokens)
+        # Record prompt and cached tokens so we can verify the provider prompt-cache hit rate
+        record_provider_usage(call_site, usage)
+        if cassette is not None and cassette.mode == "record":
+            cassette.record_completion(
+                call_site, completion_params["response_model"], completion_params["messages"], completion
+            )
+        return completion
+
+    def stream_completion(
+        self,
+        response_model: Type[BaseModel],
+        messages: List[Dict[str, str]],
+        call_site: str = "default",
+        **kwargs,
+    ) -> Iterator[BaseModel]:
+        """
+        Stream a structured completion as partial objects (instructor partial streaming).
+
+        Every yielded object is a partial response_model whose fields fill in as the JSON arrives.
+        The last object is validated against the full response_model, so callers can rely on it.
+        There is no hedging or escalation here: once tokens have been shown to the user the call
+        cannot be swapped. The call site deadline is passed to the provider as its timeout.
+        """
         completion_params = {
-            "model": kwargs.get("model", self.settings.default_model),
+            "model": kwargs.get("model") or self.resolve_model(call_site),
             "temperature": kwargs.get("temperature", self.settings.temperature),
             "max_retries": kwargs.get("max_retries", self.settings.max_retries),
             "max_tokens": kwargs.get("max_tokens", self.settings.max_tokens),
             "response_model": response_model,
             "messages": messages,
         }
-        logger.info(f"Completion params: {completion_params}")
-        return self.client.chat.completions.create(**completion_params)
+        timeout = call_deadline(call_site)
+        if timeout <= 0:
+            raise DeadlineExceeded(f"No time left in the turn for call site '{call_site}'")
+
+        cassette = get_cassette()
+        if cassette is not None and cassette.mode == "replay":
+            with CallTimer(call_site, "replay", completion_params["model"]) as timer:
+                completion = cassette.replay_completion(call_site, response_model, messages)
+                timer.mark_first_token()
+            yield completion
+            return
+
+        limiter = get_rate_limiter()
+        prompt_tokens = count_message_tokens(messages)
+        reserved_tokens = limiter.acquire(self.provider, prompt_tokens + (completion_params["max_tokens"] or 0),
+                                          timeout=timeout)
+
+        partial = None
+        # No _current_call binding here: a generator may resume in another context (e.g. another
+        # worker thread of the streaming response), where resetting the context variable would fail.
+        with _concurrency_slot(self.provider, self.settings.max_concurrency, timeout), \
+                CallTimer(call_site, self.provider, completion_params["model"]) as timer:
+            try:
+                # Streamed responses carry no usage report, so only latency and time to first token are recorded
+                for partial in self.client.chat.completions.create_partial(**completion_params, timeout=timeout):
+                    timer.mark_first_token()
+                    yield partial
+            except Exception as e:
+                rate_limit_error = find_rate_limit_error(e)
+                if rate_limit_error is not None:
+                    limiter.on_rate_limited(self.provider, retry_after_seconds(rate_limit_error))
+                raise
+
+        if partial is None:
+            raise ValueError(f"Streamed completion for '{call_site}' returned no data")
+        completion = response_model.model_validate(partial.model_dump())
+        # No usage report to settle with: count the prompt and the streamed answer ourselves
+        limiter.settle(self.provider, reserved_tokens, prompt_tokens + count_tokens(completion.model_dump_json()))
+        if cassette is not None and cassette.mode == "record":
+            cassette.record_completion(call_site, response_model, messages, completion)
+        yield completion
@@ -0,0 +1,286 @@
+# app/services/llm_metrics.py
+"""
+Instrumentation for every model call (LLM completions and embeddings).
+
+Each call produces one LLMCallRecord with:
+- call site, provider and model
+- wall time, and time to first token for streamed calls
+- prompt / completion / cached tokens from the provider usage report
+- the number of instructor validation retries
+
+Records are aggregated into per-call-site histograms (exposed in
+Prometheus text format by the /metrics endpoint) and also kept per
+request ID, so one slow HTTP request can be broken down call by call.
+
+The request ID is stored in a context variable. The HTTP middleware in
+main.py sets it for every request (from the X-Request-ID header or a new
+UUID); code running outside a request has no request ID.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.services.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets. The last bucket (+Inf) is implicit.
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+TOKEN_BUCKETS = [100, 250, 500, 1000, 2000, 4000, 8000, 16000]
+
+# Number of recent samples kept per histogram to compute percentiles
+PERCENTILE_WINDOW = 500
+# Number of request IDs whose call records are kept in memory
+MAX_TRACKED_REQUESTS = 1000
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+
+def set_request_id(request_id: Optional[str]) -> contextvars.Token:
+    """Bind a request ID to the current context (returns a token for reset)."""
+    return request_id_var.set(request_id)
+
+
+def get_request_id() -> Optional[str]:
+    """Return the request ID bound to the current context, if any."""
+    return request_id_var.get()
+
+
+class LLMCallRecord(BaseModel):
+    """Measurements for a single model call."""
+
+    request_id: Optional[str] = Field(default=None, description="HTTP request that triggered the call")
+    call_site: str = Field(description="Caller name, e.g. 'intent' or 'decision'")
+    provider: str = Field(description="Provider name, e.g. 'openai'")
+    model: str = Field(description="Model used for the call")
+    started_at: datetime = Field(description="When the call started (UTC)")
+    wall_time_ms: float = Field(description="Total time spent in the call")
+    time_to_first_token_ms: Optional[float] = Field(default=None, description="Only set for streamed calls")
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    retries: int = Field(default=0, description="Instructor validation retries")
+    success: bool = True
+    error: Optional[str] = None
+
+
+def usage_counts(usage: Any) -> Tuple[int, int, int]:
+    """
+    Return (prompt_tokens, completion_tokens, cached_tokens) from a provider usage object.
+
+    Supports OpenAI (prompt_tokens, completion_tokens, prompt_tokens_details.cached_tokens)
+    and Anthropic (input_tokens, output_tokens, cache_read_input_tokens) shapes.
+    """
+    if usage is None:
+        return 0, 0, 0
+    if hasattr(usage, "prompt_tokens"):
+        details = getattr(usage, "prompt_tokens_details", None)
+        return (
+            usage.prompt_tokens or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+            getattr(details, "cached_tokens", 0) or 0,
+        )
+    cached = getattr(usage, "cache_read_input_tokens", 0) or 0
+    # Anthropic reports cached input separately from the uncached input
+    return (getattr(usage, "input_tokens", 0) or 0) + cached, getattr(usage, "output_tokens", 0) or 0, cached
+
+
+class Histogram:
+    """Cumulative bucket histogram plus a sliding window of samples for percentiles."""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self._window: Deque[float] = deque(maxlen=PERCENTILE_WINDOW)
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self._window.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the q-th percentile (0-100) of the recent samples, or None without samples."""
+        if not self._window:
+            return None
+        ordered = sorted(self._window)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class LLMMetrics:
+    """Thread-safe store of call records and per-call-site histograms."""
+
+    # Histograms kept per call site: LLMCallRecord attribute -> bucket bounds
+    HISTOGRAMS = {
+        "wall_time_ms": LATENCY_BUCKETS_MS,
+        "time_to_first_token_ms": LATENCY_BUCKETS_MS,
+        "prompt_tokens": TOKEN_BUCKETS,
+        "completion_tokens": TOKEN_BUCKETS,
+        "cached_tokens": TOKEN_BUCKETS,
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[str, Histogram]] = defaultdict(
+            lambda: {name: Histogram(buckets) for name, buckets in self.HISTOGRAMS.items()}
+        )
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0})
+        self._by_request: "OrderedDict[str, List[LLMCallRecord]]" = OrderedDict()
+
+    def record(self, record: LLMCallRecord) -> None:
+        with self._lock:
+            histograms = self._histograms[record.call_site]
+            for name in self.HISTOGRAMS:
+                value = getattr(record, name)
+                if value is not None:
+                    histograms[name].observe(value)
+            counters = self._counters[record.call_site]
+            counters["calls"] += 1
+            counters["retries"] += record.retries
+            counters["errors"] += 0 if record.success else 1
+
+            if record.request_id:
+                self._by_request.setdefault(record.request_id, []).append(record)
+                self._by_request.move_to_end(record.request_id)
+                while len(self._by_request) > MAX_TRACKED_REQUESTS:
+                    self._by_request.popitem(last=False)
+
+        logger.info(
+            f"LLM call '{record.call_site}' model={record.model} {record.wall_time_ms:.0f}ms "
+            f"prompt={record.prompt_tokens} completion={record.completion_tokens} "
+            f"cached={record.cached_tokens} retries={record.retries}"
+            + ("" if record.success else f" error={record.error}")
+        )
+
+    def percentile(self, call_site: str, q: float, name: str = "wall_time_ms") -> Optional[float]:
+        """Return a percentile of one histogram for a call site (None without samples)."""
+        with self._lock:
+            if call_site not in self._histograms:
+                return None
+            return self._histograms[call_site][name].percentile(q)
+
+    def sample_count(self, call_site: str, name: str = "wall_time_ms") -> int:
+        with self._lock:
+            if call_site not in self._histograms:
+                return 0
+            return self._histograms[call_site][name].count
+
+    def calls_for_request(self, request_id: str) -> List[LLMCallRecord]:
+        with self._lock:
+            return list(self._by_request.get(request_id, []))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """JSON-friendly summary: counters and histogram summaries per call site."""
+        with self._lock:
+            return {
+                site: {
+                    **self._counters[site],
+                    **{name: histogram.summary() for name, histogram in histograms.items()},
+                }
+                for site, histograms in self._histograms.items()
+            }
+
+    def prometheus_text(self) -> str:
+        """Render all histograms and counters in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in self.HISTOGRAMS:
+                metric = f"llm_call_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for site, histograms in self._histograms.items():
+                    histogram = histograms[name]
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ["+Inf"], histogram.bucket_counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{call_site="{site}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{call_site="{site}"}} {histogram.total}')
+                    lines.append(f'{metric}_count{{call_site="{site}"}} {histogram.count}')
+            for counter in ("calls", "errors", "retries"):
+                metric = f"llm_call_{counter}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for site, counters in self._counters.items():
+                    lines.append(f'{metric}{{call_site="{site}"}} {counters[counter]}')
+        return "\n".join(lines) + "\n"
+
+
+llm_metrics = LLMMetrics()
+
+
+class CallTimer:
+    """
+    Measures one model call and records it on exit.
+
+    Usage:
+        with CallTimer("intent", "openai", "gpt-4o-mini") as timer:
+            result, raw = client.create_with_completion(...)
+            timer.set_usage(raw.usage)
+    """
+
+    def __init__(self, call_site: str, provider: str, model: str):
+        self.record = LLMCallRecord(
+            request_id=get_request_id(),
+            call_site=call_site,
+            provider=provider,
+            model=model,
+            started_at=datetime.now(timezone.utc),
+            wall_time_ms=0.0,
+        )
+        self._start = 0.0
+        self._span = None
+
+    def __enter__(self) -> "CallTimer":
+        self._start = time.perf_counter()
+        # Not made the current span: a streamed call's generator can resume in another context
+        self._span = start_span(f"model {self.record.call_site}", {
+            "llm.provider": self.record.provider,
+            "llm.model": self.record.model,
+        })
+        return self
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def mark_first_token(self) -> None:
+        """Call when the first streamed chunk arrives (only the first call counts)."""
+        if self.record.time_to_first_token_ms is None:
+            self.record.time_to_first_token_ms = self.elapsed_ms()
+
+    def set_usage(self, usage: Any) -> None:
+        prompt, completion, cached = usage_counts(usage)
+        self.record.prompt_tokens = prompt
+        self.record.completion_tokens = completion
+        self.record.cached_tokens = cached
+
+    def add_retry(self) -> None:
+        self.record.retries += 1
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.record.wall_time_ms = self.elapsed_ms()
+        if exc is not None:
+            self.record.success = False
+            self.record.error = f"{exc_type.__name__}: {exc}"
+            self._span.record_error(exc)
+        for name in ("prompt_tokens", "completion_tokens", "cached_tokens", "retries", "time_to_first_token_ms"):
+            self._span.set_attribute(f"llm.{name}", getattr(self.record, name))
+        self._span.end()
+        llm_metrics.record(self.record)
+        return False
@@ -0,0 +1,288 @@
+# app/services/prompt_builder.py
+"""
+Token-budgeted prompt assembly.
+
+Every LLM call site builds its message list through a PromptBuilder.
+The builder counts tokens locally with tiktoken and keeps the prompt
+under the call site's budget (see PromptBudgetSettings):
+
+1. The system instructions and the latest user message are always kept.
+2. Older history messages are dropped first (oldest -> newest).
+   Dropped messages are compacted into one short "earlier messages" line.
+3. If the prompt is still too large, the context section is trimmed,
+   again starting with its oldest (top) lines. The "earlier messages"
+   line is only left out when it does not fit even with all context gone.
+
+The final prompt size is recorded per call site so we can watch prompt
+bloat over time with get_prompt_token_stats().
+
+Layout: static instructions always come first and volatile data last
+(context, compacted history, per-request values), so consecutive requests
+share a cacheable prefix (see prompt_templates.py). The cached token
+counts the provider reports back are recorded with record_provider_usage().
+"""
+import logging
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import tiktoken
+
+from app.config.settings import get_settings
+from app.services.llm_metrics import usage_counts
+from app.services.prompt_templates import get_template
+
+logger = logging.getLogger(__name__)
+
+# Fixed token overhead that the chat format adds around every message,
+# plus the tokens used to prime the assistant reply (OpenAI cookbook values).
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+# Max characters kept per message when compacting dropped history
+COMPACT_SNIPPET_CHARS = 80
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Load (once) the tiktoken encoding for a model, or None if unavailable."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Unknown model name: fall back to the encoding used by recent OpenAI models
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its files on first use; offline we approximate instead
+        logger.warning(f"tiktoken encoding unavailable, approximating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count the tokens of a piece of text locally."""
+    if not text:
+        return 0
+    encoding = _get_encoding(model or get_settings().prompt_budget.encoding_model)
+    if encoding is None:
+        # Rough rule of thumb: ~4 characters per token for English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: Optional[str] = None) -> int:
+    """Count the tokens of a full chat message list (content + format overhead)."""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + count_tokens(message.get("content", ""), model)
+    return total
+
+
+class _PromptTokenStats:
+    """Thread-safe running prompt-size statistics, one entry per call site."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _entry(self, call_site: str) -> Dict[str, int]:
+        return self._stats.setdefault(
+            call_site,
+            {
+                "calls": 0, "total_tokens": 0, "max_tokens": 0, "last_tokens": 0, "dropped_messages": 0,
+                # Filled from the provider's usage report (see record_provider_usage)
+                "provider_calls": 0, "provider_prompt_tokens": 0, "cached_tokens": 0,
+            },
+        )
+
+    def record(self, call_site: str, tokens: int, dropped_messages: int) -> None:
+        with self._lock:
+            entry = self._entry(call_site)
+            entry["calls"] += 1
+            entry["total_tokens"] += tokens
+            entry["max_tokens"] = max(entry["max_tokens"], tokens)
+            entry["last_tokens"] = tokens
+            entry["dropped_messages"] += dropped_messages
+
+    def record_usage(self, call_site: str, prompt_tokens: int, cached_tokens: int) -> None:
+        with self._lock:
+            entry = self._entry(call_site)
+            entry["provider_calls"] += 1
+            entry["provider_prompt_tokens"] += prompt_tokens
+            entry["cached_tokens"] += cached_tokens
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                site: {
+                    **entry,
+                    "avg_tokens": entry["total_tokens"] / entry["calls"] if entry["calls"] else 0.0,
+                    # Share of prompt tokens served from the provider's prompt cache
+                    "cache_hit_rate": (
+                        entry["cached_tokens"] / entry["provider_prompt_tokens"]
+                        if entry["provider_prompt_tokens"] else 0.0
+                    ),
+                }
+                for site, entry in self._stats.items()
+            }
+
+
+_prompt_stats = _PromptTokenStats()
+
+
+def get_prompt_token_stats() -> Dict[str, Dict[str, float]]:
+    """Return prompt token statistics (calls, avg/max/last tokens, cache hit rate) per call site."""
+    return _prompt_stats.snapshot()
+
+
+def record_provider_usage(call_site: str, usage) -> None:
+    """Record the prompt and cached token counts from a provider usage object (OpenAI or Anthropic)."""
+    if usage is None:
+        return
+    prompt_tokens, _, cached_tokens = usage_counts(usage)
+    _prompt_stats.record_usage(call_site, prompt_tokens, cached_tokens)
+
+
+class PromptBuilder:
+    """
+    Collects the parts of a prompt and assembles them under a token budget.
+
+    Usage:
+        builder = PromptBuilder.from_template("decision")  # static instructions first
+        builder.add_context("Current Conversation Context", context.to_prompt())
+        builder.add_volatile("Current time context", "2025-03-22")  # one of the template's volatile_fields
+        builder.add_history(conversation_messages)  # last message = current user turn
+        messages = builder.build()
+    """
+
+    def __init__(self, call_site: str, budget: Optional[int] = None, model: Optional[str] = None):
+        all_settings = get_settings()
+        settings = all_settings.prompt_budget
+        self.call_site = call_site
+        self.budget = budget or settings.budgets.get(call_site, settings.default_budget)
+        # A local model may have a small context window: leave room for its reply
+        provider_settings = getattr(all_settings, all_settings.provider_for(call_site), None)
+        context_size = getattr(provider_settings, "context_size", None)
+        if context_size:
+            self.budget = min(self.budget, context_size - (provider_settings.max_tokens or 0))
+        self.model = model or settings.encoding_model
+        self.history_limit = settings.history_messages
+        self._system_parts: List[str] = []
+        self._context_label: Optional[str] = None
+        self._context_lines: List[str] = []
+        self._history: List[Dict[str, str]] = []
+        self._extra_messages: List[Dict[str, str]] = []
+        self._volatile_parts: List[Tuple[str, str]] = []
+        # Labels add_volatile() accepts, in render order (set from a template's volatile_fields)
+        self._volatile_fields: Optional[List[str]] = None
+        self._template_name: Optional[str] = None
+
+    @classmethod
+    def from_template(cls, template_name: str, call_site: Optional[str] = None, **kwargs) -> "PromptBuilder":
+        """Create a builder whose system message starts with a registered template's static instructions."""
+        template = get_template(template_name)
+        builder = cls(call_site or template.name, **kwargs).add_system(template.instructions)
+        builder._volatile_fields = list(template.volatile_fields)
+        builder._template_name = template.name
+        return builder
+
+    def add_system(self, text: str) -> "PromptBuilder":
+        """Add instructions to the system message. These are never trimmed."""
+        self._system_parts.append(text.strip())
+        return self
+
+    def add_context(self, label: str, text: Optional[str]) -> "PromptBuilder":
+        """Add a trimmable context section, appended after the system instructions."""
+        if text:
+            self._context_label = label
+            self._context_lines = text.strip().split("\n")
+        return self
+
+    def add_volatile(self, label: str, value) -> "PromptBuilder":
+        """
+        Add a per-request value. Volatile values are rendered last so they never break the cached prefix.
+        A builder made from a template only accepts the labels in its volatile_fields (ValueError otherwise),
+        and renders them in that order whatever order they were added in.
+        """
+        if self._volatile_fields is not None and label not in self._volatile_fields:
+            declared = ", ".join(self._volatile_fields) or "none"
+            raise ValueError(f"'{label}' is not a volatile field of template '{self._template_name}' (declared: {declared})")
+        if value not in (None, ""):
+            self._volatile_parts.append((label, f"{label}: {value}"))
+        return self
+
+    def add_history(self, messages: List[Dict[str, str]]) -> "PromptBuilder":
+        """
+        Add conversation history. The last message is the current turn and is always kept;
+        older ones are dropped oldest-first when over budget.
+        """
+        window = messages[-self.history_limit:] if self.history_limit else messages
+        self._history = [{"role": m["role"], "content": m["content"]} for m in window]
+        return self
+
+    def add_message(self, role: str, content: str) -> "PromptBuilder":
+        """Add a message that must be kept as-is (e.g. retrieved documents)."""
+        self._extra_messages.append({"role": role, "content": content})
+        return self
+
+    def _assemble(self, context_lines: List[str], history: List[Dict[str, str]], compacted: Optional[str]) -> List[Dict[str, str]]:
+        system_text = "\n\n".join(self._system_parts)
+        if context_lines:
+            system_text += f"\n\n{self._context_label}:\n" + "\n".join(context_lines)
+        if compacted:
+            system_text += f"\n\n{compacted}"
+        if self._volatile_parts:
+            parts = self._volatile_parts
+            if self._volatile_fields is not None:
+                parts = sorted(parts, key=lambda part: self._volatile_fields.index(part[0]))
+            system_text += "\n\n" + "\n".join(text for _, text in parts)
+        return [{"role": "system", "content": system_text}] + history + self._extra_messages
+
+    @staticmethod
+    def _compact(dropped: List[Dict[str, str]]) -> str:
+        """Squash dropped messages into one short summary line per message."""
+        lines = []
+        for m in dropped:
+            snippet = " ".join(m["content"].split())[:COMPACT_SNIPPET_CHARS]
+            lines.append(f"- {m['role']}: {snippet}")
+        return "Earlier messages (compacted):\n" + "\n".join(lines)
+
+    def build(self) -> List[Dict[str, str]]:
+        """Assemble the messages, enforcing the budget, and record the final size."""
+        pinned = self._history[-1:]  # current user turn
+        older = self._history[:-1]
+        context_lines = list(self._context_lines)
+        dropped: List[Dict[str, str]] = []
+
+        messages = self._assemble(context_lines, older + pinned, None)
+        tokens = count_message_tokens(messages, self.model)
+
+        # 1) Drop the oldest history messages first
+        while tokens > self.budget and older:
+            dropped.append(older.pop(0))
+            messages = self._assemble(context_lines, older + pinned, None)
+            tokens = count_message_tokens(messages, self.model)
+
+        # 2) Trim the oldest (top) lines of the context section. A compacted trace of the dropped
+        # messages is kept if it fits once context is trimmed; otherwise context is trimmed without it
+        for compacted in ([self._compact(dropped), None] if dropped else [None]):
+            context_lines = list(self._context_lines)
+            messages = self._assemble(context_lines, older + pinned, compacted)
+            tokens = count_message_tokens(messages, self.model)
+            while tokens > self.budget and context_lines:
+                context_lines.pop(0)
+                messages = self._assemble(context_lines, older + pinned, compacted)
+                tokens = count_message_tokens(messages, self.model)
+            if tokens <= self.budget:
+                break
+
+        if tokens > self.budget:
+            logger.warning(
+                f"Prompt for '{self.call_site}' is {tokens} tokens, over its budget of {self.budget} "
+                f"even after trimming history and context"
+            )
+
+        _prompt_stats.record(self.call_site, tokens, len(dropped))
+        logger.info(
+            f"Prompt for '{self.call_site}': {tokens} tokens (budget {self.budget}, "
+            f"dropped {len(dropped)} messages, context lines {len(context_lines)}/{len(self._context_lines)})"
+        )
+        return messages
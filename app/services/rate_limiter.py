@@ -0,0 +1,340 @@
+# app/services/rate_limiter.py
+"""
+Shared rate limiting and priority scheduling for provider calls.
+
+Chat, voice commands and batch jobs (re-embedding, FAQ ingestion) all use
+the same provider quota. Without coordination a batch job drains the quota
+and interactive calls fail with 429s. Every model and embedding call
+therefore goes through the scheduler before it reaches the provider:
+
+- Two token buckets per provider: requests/minute and tokens/minute
+  (RateLimitSettings). The token cost is estimated before the call and
+  corrected with the provider's usage report afterwards.
+- Priority: interactive callers are always served before batch callers.
+  Batch code runs inside `with call_priority(CallPriority.BATCH):`.
+- Bounded queues: when too many callers of one priority are already
+  waiting, new callers fail fast with RateLimitQueueFull instead of
+  piling up. Callers also give up after max_wait_s (RateLimitTimeout).
+- 429 feedback: a rate limit error pauses the provider for its
+  Retry-After time and lowers the allowed rate; each success then
+  raises it back step by step.
+- Shared store: with backend "postgres", the buckets live in the
+  rate_limit_buckets table, so all processes draw from the same budget.
+"""
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from enum import Enum
+from functools import lru_cache
+from typing import Dict, Optional
+
+from app.config.settings import get_settings
+from app.models.rate_limit import RateLimitBucketDB
+
+logger = logging.getLogger(__name__)
+
+
+class CallPriority(str, Enum):
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+
+# Lower rank is served first
+PRIORITY_RANK = {CallPriority.INTERACTIVE: 0, CallPriority.BATCH: 1}
+
+_priority_var: contextvars.ContextVar[CallPriority] = contextvars.ContextVar(
+    "call_priority", default=CallPriority.INTERACTIVE
+)
+
+
+@contextmanager
+def call_priority(priority: CallPriority):
+    """Run the block's provider calls at the given priority (interactive by default)."""
+    token = _priority_var.set(CallPriority(priority))
+    try:
+        yield
+    finally:
+        _priority_var.reset(token)
+
+
+def current_priority() -> CallPriority:
+    return _priority_var.get()
+
+
+class RateLimitQueueFull(RuntimeError):
+    """Raised when too many callers of the same priority are already waiting."""
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when a caller waited longer than its priority allows."""
+
+
+# ---------------------------------------------------------------------------
+# Bucket stores
+# ---------------------------------------------------------------------------
+
+def _refill(state: Dict[str, float], rpm: int, tpm: int, now: float) -> None:
+    """Add the requests and tokens earned since the last refill (capped at one minute of budget)."""
+    elapsed = max(0.0, now - state["updated_at"])
+    factor = state["rate_factor"]
+    state["requests"] = min(rpm, state["requests"] + elapsed * rpm * factor / 60)
+    state["tokens"] = min(tpm, state["tokens"] + elapsed * tpm * factor / 60)
+    state["updated_at"] = now
+
+
+def _take(state: Dict[str, float], rpm: int, tpm: int, tokens: int, now: float) -> float:
+    """Take one request and `tokens` tokens if both are available; else return the seconds to wait."""
+    if state["paused_until"] > now:
+        return state["paused_until"] - now
+    _refill(state, rpm, tpm, now)
+    tokens = min(tokens, tpm)  # a call larger than the whole bucket would otherwise wait forever
+    missing_requests = max(0.0, 1 - state["requests"])
+    missing_tokens = max(0.0, tokens - state["tokens"])
+    if missing_requests == 0 and missing_tokens == 0:
+        state["requests"] -= 1
+        state["tokens"] -= tokens
+        return 0.0
+    factor = state["rate_factor"]
+    return max(missing_requests * 60 / (rpm * factor), missing_tokens * 60 / (tpm * factor))
+
+
+def _settle(state: Dict[str, float], delta: int, recovery_step: float) -> None:
+    """Correct the tokens taken by `delta` and raise a lowered rate by one recovery step."""
+    state["tokens"] -= delta
+    if state["rate_factor"] < 1.0:
+        state["rate_factor"] = min(1.0, state["rate_factor"] + recovery_step)
+
+
+def _back_off(state: Dict[str, float], paused_until: float, backoff_factor: float, min_rate_factor: float) -> float:
+    """Pause until `paused_until` and lower the rate; returns the new rate factor."""
+    state["paused_until"] = max(state["paused_until"], paused_until)
+    state["rate_factor"] = max(min_rate_factor, state["rate_factor"] * backoff_factor)
+    return state["rate_factor"]
+
+
+def _new_state(rpm: int, tpm: int, now: float) -> Dict[str, float]:
+    return {"requests": rpm, "tokens": tpm, "updated_at": now, "paused_until": 0.0, "rate_factor": 1.0}
+
+
+class MemoryBucketStore:
+    """Buckets kept in this process only."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict[str, float]] = {}
+
+    def _state(self, key: str, rpm: int, tpm: int) -> Dict[str, float]:
+        return self._states.setdefault(key, _new_state(rpm, tpm, time.time()))
+
+    def take(self, key: str, rpm: int, tpm: int, tokens: int) -> float:
+        with self._lock:
+            return _take(self._state(key, rpm, tpm), rpm, tpm, tokens, time.time())
+
+    def settle(self, key: str, rpm: int, tpm: int, delta: int, recovery_step: float) -> None:
+        with self._lock:
+            _settle(self._state(key, rpm, tpm), delta, recovery_step)
+
+    def back_off(self, key: str, rpm: int, tpm: int, paused_until: float, backoff_factor: float,
+                 min_rate_factor: float) -> float:
+        with self._lock:
+            return _back_off(self._state(key, rpm, tpm), paused_until, backoff_factor, min_rate_factor)
+
+    def rate_factor(self, key: str) -> float:
+        with self._lock:
+            state = self._states.get(key)
+            return state["rate_factor"] if state else 1.0
+
+
+class PostgresBucketStore:
+    """Buckets shared by all processes through the rate_limit_buckets table (row locked per update)."""
+
+    def _locked_state(self, db, key: str, rpm: int, tpm: int):
+        row = db.query(RateLimitBucketDB).filter(RateLimitBucketDB.key == key).with_for_update().one_or_none()
+        if row is None:
+            row = RateLimitBucketDB(key=key, **_new_state(rpm, tpm, time.time()))
+            db.add(row)
+            db.flush()
+        return row
+
+    def _update(self, key: str, rpm: int, tpm: int, change) -> float:
+        # Imported here so that importing this module does not open a database engine
+        from app.database.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            row = self._locked_state(db, key, rpm, tpm)
+            state = {name: getattr(row, name) for name in ("requests", "tokens", "updated_at", "paused_until", "rate_factor")}
+            result = change(state)
+            for name, value in state.items():
+                setattr(row, name, value)
+            db.commit()
+            return result
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def take(self, key: str, rpm: int, tpm: int, tokens: int) -> float:
+        return self._update(key, rpm, tpm, lambda state: _take(state, rpm, tpm, tokens, time.time()))
+
+    def settle(self, key: str, rpm: int, tpm: int, delta: int, recovery_step: float) -> None:
+        self._update(key, rpm, tpm, lambda state: _settle(state, delta, recovery_step))
+
+    def back_off(self, key: str, rpm: int, tpm: int, paused_until: float, backoff_factor: float,
+                 min_rate_factor: float) -> float:
+        return self._update(key, rpm, tpm, lambda state: _back_off(state, paused_until, backoff_factor, min_rate_factor))
+
+    def rate_factor(self, key: str) -> float:
+        from app.database.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            row = db.query(RateLimitBucketDB).filter(RateLimitBucketDB.key == key).one_or_none()
+            return row.rate_factor if row else 1.0
+        finally:
+            db.close()
+
+
+# ---------------------------------------------------------------------------
+# Scheduler
+# ---------------------------------------------------------------------------
+
+class RateLimiter:
+    """
+    Grants provider calls in priority order under the shared buckets.
+
+    Usage:
+        limiter = get_rate_limiter()
+        reservation = limiter.acquire("openai", estimated_tokens)
+        ... call the provider ...
+        limiter.settle("openai", reservation, actual_tokens)
+    """
+
+    def __init__(self, store=None):
+        self.settings = get_settings().rate_limit
+        self.store = store or MemoryBucketStore()
+        self._cond = threading.Condition()
+        self._waiters: list = []  # heap of (rank, sequence)
+        # True while the first waiter is taking from the store (outside _cond)
+        self._taking = False
+        self._sequence = itertools.count()
+        self._queued: Dict[CallPriority, int] = {priority: 0 for priority in CallPriority}
+
+    def _limits(self, key: str):
+        return self.settings.requests_per_minute.get(key), self.settings.tokens_per_minute.get(key)
+
+    def acquire(self, key: str, tokens: int, priority: Optional[CallPriority] = None,
+                timeout: Optional[float] = None) -> int:
+        """
+        Block until the provider `key` has budget for one call of about `tokens` tokens.
+        Returns the number of tokens reserved (pass it to settle()).
+
+        Raises:
+            RateLimitQueueFull: too many callers of this priority are already waiting.
+            RateLimitTimeout: no budget within the priority's max wait (or `timeout`).
+        """
+        rpm, tpm = self._limits(key)
+        if not self.settings.enabled or rpm is None or tpm is None:
+            return 0
+
+        priority = priority or current_priority()
+        max_wait = self.settings.max_wait_s.get(priority.value, 10.0)
+        wait_until = time.monotonic() + (min(timeout, max_wait) if timeout is not None else max_wait)
+
+        with self._cond:
+            if self._queued[priority] >= self.settings.max_queue.get(priority.value, 100):
+                raise RateLimitQueueFull(f"Too many {priority.value} calls waiting for '{key}' quota")
+            ticket = (PRIORITY_RANK[priority], next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            self._queued[priority] += 1
+        try:
+            while True:
+                # Only the first waiter (highest priority, then oldest) may take from the buckets, one take
+                # at a time. The lock only guards the queue: the store (a database round trip with the
+                # postgres backend) is called without it, so callers joining the queue never wait on it.
+                with self._cond:
+                    while self._waiters[0] != ticket or self._taking:
+                        remaining = wait_until - time.monotonic()
+                        if remaining <= 0:
+                            raise RateLimitTimeout(f"Waited too long for '{key}' quota ({priority.value})")
+                        self._cond.wait(remaining)
+                    self._taking = True
+                try:
+                    wait = self.store.take(key, rpm, tpm, tokens)
+                finally:
+                    with self._cond:
+                        self._taking = False
+                        self._cond.notify_all()
+                if wait == 0:
+                    return min(tokens, tpm)
+                remaining = wait_until - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitTimeout(f"Waited too long for '{key}' quota ({priority.value})")
+                with self._cond:
+                    self._cond.wait(min(wait, remaining))
+        finally:
+            with self._cond:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._queued[priority] -= 1
+                self._cond.notify_all()
+
+    def settle(self, key: str, reserved_tokens: int, actual_tokens: int) -> None:
+        """Correct the token bucket with the usage the provider reported, and recover the rate."""
+        rpm, tpm = self._limits(key)
+        if not self.settings.enabled or rpm is None or tpm is None:
+            return
+        # One store update (a single transaction with the postgres backend)
+        delta = actual_tokens - reserved_tokens if actual_tokens else 0
+        self.store.settle(key, rpm, tpm, delta, self.settings.recovery_step)
+
+    def on_rate_limited(self, key: str, retry_after: Optional[float] = None) -> None:
+        """Provider answered 429: pause until Retry-After and lower the allowed rate."""
+        rpm, tpm = self._limits(key)
+        if not self.settings.enabled or rpm is None or tpm is None:
+            return
+        retry_after = retry_after if retry_after is not None else self.settings.default_retry_after_s
+        factor = self.store.back_off(key, rpm, tpm, time.time() + retry_after, self.settings.backoff_factor,
+                                     self.settings.min_rate_factor)
+        logger.warning(f"Rate limited by '{key}': pausing {retry_after:.1f}s, rate now {factor:.0%} of quota")
+        with self._cond:
+            self._cond.notify_all()
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the Retry-After header (seconds) from a provider 429 error, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def find_rate_limit_error(error: Optional[BaseException]) -> Optional[BaseException]:
+    """
+    Return the provider 429 error behind `error` (OpenAI and Anthropic both expose status_code),
+    following the exception chain since instructor may wrap it. None if it is not a rate limit error.
+    """
+    while error is not None:
+        if getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError":
+            return error
+        error = error.__cause__ or error.__context__
+    return None
+
+
+@lru_cache()
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter, backed by the configured store."""
+    backend = get_settings().rate_limit.backend
+    if backend == "postgres":
+        return RateLimiter(PostgresBucketStore())
+    if backend != "memory":
+        raise ValueError(f"Unknown rate limit backend: {backend}")
+    return RateLimiter(MemoryBucketStore())
@@ -0,0 +1,202 @@
+# app/services/session_state.py
+"""
+Per-conversation session state for multi-step flows.
+
+Some turns leave a question open for the next one, e.g. "Would you like
+to link the task to a goal?". That state used to live in a module-level
+dict shared by every user, lost on restart and invisible to the other
+uvicorn workers. It now goes through a SessionStateStore:
+
+- Keyed by session: the conversation ID (or user ID) of the turn, bound
+  with `with conversation_session(key):`. Code without a session (e.g.
+  the voice endpoint) shares DEFAULT_SESSION_KEY, as before.
+- TTL: every value expires after SessionStateSettings.ttl_s, so an
+  unanswered question does not hijack the conversation hours later.
+- Two tiers: a bounded in-process LRU in front of the backend. With the
+  "postgres" backend the state lives in the session_state table and is
+  shared by all workers and nodes; local copies are then only trusted
+  for local_ttl_s, since another worker may have answered the question.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Optional, Tuple
+
+from app.config.settings import get_settings
+from app.models.session_state import SessionStateDB
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_KEY = "default"
+
+# Names of the values kept per session
+PENDING_GOAL_LINK = "pending_goal_link"
+
+_session_key_var: contextvars.ContextVar[str] = contextvars.ContextVar("session_key", default=DEFAULT_SESSION_KEY)
+
+
+@contextmanager
+def conversation_session(key: Optional[Any]):
+    """Scope the block's session state to one conversation (or user); None keeps the default session."""
+    token = _session_key_var.set(str(key) if key else DEFAULT_SESSION_KEY)
+    try:
+        yield
+    finally:
+        _session_key_var.reset(token)
+
+
+def current_session_key() -> str:
+    return _session_key_var.get()
+
+
+class LocalStateCache:
+    """Bounded LRU of JSON values with per-entry expiry, local to this process."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PostgresStateBackend:
+    """Session state shared by all processes through the session_state table."""
+
+    # Expired rows are removed on read, and in bulk every this many writes
+    PURGE_EVERY = 200
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self._session_factory = session_factory
+        self._writes = 0
+
+    def _session(self):
+        if self._session_factory is None:
+            # Imported here so that importing this module does not open a database engine
+            from app.database.session import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        db = self._session()
+        try:
+            row = db.get(SessionStateDB, key)
+            if row is None:
+                return None
+            if row.expires_at <= time.time():
+                db.delete(row)
+                db.commit()
+                return None
+            return row.value, row.expires_at
+        finally:
+            db.close()
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        db = self._session()
+        try:
+            db.merge(SessionStateDB(key=key, value=value, expires_at=expires_at))
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                db.query(SessionStateDB).filter(SessionStateDB.expires_at <= time.time()).delete()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def delete(self, key: str) -> None:
+        db = self._session()
+        try:
+            db.query(SessionStateDB).filter(SessionStateDB.key == key).delete()
+            db.commit()
+        finally:
+            db.close()
+
+
+class SessionStateStore:
+    """
+    Get/set/delete named JSON values per session. Without a backend, the local LRU is the store
+    (single process); with one, writes go through to the backend and reads are cached locally.
+    """
+
+    def __init__(self, backend: Optional[PostgresStateBackend] = None, ttl_s: float = 900.0,
+                 max_local_entries: int = 1000, local_ttl_s: float = 2.0):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.local_ttl_s = local_ttl_s
+        self.local = LocalStateCache(max_local_entries)
+
+    @staticmethod
+    def _key(session_key: Optional[str], name: str) -> str:
+        return f"{session_key or current_session_key()}:{name}"
+
+    def _cache(self, key: str, value: str, expires_at: float) -> None:
+        if self.backend is not None:
+            expires_at = min(expires_at, time.time() + self.local_ttl_s)
+        self.local.set(key, value, expires_at)
+
+    def get(self, name: str, session_key: Optional[str] = None) -> Optional[Any]:
+        key = self._key(session_key, name)
+        value = self.local.get(key)
+        if value is None and self.backend is not None:
+            stored = self.backend.get(key)
+            if stored is not None:
+                value, expires_at = stored
+                self._cache(key, value, expires_at)
+        return json.loads(value) if value is not None else None
+
+    def set(self, name: str, value: Any, session_key: Optional[str] = None, ttl_s: Optional[float] = None) -> None:
+        key = self._key(session_key, name)
+        encoded = json.dumps(value)
+        expires_at = time.time() + (ttl_s if ttl_s is not None else self.ttl_s)
+        if self.backend is not None:
+            self.backend.set(key, encoded, expires_at)
+        self._cache(key, encoded, expires_at)
+
+    def delete(self, name: str, session_key: Optional[str] = None) -> None:
+        key = self._key(session_key, name)
+        self.local.delete(key)
+        if self.backend is not None:
+            self.backend.delete(key)
+
+
+@lru_cache()
+def get_session_store() -> SessionStateStore:
+    settings = get_settings().session_state
+    backend = PostgresStateBackend() if settings.backend == "postgres" else None
+    logger.info(f"Session state backend: {settings.backend}")
+    return SessionStateStore(
+        backend=backend,
+        ttl_s=settings.ttl_s,
+        max_local_entries=settings.max_local_entries,
+        local_ttl_s=settings.local_ttl_s,
+    )
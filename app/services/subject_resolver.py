@@ -0,0 +1,256 @@
+# app/services/subject_resolver.py
+"""
+Resolves the subject of a request ("the task called Write docs") to tasks or goals.
+
+Every update or delete by subject goes through here, so it has to be fast
+and return the best match first:
+
+- An in-process title index (TitleIndex) per table answers exact and prefix
+  matches without touching the database. It is loaded on first use, kept up
+  to date by the writes this process commits (session events below, plus
+  record_title_changes for bulk inserts), and reloaded every
+  SubjectResolutionSettings.cache_ttl_s to pick up other processes' writes.
+- Anything else goes to the database. On Postgres, the title column has a
+  pg_trgm GIN index (ix_<table>_title_trgm) that serves both the
+  "ILIKE '%subject%'" contains match and the trigram similarity operator
+  (typos, word order), and results are ranked by similarity. Other
+  databases (tests) fall back to ILIKE, shortest title first.
+
+Tasks and goals have no owner column, so there is one index per table and
+process rather than per user. app/scripts/benchmark_subject_resolution.py
+compares the paths at 100k tasks.
+"""
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+from sqlalchemy import and_, event, func, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from app.config.settings import get_settings
+from app.models.goal_models import GoalDB
+from app.models.sql_task_models import TaskDB
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Prefix matches examined per lookup (the shortest titles of those are returned)
+_MAX_PREFIX_CANDIDATES = 1000
+
+
+class SubjectMatch(BaseModel):
+    """A task or goal whose title matched a subject, best match first."""
+    id: uuid.UUID
+    title: str
+    score: float
+
+
+def normalize_title(text: str) -> str:
+    """Lowercase with single spaces, the form titles are compared in."""
+    return " ".join(text.lower().split())
+
+
+class TitleIndex:
+    """
+    Exact and prefix lookups over normalized titles.
+
+    Keys are kept in a sorted list and searched with bisect: a prefix match is the run of
+    keys starting at bisect_left(prefix). This answers the same queries as a character trie
+    at a fraction of the memory (one string per title instead of one node per character).
+    """
+
+    def __init__(self, rows: Iterable[Tuple[uuid.UUID, str]] = ()):
+        self._titles: Dict[str, Dict[uuid.UUID, str]] = {}
+        self._key_of: Dict[uuid.UUID, str] = {}
+        for row_id, title in rows:
+            self._put(row_id, title)
+        self._keys: List[str] = sorted(self._titles)
+
+    def __len__(self) -> int:
+        return len(self._key_of)
+
+    def _put(self, row_id: uuid.UUID, title: str) -> bool:
+        """Store the title; True when its key is new (and must be added to _keys)."""
+        key = normalize_title(title)
+        self._key_of[row_id] = key
+        is_new = key not in self._titles
+        self._titles.setdefault(key, {})[row_id] = title
+        return is_new
+
+    def add(self, row_id: uuid.UUID, title: str) -> None:
+        """Add a row, or move it to its new title."""
+        self.remove(row_id)
+        key = normalize_title(title)
+        if self._put(row_id, title):
+            insort(self._keys, key)
+
+    def remove(self, row_id: uuid.UUID) -> None:
+        key = self._key_of.pop(row_id, None)
+        if key is None:
+            return
+        rows = self._titles[key]
+        rows.pop(row_id, None)
+        if not rows:
+            del self._titles[key]
+            self._keys.pop(bisect_left(self._keys, key))
+
+    def exact(self, subject: str, limit: int = 10) -> List[SubjectMatch]:
+        rows = self._titles.get(normalize_title(subject), {})
+        return [SubjectMatch(id=row_id, title=title, score=1.0) for row_id, title in list(rows.items())[:limit]]
+
+    def prefix(self, subject: str, limit: int = 10) -> List[SubjectMatch]:
+        """Titles starting with the subject, shortest (closest to the subject) first."""
+        prefix = normalize_title(subject)
+        if not prefix:
+            return []
+        candidates = []
+        start = bisect_left(self._keys, prefix)
+        for key in self._keys[start:start + _MAX_PREFIX_CANDIDATES]:
+            if not key.startswith(prefix):
+                break
+            candidates.append(key)
+        candidates.sort(key=len)
+        matches = []
+        for key in candidates:
+            for row_id, title in self._titles[key].items():
+                matches.append(SubjectMatch(id=row_id, title=title, score=len(prefix) / len(key)))
+                if len(matches) == limit:
+                    return matches
+        return matches
+
+
+class SubjectResolver:
+    """Subject -> matching rows of one table (TaskDB or GoalDB), best first."""
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._index: Optional[TitleIndex] = None
+        self._loaded_at = 0.0
+
+    # -- cache ------------------------------------------------------------------
+
+    def _cached_index(self, db: Session) -> Optional[TitleIndex]:
+        settings = get_settings().subject_resolution
+        if not settings.cache_enabled:
+            return None
+        with self._lock:
+            # _index stays None after a load when the table was too big to cache
+            if self._loaded_at and time.monotonic() - self._loaded_at < settings.cache_ttl_s:
+                return self._index
+        # Loaded outside the lock: lookups keep using the old index (if any) meanwhile
+        count = db.scalar(select(func.count()).select_from(self.model))
+        if count > settings.max_cached_titles:
+            logger.info(f"{self.model.__tablename__} has {count} titles, not caching them")
+            index = None
+        else:
+            index = TitleIndex(db.execute(select(self.model.id, self.model.title)).all())
+            logger.info(f"Loaded {len(index)} {self.model.__tablename__} titles into the subject index")
+        with self._lock:
+            self._index, self._loaded_at = index, time.monotonic()
+        return index
+
+    def apply(self, added: Iterable[Tuple[uuid.UUID, str]] = (), removed: Iterable[uuid.UUID] = ()) -> None:
+        """Apply committed writes to the cached index (a no-op until it has been loaded)."""
+        with self._lock:
+            if self._index is None:
+                return
+            for row_id in removed:
+                self._index.remove(row_id)
+            for row_id, title in added:
+                self._index.add(row_id, title)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._index, self._loaded_at = None, 0.0
+
+    # -- lookup -----------------------------------------------------------------
+
+    def resolve(self, db: Session, subject: str, limit: int = 10, use_cache: bool = True) -> List[SubjectMatch]:
+        """Rows whose title matches the subject: exact, then prefix (from the cache), then fuzzy (database)."""
+        if not normalize_title(subject):
+            return []
+        with span("subject.resolve", table=self.model.__tablename__) as resolve_span:
+            index = self._cached_index(db) if use_cache else None
+            if index is not None:
+                with self._lock:
+                    matches = index.exact(subject, limit) or index.prefix(subject, limit)
+                if matches:
+                    resolve_span.set_attribute("subject.source", "cache")
+                    return matches
+            resolve_span.set_attribute("subject.source", "database")
+            return self._search(db, subject.strip(), limit)
+
+    def _search(self, db: Session, subject: str, limit: int) -> List[SubjectMatch]:
+        title = self.model.title
+        contains = title.ilike(f"%{subject}%")
+        if db.get_bind().dialect.name != "postgresql":
+            query = select(self.model.id, title).where(contains).order_by(func.length(title)).limit(limit)
+            return [SubjectMatch(id=row_id, title=row_title, score=len(subject) / max(len(row_title), 1))
+                    for row_id, row_title in db.execute(query)]
+
+        similarity = func.similarity(title, subject)
+        threshold = get_settings().subject_resolution.similarity_threshold
+        # Both conditions are answered from the trigram index; "%" uses pg_trgm's own threshold (0.3)
+        condition = or_(contains, and_(title.op("%")(subject), similarity >= threshold))
+        query = (
+            select(self.model.id, title, similarity)
+            .where(condition)
+            .order_by(similarity.desc(), func.length(title))
+            .limit(limit)
+        )
+        return [SubjectMatch(id=row_id, title=row_title, score=score) for row_id, row_title, score in db.execute(query)]
+
+
+_RESOLVERS: Dict[str, SubjectResolver] = {
+    TaskDB.__tablename__: SubjectResolver(TaskDB),
+    GoalDB.__tablename__: SubjectResolver(GoalDB),
+}
+
+
+def get_subject_resolver(model) -> SubjectResolver:
+    return _RESOLVERS[model.__tablename__]
+
+
+# ---------------------------------------------------------------------------
+# Keeping the cached indexes in step with committed writes
+# ---------------------------------------------------------------------------
+
+_PENDING_KEY = "subject_index_changes"
+
+
+def record_title_changes(db: Session, model, added: Iterable[Tuple[uuid.UUID, str]] = (),
+                         removed: Iterable[uuid.UUID] = ()) -> None:
+    """
+    Queue title changes made without the ORM unit of work (e.g. bulk INSERT ... RETURNING).
+    They reach the cache when the session commits and are dropped on rollback.
+    """
+    pending = db.info.setdefault(_PENDING_KEY, [])
+    pending.append((model.__tablename__, list(added), list(removed)))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_title_changes(session: Session, flush_context) -> None:
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table not in _RESOLVERS:
+            continue
+        if obj in session.deleted:
+            record_title_changes(session, type(obj), removed=[obj.id])
+        elif obj in session.new or inspect(obj).attrs.title.history.has_changes():
+            record_title_changes(session, type(obj), added=[(obj.id, obj.title)])
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_title_changes(session: Session) -> None:
+    for table, added, removed in session.info.pop(_PENDING_KEY, []):
+        _RESOLVERS[table].apply(added, removed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_title_changes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
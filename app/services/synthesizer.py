@@ -3,6 +3,7 @@ import pandas as pd
 from pydantic import BaseModel, Field
 #from services.llm_factory import LLMFactory
 from app.services.llm_factory import LLMFactory
+from app.services.prompt_builder import PromptBuilder
 from playsound import playsound
 from TTS.api import TTS
 
@@ -45,19 +46,19 @@ class Synthesizer:
             context, columns_to_keep=["content", "category"]
         )
 
-        messages = [
-            {"role": "system", "content": Synthesizer.SYSTEM_PROMPT},
-            {"role": "user", "content": f"# User question:\n{question}"},
-            {
-                "role": "assistant",
-                "content": f"# Retrieved information:\n{context_str}",
-            },
-        ]
+        messages = (
+            PromptBuilder("synthesis")
+            .add_system(Synthesizer.SYSTEM_PROMPT)
+            .add_history([{"role": "user", "content": f"# User question:\n{question}"}])
+            .add_message("assistant", f"# Retrieved information:\n{context_str}")
+            .build()
+        )
 
-        llm = LLMFactory("openai")
+        llm = LLMFactory.for_call_site("synthesis")
         return llm.create_completion(
             response_model=SynthesizedResponse,
             messages=messages,
+            call_site="synthesis",
         )
 
     @staticmethod
@@ -1,10 +1,52 @@
-from typing import Callable
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from pydantic import BaseModel, Field
+
 
 class Tool:
-    def __init__(self, name: str, description: str, func: Callable[[str], str]):
+    def __init__(self, name: str, description: str, func: Callable[[str], str],
+                 input_model: Optional[Type[BaseModel]] = None):
         self.name = name
         self.description = description
         self.func = func
+        self.input_model = input_model
 
     def run(self, query: str) -> str:
         return self.func(query)
+
+
+class ToolResult(BaseModel):
+    """Outcome of one tool call: the text shown to the user and, for later calls, the object it produced."""
+    message: str = Field(description="Reply text for this call")
+    data: Any = Field(default=None, description="Object produced by the call (e.g. the created task)")
+    ok: bool = Field(default=True, description="False when the call failed or was skipped")
+
+
+class ToolRegistry:
+    """
+    Declarative registry of the agent's tools, keyed by the tool_name the decision model returns.
+
+    Usage:
+        @TOOLS.register("create_goal", "Create a new goal", GoalCreate)
+        def _create_goal(decision) -> ToolResult:
+            ...
+    """
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+
+    def register(self, name: str, description: str, input_model: Optional[Type[BaseModel]] = None):
+        def decorator(func: Callable[..., ToolResult]) -> Callable[..., ToolResult]:
+            self._tools[name] = Tool(name, description, func, input_model)
+            return func
+        return decorator
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def names(self) -> List[str]:
+        return sorted(self._tools)
+
+
+# Tools the action agent can call (registered in app/services/agent.py)
+TOOLS = ToolRegistry()
@@ -0,0 +1,147 @@
+# app/services/tool_executor.py
+"""
+Runs the tool calls of one decision, concurrently where possible.
+
+A request such as "create tasks A, B and C and mark D done" is decided
+in one call as an AgentDecisionList. The calls are then run in waves:
+
+- A call depends on the calls listed in its depends_on, and on any call
+  whose result it references with "$<index>.<field>" in its tool_input
+  (e.g. "goal_id": "$0.id"). Only earlier calls can be referenced, so the
+  order is always well defined.
+- Each wave holds the calls whose dependencies are done. Its calls run on
+  a thread pool (ToolExecutionSettings.max_parallel_calls), each in a
+  copy of the turn's context (deadline, prefetch session, session key).
+- A call whose dependency failed, or whose reference cannot be resolved
+  (the result has no such field, e.g. a list), is skipped, and the other
+  calls still run. The results are joined into one reply, in the order asked for.
+"""
+import contextvars
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Set
+
+from app.config.settings import get_settings
+from app.models.agent_decision import AgentDecision
+from app.services.tool import ToolResult
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=get_settings().tool_execution.max_parallel_calls, thread_name_prefix="tool-call"
+)
+
+_REFERENCE = re.compile(r"^\$(\d+)\.(\w+)$")
+
+_multi_call: contextvars.ContextVar[bool] = contextvars.ContextVar("multi_call", default=False)
+
+
+@contextmanager
+def _multi_call_scope(enabled: bool):
+    token = _multi_call.set(enabled)
+    try:
+        yield
+    finally:
+        _multi_call.reset(token)
+
+
+def in_multi_call() -> bool:
+    """True while running one of several calls; tools skip follow-up questions then."""
+    return _multi_call.get()
+
+
+def _references(decision: AgentDecision) -> Set[int]:
+    refs = set()
+    for _, value in decision.tool_input:
+        match = _REFERENCE.match(value) if isinstance(value, str) else None
+        if match:
+            refs.add(int(match.group(1)))
+    return refs
+
+
+class _UnresolvedReference(Exception):
+    pass
+
+
+def _field(data: Any, name: str) -> Any:
+    value = data.get(name) if isinstance(data, dict) else getattr(data, name, None)
+    if value is None:
+        raise _UnresolvedReference(f"the result has no {name}")
+    return value
+
+
+def _resolve(decision: AgentDecision, results: Dict[int, ToolResult]) -> AgentDecision:
+    """Replace "$<index>.<field>" values with the fields of earlier results (_UnresolvedReference if missing)."""
+    updates = {}
+    for name, value in decision.tool_input:
+        match = _REFERENCE.match(value) if isinstance(value, str) else None
+        if match:
+            index = int(match.group(1))
+            try:
+                updates[name] = str(_field(results[index].data, match.group(2)))
+            except _UnresolvedReference as e:
+                raise _UnresolvedReference(f"{value} cannot be used ({e} in call {index + 1})") from None
+    if not updates:
+        return decision
+    return decision.model_copy(update={"tool_input": decision.tool_input.model_copy(update=updates)})
+
+
+def _run_safely(run: Callable[[AgentDecision], ToolResult], decision: AgentDecision) -> ToolResult:
+    try:
+        return run(decision)
+    except Exception as e:
+        logger.error(f"Tool call {decision.tool_name} failed: {e}", exc_info=True)
+        return ToolResult(message=f"Error running {decision.tool_name}: {e}", ok=False)
+
+
+def execute_tool_calls(decisions: List[AgentDecision], run: Callable[[AgentDecision], ToolResult]) -> List[ToolResult]:
+    """Run the calls (dependencies first, independent ones concurrently); results in call order."""
+    dependencies = {i: set(d.depends_on) | _references(d) for i, d in enumerate(decisions)}
+    results: Dict[int, ToolResult] = {}
+    for i, deps in dependencies.items():
+        if any(dep < 0 or dep >= i for dep in deps):
+            results[i] = ToolResult(message=f"Skipped {decisions[i].tool_name}: it can only use results of earlier calls", ok=False)
+
+    with _multi_call_scope(len(decisions) > 1):
+        remaining = [i for i in range(len(decisions)) if i not in results]
+        while remaining:
+            # Dependencies are always earlier calls, so the first remaining call is always ready
+            wave = [i for i in remaining if dependencies[i] <= results.keys()]
+            runnable = []
+            for i in wave:
+                failed = [dep for dep in dependencies[i] if not results[dep].ok]
+                if failed:
+                    results[i] = ToolResult(message=f"Skipped {decisions[i].tool_name}: call {failed[0] + 1} failed", ok=False)
+                    continue
+                try:
+                    runnable.append((i, _resolve(decisions[i], results)))
+                except _UnresolvedReference as e:
+                    results[i] = ToolResult(message=f"Skipped {decisions[i].tool_name}: {e}", ok=False)
+
+            if len(runnable) == 1:
+                i, decision = runnable[0]
+                results[i] = _run_safely(run, decision)
+            elif runnable:
+                logger.info(f"Running {len(runnable)} tool calls in parallel: {[d.tool_name for _, d in runnable]}")
+                # One context copy per call: a context can only be entered by one thread at a time
+                futures = {
+                    i: _executor.submit(contextvars.copy_context().run, _run_safely, run, decision)
+                    for i, decision in runnable
+                }
+                for i, future in futures.items():
+                    results[i] = future.result()
+            remaining = [i for i in remaining if i not in wave]
+
+    return [results[i] for i in range(len(decisions))]
+
+
+def aggregate_results(results: List[ToolResult], dropped: int = 0) -> str:
+    """One reply for all calls: the message alone for a single call, else one numbered line per call."""
+    if len(results) == 1 and not dropped:
+        return results[0].message
+    lines = [f"{i}. {result.message}" for i, result in enumerate(results, start=1)]
+    if dropped:
+        lines.append(f"({dropped} more requested actions were not run; please ask for them separately.)")
+    return "\n".join(lines)
@@ -1,8 +1,9 @@
 from app.models.conversation_models import ChatRequest, ChatResponse, MessageCreate
 from app.services.tools.conversation_tools import (
-    list_messages_in_conversation,
+    recent_history,
     create_message
 )
+from app.config.settings import get_settings
 from sqlalchemy.orm import Session
 import uuid
 from fastapi import Depends
@@ -12,7 +13,7 @@ from app.services.agent import agent_step
 def chat_with_agent(req: ChatRequest, db: Session = Depends(get_db)) -> ChatResponse:
     """
     1) Retrieve or generate conversation_id
-    2) Pull all previous messages from DB
+    2) Pull the recent history window from DB
     3) Append the new user message to the context
     4) Pass the entire list of messages to `agent_step`
     5) Store the assistant's reply
@@ -21,13 +22,8 @@ def chat_with_agent(req: ChatRequest, db: Session = Depends(get_db)) -> ChatResp
     # 1) If conversation_id not provided, generate a new one
     convo_id = req.conversation_id or uuid.uuid4()
 
-    # 2) Fetch all previous messages
-    past_msgs = list_messages_in_conversation(db, convo_id)
-    
-    # Convert them into the format [ {"role": "...", "content": "..."}, ... ]
-    conversation_messages = []
-    for m in past_msgs:
-        conversation_messages.append({"role": m.role, "content": m.content})
+    # 2) Fetch the previous messages the prompt builder keeps, as [ {"role": "...", "content": "..."}, ... ]
+    conversation_messages = recent_history(db, convo_id, get_settings().prompt_budget.history_messages)
     
     # 3) Append the new user message
     #   Also store it in DB
@@ -41,7 +37,7 @@ def chat_with_agent(req: ChatRequest, db: Session = Depends(get_db)) -> ChatResp
     conversation_messages.append({"role": "user", "content": req.user_message})
 
     # 4) Pass everything to `agent_step(conversation_messages)`
-    ai_reply_text = agent_step(conversation_messages)
+    ai_reply_text = agent_step(conversation_messages, session_key=str(convo_id))
 
     # 5) Store the assistant's reply
     assistant_msg = MessageCreate(
@@ -1,9 +1,12 @@
 # app/services/tools/conversation_tools.py
 
+import base64
 import uuid
-from typing import List
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from app.models.conversation_models import MessageCreate, MessageOut, ConversationMessageDB
+from app.models.conversation_models import MessageCreate, MessageOut, MessagePage, ConversationMessageDB
 
 def create_message(db: Session, msg_in: MessageCreate) -> MessageOut:
     """
@@ -34,20 +37,77 @@ def create_message(db: Session, msg_in: MessageCreate) -> MessageOut:
 def list_messages_in_conversation(db: Session, convo_id: uuid.UUID) -> List[MessageOut]:
     """
     Returns all messages in a given conversation, sorted by created_at ascending (optional).
+    Cost grows with the conversation: the chat path uses recent_history, and API clients
+    can page with list_messages_page instead.
     """
     db_msgs = db.query(ConversationMessageDB)\
                 .filter(ConversationMessageDB.conversation_id == convo_id)\
                 .order_by(ConversationMessageDB.created_at.asc())\
                 .all()
-    return [
-        MessageOut(
-            id=m.id,
-            conversation_id=m.conversation_id,
-            role=m.role,
-            content=m.content,
-            created_at=m.created_at,
-            user_id=m.user_id
-        )
-        for m in db_msgs
-    ]
+    return [_to_message_out(m) for m in db_msgs]
 
+
+def _to_message_out(m: ConversationMessageDB) -> MessageOut:
+    return MessageOut(
+        id=m.id,
+        conversation_id=m.conversation_id,
+        role=m.role,
+        content=m.content,
+        created_at=m.created_at,
+        user_id=m.user_id
+    )
+
+
+def encode_cursor(created_at: datetime, message_id: uuid.UUID) -> str:
+    """Opaque keyset cursor: the (created_at, id) position of a message"""
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(message_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def recent_history(db: Session, convo_id: uuid.UUID, limit: int) -> List[Dict[str, str]]:
+    """
+    The last `limit` messages as prompt history ({"role", "content"}, oldest first).
+    Reads only those rows (and columns) through the (conversation_id, created_at) index.
+    """
+    rows = db.query(ConversationMessageDB.role, ConversationMessageDB.content)\
+             .filter(ConversationMessageDB.conversation_id == convo_id)\
+             .order_by(ConversationMessageDB.created_at.desc(), ConversationMessageDB.id.desc())\
+             .limit(limit)\
+             .all()
+    return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+
+def list_messages_page(db: Session, convo_id: uuid.UUID, limit: int = 50,
+                       after: Optional[str] = None, before: Optional[str] = None) -> MessagePage:
+    """
+    One page of a conversation, oldest first, using keyset pagination on (created_at, id).
+
+    - after: messages newer than the cursor. next_cursor is the position of the newest message
+      returned (or `after` itself when nothing is new), so clients can poll with it.
+    - before / no cursor: the `limit` messages just older than the cursor (the latest ones without
+      a cursor). next_cursor pages further back, and is None once the start is reached.
+    """
+    position = tuple_(ConversationMessageDB.created_at, ConversationMessageDB.id)
+    query = db.query(ConversationMessageDB).filter(ConversationMessageDB.conversation_id == convo_id)
+
+    if after:
+        query = query.filter(position > decode_cursor(after))
+        rows = query.order_by(ConversationMessageDB.created_at.asc(), ConversationMessageDB.id.asc()).limit(limit).all()
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if rows else after
+    else:
+        if before:
+            query = query.filter(position < decode_cursor(before))
+        rows = query.order_by(ConversationMessageDB.created_at.desc(), ConversationMessageDB.id.desc()).limit(limit).all()
+        rows.reverse()
+        next_cursor = encode_cursor(rows[0].created_at, rows[0].id) if len(rows) == limit else None
+
+    return MessagePage(messages=[_to_message_out(m) for m in rows], next_cursor=next_cursor)
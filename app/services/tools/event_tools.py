@@ -1,10 +1,9 @@
 # app/services/event_processor.py
-import os
 import logging
 from datetime import datetime
 from typing import Optional
-from openai import OpenAI
 from app.models.event_models import EventExtraction, EventDetails, EventConfirmation
+from app.services.llm_factory import LLMFactory
 from app.services.tools.google_calendar_tools import create_google_calendar_event
 
 logging.basicConfig(
@@ -14,22 +13,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-model = "gpt-4o"
+# The provider and model for each step are routed per call site in settings:
+# the yes/no gate and the confirmation text run on a small (or local) model.
+
+# Gate results below this confidence are rejected (and first re-checked on the larger model)
+GATE_MIN_CONFIDENCE = 0.7
+
+def _needs_second_opinion(result: EventExtraction) -> bool:
+    """
+    Only an unsure "yes" is re-checked on the larger model. Most gated text is not an event,
+    and a "no" is rejected whatever its confidence, so re-checking those would send nearly
+    every call to the larger model.
+    """
+    return result.is_calendar_event and result.confidence_score < GATE_MIN_CONFIDENCE
 
 def extract_event_info(user_input: str) -> EventExtraction:
     logger.info("Starting event extraction analysis")
     today = datetime.now()
     date_context = f"Today is {today.strftime('%A, %B %d, %Y')}."
-    completion = client.beta.chat.completions.parse(
-        model=model,
+    result = LLMFactory.for_call_site("event_gate").create_completion(
+        response_model=EventExtraction,
         messages=[
-            {"role": "system", "content": f"{date_context} Analyze if the text describes a calendar event."},
+            {"role": "system", "content": f"Analyze if the text describes a calendar event. {date_context}"},
             {"role": "user", "content": user_input},
         ],
-        response_format=EventExtraction,
+        call_site="event_gate",
+        # A borderline "yes" from the small model gets a second opinion from the larger one
+        escalate_if=_needs_second_opinion,
     )
-    result = completion.choices[0].message.parsed
     logger.info(f"Extraction complete - Is calendar event: {result.is_calendar_event}, Confidence: {result.confidence_score:.2f}")
     return result
 
@@ -37,36 +48,34 @@ def parse_event_details(description: str) -> EventDetails:
     logger.info("Starting event details parsing")
     today = datetime.now()
     date_context = f"Today is {today.strftime('%A, %B %d, %Y')}."
-    completion = client.beta.chat.completions.parse(
-        model=model,
+    result = LLMFactory.for_call_site("event_parse").create_completion(
+        response_model=EventDetails,
         messages=[
-            {"role": "system", "content": f"{date_context} Extract detailed event information. When dates reference 'next Tuesday' or similar relative dates, use this current date as reference."},
+            {"role": "system", "content": f"Extract detailed event information. When dates reference 'next Tuesday' or similar relative dates, use the current date as reference. {date_context}"},
             {"role": "user", "content": description},
         ],
-        response_format=EventDetails,
+        call_site="event_parse",
     )
-    result = completion.choices[0].message.parsed
     logger.info(f"Parsed event details - Name: {result.name}, Date: {result.date}, Duration: {result.duration_minutes}min")
     return result
 
 def generate_confirmation(event_details: EventDetails) -> EventConfirmation:
     logger.info("Generating confirmation message")
-    completion = client.beta.chat.completions.parse(
-        model=model,
+    result = LLMFactory.for_call_site("confirmation").create_completion(
+        response_model=EventConfirmation,
         messages=[
             {"role": "system", "content": "Generate a natural confirmation message for the event. Sign off with your name; Susie"},
             {"role": "user", "content": str(event_details.model_dump())},
         ],
-        response_format=EventConfirmation,
+        call_site="confirmation",
     )
-    result = completion.choices[0].message.parsed
     logger.info("Confirmation message generated successfully")
     return result
 
 def process_calendar_request(user_input: str) -> Optional[EventConfirmation]:
     logger.info("Processing calendar request")
     initial_extraction = extract_event_info(user_input)
-    if not initial_extraction.is_calendar_event or initial_extraction.confidence_score < 0.7:
+    if not initial_extraction.is_calendar_event or initial_extraction.confidence_score < GATE_MIN_CONFIDENCE:
         logger.warning(f"Gate check failed - is_calendar_event: {initial_extraction.is_calendar_event}, confidence: {initial_extraction.confidence_score:.2f}")
         return None
     event_details = parse_event_details(initial_extraction.description)
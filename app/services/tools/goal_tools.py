@@ -5,7 +5,10 @@ from sqlalchemy.orm import Session
 from fastapi import HTTPException
 
 from app.models.goal_models import GoalDB, GoalCreate, GoalOut
-from app.database.session import SessionLocal
+from app.database.unit_of_work import current_session, release_session
+from app.services.subject_resolver import SubjectMatch, get_subject_resolver
+# Registers the session events that keep goal embeddings in step with committed goal writes
+import app.services.goal_suggestions  # noqa: F401
 
 # Set up logging
 logging.basicConfig(
@@ -15,23 +18,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def get_db():
-    """Get a database session"""
-    db = SessionLocal()
-    try:
-        logger.info(f"Database session created: {db}")
-        # Test a simple query
-        test_count = db.query(GoalDB).count()
-        logger.info(f"Database contains {test_count} goals total")
-        return db
-    finally:
-        db.close()
-
 def create_goal(goal_data: GoalCreate) -> GoalOut:
     """
     Creates a new goal in the database
     """
-    db = get_db()
+    db = current_session()
     try:
         # Create new goal object
         new_goal = GoalDB(
@@ -61,13 +52,13 @@ def create_goal(goal_data: GoalCreate) -> GoalOut:
         logger.error(f"Error creating goal: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create goal: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
 
 def get_goal(goal_title: str) -> GoalOut:
     """
     Retrieves a goal by title
     """
-    db = get_db()
+    db = current_session()
     try:
         # Convert string ID to UUID if necessary
         if isinstance(goal_title, str):
@@ -89,16 +80,17 @@ def get_goal(goal_title: str) -> GoalOut:
     except HTTPException:
         raise
     except Exception as e:
+        db.rollback()
         logger.error(f"Error retrieving goal: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve goal: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
 
 def list_goals() -> List[GoalOut]:
     """
     Lists all goals
     """
-    db = get_db()
+    db = current_session()
     try:
         goals = db.query(GoalDB).all()
         return [
@@ -113,17 +105,18 @@ def list_goals() -> List[GoalOut]:
             ) for goal in goals
         ]
     except Exception as e:
+        db.rollback()
         logger.error(f"Error listing goals: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to list goals: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
 
 def update_goal(goal_data) -> GoalOut:
     """
     Updates a goal based on provided data
     The goal_data object should have an id and any fields to update
     """
-    db = get_db()
+    db = current_session()
     try:
         # Convert string ID to UUID if necessary
         if isinstance(goal_data.id, str):
@@ -164,14 +157,14 @@ def update_goal(goal_data) -> GoalOut:
         logger.error(f"Error updating goal: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to update goal: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
 
 def delete_goal(goal_id: str):
     """
     Deletes a goal by ID
     Returns a confirmation message
     """
-    db = get_db()
+    db = current_session()
     try:
         logger.info(f"Attempting to delete goal with ID: {goal_id}")
         # Convert string ID to UUID if necessary
@@ -191,15 +184,8 @@ def delete_goal(goal_id: str):
         goal_title = goal.title
         db.delete(goal)
         db.commit()
-        logger.info(f"Goal deleted, committing transaction")
-        
-        # After committing the deletion
-        verification = db.query(GoalDB).filter(GoalDB.id == goal_id).first()
-        if verification:
-            logger.warning(f"Goal still exists after deletion attempt!")
-        else:
-            logger.info(f"Goal successfully deleted (verified)")
-        
+        logger.info(f"Goal deleted")
+
         # Return a simple response object
         return type('GoalDelete', (), {
             'id': str(goal_id),
@@ -212,17 +198,23 @@ def delete_goal(goal_id: str):
         logger.error(f"Error deleting goal: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete goal: {str(e)}")
     finally:
-        db.close()
-        logger.info(f"Transaction committed successfully")
+        release_session(db)
 
 def search_goals_by_subject(subject: str, limit: int = 10) -> List[GoalOut]:
     """
-    Searches for goals where the title contains the subject string
+    Searches for goals matching the subject, best match first (see subject_resolver.py)
     """
-    db = get_db()
+    db = current_session()
     try:
-        goals = db.query(GoalDB).filter(GoalDB.title.ilike(f"%{subject}%")).limit(limit).all()
-        
+        resolver = get_subject_resolver(GoalDB)
+        matches = resolver.resolve(db, subject, limit)
+        goals = _goals_by_id(db, matches)
+        if len(goals) < len(matches):
+            # Some cached titles were stale (renamed or deleted by another process): ask the database
+            resolver.invalidate()
+            matches = resolver.resolve(db, subject, limit, use_cache=False)
+            goals = _goals_by_id(db, matches)
+
         return [
             GoalOut(
                 id=goal.id,
@@ -235,7 +227,18 @@ def search_goals_by_subject(subject: str, limit: int = 10) -> List[GoalOut]:
             ) for goal in goals
         ]
     except Exception as e:
+        db.rollback()
         logger.error(f"Error searching goals: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to search goals: {str(e)}")
     finally:
-        db.close() 
\ No newline at end of file
+        release_session(db)
+
+def _goals_by_id(db: Session, matches: List[SubjectMatch]) -> List[GoalDB]:
+    """
+    The matched rows, in match order. Rows that no longer exist, or whose title is no longer the
+    one that matched (renamed since it was cached), are left out.
+    """
+    if not matches:
+        return []
+    rows = {goal.id: goal for goal in db.query(GoalDB).filter(GoalDB.id.in_([m.id for m in matches]))}
+    return [rows[m.id] for m in matches if m.id in rows and rows[m.id].title == m.title]
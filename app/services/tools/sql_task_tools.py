@@ -1,13 +1,16 @@
 import logging
 from typing import List, Optional
 import uuid
+from sqlalchemy import insert, or_, select
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from datetime import datetime
 
-from app.models.sql_task_models import TaskDB, TaskCreateSQL, TaskOutSQL, TaskUpdateSQL, TaskDeleteSQL
-from app.database.session import SessionLocal
+from app.models.sql_task_models import TaskDB, TaskCreateSQL, TaskOutSQL, TaskUpdateSQL, TaskDeleteSQL, TaskBulkItemSQL
+from app.models.goal_models import GoalDB
+from app.database.unit_of_work import current_session, release_session
 from app.services.tools.goal_tools import get_goal
+from app.services.subject_resolver import SubjectMatch, get_subject_resolver, record_title_changes
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,19 +19,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def get_db():
-    """Get a database session"""
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        db.close()
-
 def create_sql_task(task_data: TaskCreateSQL) -> TaskOutSQL:
     """
     Creates a new task in the database
     """
-    db = get_db()
+    db = current_session()
     try:
         # Create new task object
         new_task = TaskDB(
@@ -62,13 +57,101 @@ def create_sql_task(task_data: TaskCreateSQL) -> TaskOutSQL:
         logger.error(f"Error creating task: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create task: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
+
+def resolve_goal_links(db: Session, tasks: List[TaskBulkItemSQL]) -> List[Optional[uuid.UUID]]:
+    """
+    Returns the goal ID to link for each task, looking up every goal_id and goal_title in one query.
+    An unknown goal_id is an error (404); a goal_title without a match leaves the task unlinked.
+    """
+    goal_ids = {t.goal_id for t in tasks if t.goal_id}
+    goal_titles = {t.goal_title for t in tasks if not t.goal_id and t.goal_title}
+    if not goal_ids and not goal_titles:
+        return [None] * len(tasks)
+
+    conditions = [GoalDB.title.ilike(f"%{title}%") for title in goal_titles]
+    if goal_ids:
+        conditions.append(GoalDB.id.in_(goal_ids))
+    goals = db.execute(select(GoalDB.id, GoalDB.title).where(or_(*conditions)).order_by(GoalDB.created_at)).all()
+
+    missing = goal_ids - {goal.id for goal in goals}
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Goals not found: {', '.join(sorted(str(m) for m in missing))}")
+
+    links = []
+    for task in tasks:
+        if task.goal_id or not task.goal_title:
+            links.append(task.goal_id)
+            continue
+        # Same rule as the single-task path: the first goal whose title contains the given title
+        match = next((goal.id for goal in goals if task.goal_title.lower() in goal.title.lower()), None)
+        if match is None:
+            logger.warning(f"Goal with title like '{task.goal_title}' not found, task '{task.title}' is not linked.")
+        links.append(match)
+    return links
+
+def insert_sql_tasks(db: Session, tasks: List[TaskBulkItemSQL]) -> List[TaskOutSQL]:
+    """
+    Inserts the tasks with one multi-row INSERT ... RETURNING in the caller's transaction (not committed).
+    The created rows come back from RETURNING, so no per-row refresh is needed.
+    """
+    goal_ids = resolve_goal_links(db, tasks)
+    rows = [
+        {
+            "title": task.title,
+            "description": task.description,
+            "completed": task.completed,
+            "due_date": task.due_date,
+            "priority": task.priority,
+            "goal_id": goal_id,
+        }
+        for task, goal_id in zip(tasks, goal_ids)
+    ]
+    # render_nulls keeps every row the same shape, so all rows go out as one multi-row VALUES
+    statement = insert(TaskDB).returning(TaskDB, sort_by_parameter_order=True)
+    created = db.scalars(statement, rows, execution_options={"render_nulls": True}).all()
+    # Not a unit-of-work flush, so the subject index is told about the new titles here
+    record_title_changes(db, TaskDB, added=[(task.id, task.title) for task in created])
+    # Build the outputs before the caller commits (commit expires the loaded rows)
+    return [
+        TaskOutSQL(
+            id=task.id,
+            title=task.title,
+            description=task.description,
+            completed=task.completed,
+            due_date=task.due_date,
+            priority=task.priority,
+            goal_id=task.goal_id,
+            created_at=task.created_at,
+            updated_at=task.updated_at
+        ) for task in created
+    ]
+
+def create_sql_tasks_bulk(tasks: List[TaskBulkItemSQL]) -> List[TaskOutSQL]:
+    """
+    Creates several tasks in a single transaction
+    """
+    db = current_session()
+    try:
+        created = insert_sql_tasks(db, tasks)
+        db.commit()
+        logger.info(f"Created {len(created)} tasks in one transaction")
+        return created
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error creating tasks in bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to create tasks: {str(e)}")
+    finally:
+        release_session(db)
 
 def get_sql_task(task_id: str) -> TaskOutSQL:
     """
     Retrieves a task by ID
     """
-    db = get_db()
+    db = current_session()
     try:
         # Convert string ID to UUID if necessary
         if isinstance(task_id, str):
@@ -92,16 +175,17 @@ def get_sql_task(task_id: str) -> TaskOutSQL:
     except HTTPException:
         raise
     except Exception as e:
+        db.rollback()
         logger.error(f"Error retrieving task: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve task: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
 
 def list_sql_tasks() -> List[TaskOutSQL]:
     """
     Lists all tasks
     """
-    db = get_db()
+    db = current_session()
     try:
         tasks = db.query(TaskDB).all()
         return [
@@ -118,16 +202,44 @@ def list_sql_tasks() -> List[TaskOutSQL]:
             ) for task in tasks
         ]
     except Exception as e:
+        db.rollback()
         logger.error(f"Error listing tasks: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to list tasks: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
+
+def list_recent_sql_tasks(limit: int = 10) -> List[TaskOutSQL]:
+    """
+    Lists the most recently created tasks, newest first (one indexed ORDER BY ... LIMIT query)
+    """
+    db = current_session()
+    try:
+        tasks = db.scalars(select(TaskDB).order_by(TaskDB.created_at.desc(), TaskDB.id.desc()).limit(limit)).all()
+        return [
+            TaskOutSQL(
+                id=task.id,
+                title=task.title,
+                description=task.description,
+                completed=task.completed,
+                due_date=task.due_date,
+                priority=task.priority,
+                goal_id=task.goal_id,
+                created_at=task.created_at,
+                updated_at=task.updated_at
+            ) for task in tasks
+        ]
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error listing recent tasks: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to list recent tasks: {str(e)}")
+    finally:
+        release_session(db)
 
 def list_tasks_by_goal(goal_id: str) -> List[TaskOutSQL]:
     """
     Lists all tasks associated with a specific goal
     """
-    db = get_db()
+    db = current_session()
     try:
         # Convert string ID to UUID if necessary
         if isinstance(goal_id, str):
@@ -148,17 +260,18 @@ def list_tasks_by_goal(goal_id: str) -> List[TaskOutSQL]:
             ) for task in tasks
         ]
     except Exception as e:
+        db.rollback()
         logger.error(f"Error listing tasks by goal: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to list tasks by goal: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
 
 def update_sql_task(task_data: TaskUpdateSQL) -> TaskOutSQL:
     """
     Updates a task based on provided data
     The task_data object should have an id and any fields to update
     """
-    db = get_db()
+    db = current_session()
     try:
         # Convert string ID to UUID if necessary
         if isinstance(task_data.id, str):
@@ -204,14 +317,14 @@ def update_sql_task(task_data: TaskUpdateSQL) -> TaskOutSQL:
         logger.error(f"Error updating task: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to update task: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
 
 def delete_sql_task(task_id: str, subject: Optional[str] = None) -> TaskDeleteSQL:
     """
     Deletes a task by ID
     Returns a confirmation message
     """
-    db = get_db()
+    db = current_session()
     try:
         # Convert string ID to UUID if necessary
         if isinstance(task_id, str):
@@ -237,16 +350,23 @@ def delete_sql_task(task_id: str, subject: Optional[str] = None) -> TaskDeleteSQ
         logger.error(f"Error deleting task: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete task: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
 
 def search_sql_tasks_by_subject(subject: str, limit: int = 10) -> List[TaskOutSQL]:
     """
-    Searches for tasks where the title contains the subject string
+    Searches for tasks matching the subject, best match first (see subject_resolver.py)
     """
-    db = get_db()
+    db = current_session()
     try:
-        tasks = db.query(TaskDB).filter(TaskDB.title.ilike(f"%{subject}%")).limit(limit).all()
-        
+        resolver = get_subject_resolver(TaskDB)
+        matches = resolver.resolve(db, subject, limit)
+        tasks = _tasks_by_id(db, matches)
+        if len(tasks) < len(matches):
+            # Some cached titles were stale (renamed or deleted by another process): ask the database
+            resolver.invalidate()
+            matches = resolver.resolve(db, subject, limit, use_cache=False)
+            tasks = _tasks_by_id(db, matches)
+
         return [
             TaskOutSQL(
                 id=task.id,
@@ -261,16 +381,27 @@ def search_sql_tasks_by_subject(subject: str, limit: int = 10) -> List[TaskOutSQ
             ) for task in tasks
         ]
     except Exception as e:
+        db.rollback()
         logger.error(f"Error searching tasks: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to search tasks: {str(e)}")
     finally:
-        db.close()
+        release_session(db)
+
+def _tasks_by_id(db: Session, matches: List[SubjectMatch]) -> List[TaskDB]:
+    """
+    The matched rows, in match order. Rows that no longer exist, or whose title is no longer the
+    one that matched (renamed since it was cached), are left out.
+    """
+    if not matches:
+        return []
+    rows = {task.id: task for task in db.query(TaskDB).filter(TaskDB.id.in_([m.id for m in matches]))}
+    return [rows[m.id] for m in matches if m.id in rows and rows[m.id].title == m.title]
 
 def list_sql_tasks_by_date_range(start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[TaskOutSQL]:
     """
     Lists tasks with due dates in the specified range
     """
-    db = get_db()
+    db = current_session()
     try:
         query = db.query(TaskDB)
         
@@ -294,7 +425,8 @@ def list_sql_tasks_by_date_range(start_date: Optional[datetime] = None, end_date
             ) for task in tasks
         ]
     except Exception as e:
+        db.rollback()
         logger.error(f"Error listing tasks by date range: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to list tasks by date range: {str(e)}")
     finally:
-        db.close() 
\ No newline at end of file
+        release_session(db)
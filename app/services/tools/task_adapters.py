@@ -9,12 +9,12 @@ from typing import List, Optional
 from datetime import datetime
 import uuid  # Import uuid
 from app.services.tools.sql_task_tools import (
-    create_sql_task, get_sql_task, list_sql_tasks,
+    create_sql_task, get_sql_task, list_recent_sql_tasks,
     update_sql_task, delete_sql_task, search_sql_tasks_by_subject,
-    list_sql_tasks_by_date_range, list_tasks_by_goal
+    list_sql_tasks_by_date_range, list_tasks_by_goal, create_sql_tasks_bulk
 )
 from app.models.task_models import CreateTask, TaskOut, TaskUpdate, TaskDelete
-from app.models.sql_task_models import TaskCreateSQL, TaskOutSQL, TaskUpdateSQL, TaskDeleteSQL
+from app.models.sql_task_models import TaskCreateSQL, TaskOutSQL, TaskUpdateSQL, TaskDeleteSQL, TaskBulkItemSQL
 from app.services.tools.goal_tools import search_goals_by_subject, get_goal  # Import search_goals_by_subject and get_goal
 from fastapi import HTTPException # Import HTTPException
 
@@ -69,6 +69,33 @@ def convert_to_sql_create(task: CreateTask) -> TaskCreateSQL:
         goal_id=goal_id_to_use
     )
 
+def convert_to_sql_bulk_item(task: CreateTask) -> TaskBulkItemSQL:
+    """Convert CreateTask for a bulk insert. Goal lookups are left to the bulk insert (one query for all tasks)."""
+    due_date = None
+    if task.due_date:
+        try:
+            due_date = datetime.fromisoformat(task.due_date)
+        except ValueError:
+            logger.warning(f"Could not parse due_date string: {task.due_date}, using None")
+
+    goal_id, goal_title = None, None
+    if task.goal_id:
+        try:
+            goal_id = uuid.UUID(task.goal_id)
+        except ValueError:
+            # The model sometimes puts the goal's title in goal_id
+            goal_title = task.goal_id
+
+    return TaskBulkItemSQL(
+        title=task.title,
+        description=task.description,
+        completed=task.completed,
+        due_date=due_date,
+        priority=task.priority,
+        goal_id=goal_id,
+        goal_title=goal_title
+    )
+
 def convert_to_task_out(sql_task: TaskOutSQL) -> TaskOut:
     """Convert SQL-based TaskOutSQL to vector-based TaskOut"""
     due_date_str = sql_task.due_date.isoformat() if sql_task.due_date else None
@@ -174,6 +201,12 @@ def create_task(task: CreateTask) -> TaskOut:
     sql_task = create_sql_task(sql_create_data)
     return convert_to_task_out(sql_task)
 
+def create_tasks_bulk(tasks: List[CreateTask]) -> List[TaskOut]:
+    """Create several tasks in one transaction (one INSERT, goal links resolved in one query)"""
+    logger.info(f"Creating {len(tasks)} SQL tasks in bulk")
+    sql_tasks = create_sql_tasks_bulk([convert_to_sql_bulk_item(t) for t in tasks])
+    return [convert_to_task_out(t) for t in sql_tasks]
+
 def get_task_service(task_id: str) -> TaskOut:
     """Get a task by ID using SQL database"""
     logger.info(f"Getting SQL task: {task_id}")
@@ -253,10 +286,6 @@ def delete_task(subject: str) -> TaskDelete:
 def list_reccent_tasks(limit: int = 10) -> List[TaskOut]:
     """List recent tasks using SQL database"""
     logger.info(f"Listing recent SQL tasks")
-    # For SQL, we'll just list tasks ordered by creation date
-    tasks = list_sql_tasks()
-    # Sort by created_at descending
-    sorted_tasks = sorted(tasks, key=lambda t: t.created_at or datetime.min, reverse=True)
-    # Limit to requested count
-    recent_tasks = sorted_tasks[:limit]
-    return [convert_to_task_out(t) for t in recent_tasks] 
\ No newline at end of file
+    # Newest first, sorted and limited by the database
+    recent_tasks = list_recent_sql_tasks(limit)
+    return [convert_to_task_out(t) for t in recent_tasks]
@@ -0,0 +1,452 @@
+# app/services/tracing.py
+"""
+Request-scoped tracing: one span tree per HTTP request.
+
+llm_metrics says how long each model call took, but not where the rest of
+a slow turn went. Every request now gets a trace (started by the HTTP
+middleware in main.py, keyed by its request ID) and the stages of the turn
+open spans inside it:
+
+- agent stages (agent_step, coordinate_agents, classify_intent, the
+  decision, every tool call), via `span()` / `@traced()`
+- model calls and embeddings (CallTimer in llm_metrics.py)
+- VectorStore operations, subject resolution, goal suggestions
+- every SQL statement (SQLAlchemy engine events below)
+- whisper transcription
+
+The current span lives in a context variable, so spans opened in worker
+threads that were started with contextvars.copy_context() (prefetch, tool
+executor, hedged calls) land under the right parent. Code running outside
+a request (background workers) has no trace and records nothing.
+
+Tracing is off by default (TracingSettings.enabled). Finished traces are
+kept in memory for /debug/traces/{request_id}, which shows the waterfall
+(only mounted with TracingSettings.debug_endpoint, as spans carry SQL
+text), and exported in the OpenTelemetry OTLP/JSON format
+(TracingSettings.exporter): appended to a JSON lines file, or POSTed to a
+local collector's /v1/traces endpoint. The encoding is done here, without
+the OpenTelemetry SDK, the same way llm_metrics renders Prometheus text.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """One timed operation in a trace."""
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, exc: BaseException) -> None:
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.add(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class Trace:
+    """The spans of one request."""
+
+    def __init__(self, request_id: str, max_spans: int):
+        self.request_id = request_id
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self._max_spans = max_spans
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            if len(self.spans) >= self._max_spans:
+                self.dropped += 1
+            else:
+                self.spans.append(span)
+
+    def finished_spans(self) -> List[Span]:
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s.start_ns)
+
+
+class _NoopSpan:
+    """Returned outside a trace so callers can set attributes unconditionally."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, exc: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """
+    Start a child of the current span without making it current (call .end() when done).
+    Meant for leaf operations that may finish in another context, such as a streamed model call.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the enclosed block as a child of the current span (a no-op outside a trace)."""
+    current = start_span(name, attributes)
+    if current is NOOP_SPAN:
+        yield current
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def traced(name: Optional[str] = None):
+    """Decorator form of span(); the span is named after the function unless given a name."""
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def begin_trace(request_id: str, name: str, **attributes):
+    """Root span of a new trace (NOOP_SPAN when tracing is off); make it current with use_span(), end it with end_trace()."""
+    settings = get_settings().tracing
+    if not settings.enabled:
+        return NOOP_SPAN
+    return Span(Trace(request_id, settings.max_spans_per_trace), name, None, attributes)
+
+
+def end_trace(root) -> None:
+    """End the root span, then store and export its trace."""
+    if root is NOOP_SPAN:
+        return
+    root.end()
+    trace_store.add(root.trace)
+    get_exporter().export(root.trace)
+
+
+@contextmanager
+def use_span(current):
+    """Make the span current for the enclosed block (spans opened inside become its children)."""
+    if current is NOOP_SPAN:
+        yield current
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+
+
+@contextmanager
+def start_trace(request_id: str, name: str, **attributes):
+    """Open the root span of a trace for the enclosed block; the trace is stored and exported when it ends."""
+    root = begin_trace(request_id, name, **attributes)
+    try:
+        with use_span(root):
+            yield root
+    except BaseException as e:
+        root.record_error(e)
+        raise
+    finally:
+        end_trace(root)
+
+
+async def trace_http_request(request_id: str, request, call_next):
+    """
+    Run an HTTP request (the middleware's call_next) under a new trace.
+
+    The root span ends once the response body has been sent, not when call_next returns: for a
+    streamed response (/chat/stream) call_next returns as soon as the headers are ready, and the
+    model call and the SQL of the stream only run while the body is sent.
+    """
+    attributes = {"http.method": request.method, "http.route": request.url.path}
+    root = begin_trace(request_id, f"{request.method} {request.url.path}", **attributes)
+    if root is NOOP_SPAN:
+        return await call_next(request)
+    try:
+        with use_span(root):
+            response = await call_next(request)
+    except BaseException as e:
+        root.record_error(e)
+        end_trace(root)
+        raise
+    root.set_attribute("http.status_code", response.status_code)
+    response.body_iterator = _end_trace_after(response.body_iterator, root)
+    return response
+
+
+async def _end_trace_after(body: AsyncIterator, root: Span) -> AsyncIterator:
+    try:
+        async for chunk in body:
+            yield chunk
+    except BaseException as e:
+        # Includes the cancellation when the client goes away mid-stream
+        root.record_error(e)
+        raise
+    finally:
+        end_trace(root)
+
+
+# ---------------------------------------------------------------------------
+# Storage and waterfall
+# ---------------------------------------------------------------------------
+
+class TraceStore:
+    """The most recent traces by request ID (bounded, oldest dropped first)."""
+
+    def __init__(self, max_traces: int = 500):
+        self._max_traces = max_traces
+        self._lock = threading.Lock()
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+
+    def add(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces[trace.request_id] = trace
+            self._traces.move_to_end(trace.request_id)
+            while len(self._traces) > self._max_traces:
+                self._traces.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(request_id)
+
+
+trace_store = TraceStore(get_settings().tracing.max_traces)
+
+
+def waterfall(trace: Trace) -> List[Dict[str, Any]]:
+    """Spans in tree order with their depth and offset from the start of the request."""
+    spans = trace.finished_spans()
+    if not spans:
+        return []
+    children: Dict[Optional[str], List[Span]] = {}
+    ids = {s.span_id for s in spans}
+    for s in spans:
+        # A span whose parent was dropped (max_spans_per_trace) is shown at the top level
+        children.setdefault(s.parent_id if s.parent_id in ids else None, []).append(s)
+    start = min(s.start_ns for s in spans)
+
+    rows = []
+
+    def visit(parent_id: Optional[str], depth: int) -> None:
+        for s in children.get(parent_id, []):
+            rows.append({
+                "name": s.name,
+                "depth": depth,
+                "span_id": s.span_id,
+                "parent_span_id": s.parent_id,
+                "start_ms": round((s.start_ns - start) / 1e6, 2),
+                "duration_ms": round(s.duration_ms, 2),
+                "attributes": s.attributes,
+                "error": s.error,
+            })
+            visit(s.span_id, depth + 1)
+
+    visit(None, 0)
+    return rows
+
+
+def render_waterfall(rows: List[Dict[str, Any]], width: int = 60) -> str:
+    """Plain text waterfall: one line per span with a bar placed on the request's timeline."""
+    if not rows:
+        return ""
+    total = max(row["start_ms"] + row["duration_ms"] for row in rows) or 1.0
+    label_width = min(60, max(len("  " * row["depth"] + row["name"]) for row in rows))
+    lines = []
+    for row in rows:
+        offset = int(row["start_ms"] / total * width)
+        length = max(1, int(row["duration_ms"] / total * width))
+        label = ("  " * row["depth"] + row["name"])[:label_width]
+        bar = " " * offset + "#" * min(length, width - offset)
+        marker = " !" if row["error"] else ""
+        lines.append(f"{label:<{label_width}} |{bar:<{width}}| {row['duration_ms']:>9.1f} ms{marker}")
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# OTLP/JSON export
+# ---------------------------------------------------------------------------
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def to_otlp_json(trace: Trace, service_name: str) -> Dict[str, Any]:
+    """The trace as an OTLP ExportTraceServiceRequest in its JSON encoding."""
+    spans = []
+    for s in trace.finished_spans():
+        otlp_span = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            # SPAN_KIND_SERVER for the request, SPAN_KIND_INTERNAL for the rest
+            "kind": 2 if s.parent_id is None else 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": _otlp_attributes(s.attributes),
+            # STATUS_CODE_ERROR = 2, STATUS_CODE_UNSET = 0
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 0},
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+
+class TraceExporter:
+    """Exports finished traces in the background (file or OTLP/HTTP collector); never blocks a request."""
+
+    def __init__(self, exporter: str, file_path: str, endpoint: str, service_name: str, queue_size: int = 1000):
+        self.exporter = exporter
+        self.file_path = file_path
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        if exporter != "none":
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def export(self, trace: Trace) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            logger.warning(f"Trace export queue full, dropping trace of request {trace.request_id}")
+
+    def join(self) -> None:
+        self._queue.join()
+
+    def write(self, trace: Trace) -> None:
+        body = json.dumps(to_otlp_json(trace, self.service_name))
+        if self.exporter == "file":
+            with open(self.file_path, "a", encoding="utf-8") as f:
+                f.write(body + "\n")
+        elif self.exporter == "otlp":
+            request = urllib.request.Request(
+                self.endpoint, data=body.encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST"
+            )
+            with urllib.request.urlopen(request, timeout=5):
+                pass
+
+    def _run(self) -> None:
+        while True:
+            trace = self._queue.get()
+            try:
+                self.write(trace)
+            except Exception as e:
+                logger.warning(f"Failed to export trace of request {trace.request_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+@functools.lru_cache()
+def get_exporter() -> TraceExporter:
+    settings = get_settings().tracing
+    return TraceExporter(settings.exporter, settings.file_path, settings.otlp_endpoint, settings.service_name)
+
+
+# ---------------------------------------------------------------------------
+# SQL statements
+# ---------------------------------------------------------------------------
+
+_SQL_SPANS = "trace_sql_spans"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_sql_span(conn, cursor, statement, parameters, context, executemany) -> None:
+    sql_span = start_span("sql", {
+        "db.system": conn.dialect.name,
+        "db.statement": statement[:get_settings().tracing.sql_statement_chars],
+    })
+    if sql_span is not NOOP_SPAN:
+        conn.info.setdefault(_SQL_SPANS, []).append(sql_span)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_sql_span(conn, cursor, statement, parameters, context, executemany) -> None:
+    spans = conn.info.get(_SQL_SPANS)
+    if spans:
+        sql_span = spans.pop()
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            sql_span.set_attribute("db.rowcount", cursor.rowcount)
+        sql_span.end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_sql_span(exception_context) -> None:
+    connection = exception_context.connection
+    spans = connection.info.get(_SQL_SPANS) if connection is not None else None
+    if spans:
+        sql_span = spans.pop()
+        sql_span.record_error(exception_context.original_exception)
+        sql_span.end()
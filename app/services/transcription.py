@@ -1,7 +1,10 @@
 import whisper
 
+from app.services.tracing import traced
+
 whisper_model = whisper.load_model("base")  
 
+@traced("transcription")
 def transcribe_file(filepath: str) -> str:
     result = whisper_model.transcribe(filepath)
     return result["text"].strip()
@@ -10,6 +10,7 @@ load_dotenv()
 
 from app.services.synthesizer import Synthesizer  # Adjust the import based on your structure
 from app.database.vector_store import VectorStore
+from app.services.tracing import traced
 import pandas as pd
 
 
@@ -68,6 +69,7 @@ def listen_for_audio(duration_seconds: int = 3) -> str:
     logger.info(f"Transcribed Text: {transcribed_text}")
     return transcribed_text
 
+@traced("transcription")
 def transcribe_audio(file_path: str) -> str:
     """
     Transcribes the audio file at the given file path using Whisper.
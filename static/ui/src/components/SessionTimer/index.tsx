@@ -100,11 +100,20 @@ export const SessionTimer: React.FC = () => {
   useEffect(() => {
     const loadTasks = async () => {
       try {
-        // Adding trailing slash based on previous redirect diagnosis
-        const response = await fetch('/tasks/');
-        if (!response.ok) throw new Error('Failed to load tasks');
-        const data = await response.json();
-        setTasks(data);
+        // Only open tasks, and only the fields the selector shows, one page at a time
+        const loaded: Task[] = [];
+        let cursor: string | null = null;
+        do {
+          const params = new URLSearchParams({ completed: 'false', fields: 'id,title,description', limit: '200' });
+          if (cursor) params.set('cursor', cursor);
+          // Adding trailing slash based on previous redirect diagnosis
+          const response = await fetch(`/tasks/?${params}`);
+          if (!response.ok) throw new Error('Failed to load tasks');
+          const page: { tasks: Task[]; next_cursor: string | null } = await response.json();
+          loaded.push(...page.tasks);
+          cursor = page.next_cursor;
+        } while (cursor);
+        setTasks(loaded);
       } catch (error) {
         console.error('Error loading tasks:', error);
       }
@@ -0,0 +1,68 @@
+# tests/test_async_session.py
+import pytest
+
+from app.config.settings import DatabaseSettings
+from app.database.session import async_database_url, pool_options
+from app.models.conversation_models import ConversationMessageDB
+from app.models.goal_models import GoalDB
+from app.models.sql_task_models import TaskDB
+from app.models.time_session import TimeSessionDB
+from app.routers import conversation, goals, tasks, time_session
+from app.services.tracing import start_trace, trace_store, waterfall
+
+
+def test_async_url_uses_asyncpg_and_its_ssl_parameter():
+    assert async_database_url("postgresql://u:secret@db:5432/app?sslmode=require") == \
+        "postgresql+asyncpg://u:secret@db:5432/app?ssl=require"
+    assert async_database_url("postgresql+psycopg://u@db/app") == "postgresql+asyncpg://u@db/app"
+    assert async_database_url("sqlite+aiosqlite:///app.db") == "sqlite+aiosqlite:///app.db"
+
+
+def test_pool_options_come_from_the_settings(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "30")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    options = pool_options(DatabaseSettings())
+    assert options["pool_size"] == 30
+    assert options["pool_pre_ping"] is False
+    assert options["max_overflow"] == 10 and options["pool_recycle"] == 1800
+
+
+@pytest.fixture
+def tables():
+    return [GoalDB.__table__, TaskDB.__table__, TimeSessionDB.__table__, ConversationMessageDB.__table__]
+
+
+@pytest.fixture
+def routers():
+    return [(tasks.router, "/tasks"), (goals.router, "/goals"), (time_session.router, ""),
+            (conversation.router, "/conversations")]
+
+
+def test_routers_read_and_write_through_the_async_session(client):
+    goal = client.post("/goals/", json={"title": "Launch the website"}).json()
+    task = client.post("/tasks/", json={"title": "Write copy", "description": None, "due_date": None,
+                                         "priority": None}).json()
+
+    assert client.patch(f"/tasks/{task['id']}/assign-goal/{goal['id']}").json()["goal_id"] == goal["id"]
+    assert [t["title"] for t in client.get(f"/tasks/goal/{goal['id']}").json()] == ["Write copy"]
+    assert client.patch(f"/goals/{goal['id']}", json={"title": "Launch v2"}).json()["title"] == "Launch v2"
+
+    session = client.post("/time_sessions/", json={"task_id": task["id"], "goal": None})
+    assert session.status_code == 201 and session.json()["task_id"] == task["id"]
+    assert client.patch(f"/time_sessions/{goal['id']}/resume").status_code == 404
+
+    message = client.post("/conversations/messages", json={"role": "user", "content": "hello"}).json()
+    page = client.get(f"/conversations/{message['conversation_id']}/messages/page").json()
+    assert [m["content"] for m in page["messages"]] == ["hello"]
+
+    assert client.get("/tasks/not-a-uuid").status_code == 422
+    assert client.delete(f"/goals/{goal['id']}").status_code == 200
+    assert client.get(f"/goals/{goal['id']}").status_code == 404
+
+
+def test_async_queries_are_traced_under_the_request(client, tracing):
+    with start_trace("req-async", "GET /goals/"):
+        assert client.get("/goals/").json() == {"goals": [], "next_cursor": None}
+
+    sql = [row for row in waterfall(trace_store.get("req-async")) if row["name"] == "sql"]
+    assert sql and sql[0]["attributes"]["db.statement"].startswith("SELECT goals")
@@ -0,0 +1,72 @@
+# tests/test_bulk_tasks.py
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+from app.models.goal_models import GoalDB
+from app.models.sql_task_models import TaskBulkItemSQL, TaskDB
+from app.services.decision_schemas import select_tool_family
+from app.services.tools.sql_task_tools import insert_sql_tasks
+
+
+# Not all digits: sqlite would store a numeric-looking hex as an integer
+GOAL_ID = uuid.UUID("a1b2c3d4-0000-4000-8000-00000000abcd")
+
+
+@pytest.fixture
+def db(db):
+    db.add(GoalDB(id=GOAL_ID, title="Launch the website"))
+    db.commit()
+    return db
+
+
+def item(title, **kwargs):
+    return TaskBulkItemSQL(title=title, description=None, due_date=None, priority=None, **kwargs)
+
+
+def test_bulk_insert_is_one_statement_with_goals_in_one_query(engine, db):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    created = insert_sql_tasks(db, [
+        item("Step 1", goal_title="website"),
+        item("Step 2", goal_id=GOAL_ID),
+        item("Step 3"),
+    ])
+    db.commit()
+
+    assert [t.title for t in created] == ["Step 1", "Step 2", "Step 3"]
+    assert [t.goal_id for t in created] == [GOAL_ID, GOAL_ID, None]
+    assert all(t.id and t.created_at for t in created)
+    # One goal lookup and one multi-row INSERT ... RETURNING, no per-row refresh
+    assert len(statements) == 2
+    assert statements[1].startswith("INSERT INTO tasks") and "RETURNING" in statements[1]
+    assert db.query(TaskDB).count() == 3
+
+
+def test_unmatched_goal_title_leaves_the_task_unlinked(db):
+    created = insert_sql_tasks(db, [item("Step 1", goal_title="no such goal")])
+    assert created[0].goal_id is None
+
+
+def test_bulk_endpoint_creates_nothing_when_a_goal_is_unknown(client, db):
+    response = client.post("/tasks/bulk", json={"tasks": [
+        {"title": "A", "description": None, "due_date": None, "priority": None},
+        {"title": "B", "description": None, "due_date": None, "priority": None, "goal_id": str(uuid.uuid4())},
+    ]})
+    assert response.status_code == 404
+    assert db.query(TaskDB).count() == 0
+
+    response = client.post("/tasks/bulk", json={"tasks": [
+        {"title": "A", "description": None, "due_date": None, "priority": "high"},
+        {"title": "B", "description": None, "due_date": None, "priority": None, "goal_title": "Launch"},
+    ]})
+    assert response.status_code == 200
+    assert [t["title"] for t in response.json()] == ["A", "B"]
+    assert response.json()[1]["goal_id"] == str(GOAL_ID)
+
+
+def test_plural_task_creation_selects_the_bulk_tool():
+    assert select_tool_family("Create tasks for each of these 12 steps") == "task_create_bulk"
+    assert select_tool_family("Create a task called Review budget") == "task_create"
@@ -0,0 +1,88 @@
+# tests/test_chat_persistence.py
+import threading
+import uuid
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.models.conversation_models import ConversationContext, ConversationContextDB, ConversationMessageDB
+from app.services.chat_persistence import ChatTurn, TransactionalChatWriter, WriteBehindChatWriter, new_message
+
+
+@pytest.fixture
+def tables():
+    return [ConversationMessageDB.__table__, ConversationContextDB.__table__]
+
+
+@pytest.fixture
+def session_factory(engine):
+    factory = sessionmaker(bind=engine)
+    factory.commits = 0
+
+    @event.listens_for(engine, "commit")
+    def count_commit(conn):
+        factory.commits += 1
+
+    return factory
+
+
+def make_turn(convo_id, text):
+    user_msg = new_message(convo_id, "user", text)
+    assistant_msg = new_message(convo_id, "assistant", f"Reply to {text}", after=user_msg)
+    return ChatTurn(conversation_id=convo_id, messages=[user_msg, assistant_msg],
+                    context=ConversationContext(current_topic=text))
+
+
+def stored_contents(factory, convo_id):
+    db = factory()
+    try:
+        rows = db.query(ConversationMessageDB).filter(ConversationMessageDB.conversation_id == convo_id)\
+                 .order_by(ConversationMessageDB.created_at.asc()).all()
+        return [row.content for row in rows]
+    finally:
+        db.close()
+
+
+def test_transactional_writer_commits_the_turn_once(session_factory):
+    convo_id = uuid.uuid4()
+    TransactionalChatWriter(session_factory).persist(make_turn(convo_id, "hello"))
+
+    assert session_factory.commits == 1
+    assert stored_contents(session_factory, convo_id) == ["hello", "Reply to hello"]
+    db = session_factory()
+    row = db.get(ConversationContextDB, convo_id)
+    assert ConversationContext.from_compact(row.context).current_topic == "hello"
+    db.close()
+
+
+def test_write_behind_keeps_turn_order_and_flushes(session_factory):
+    writer = WriteBehindChatWriter(session_factory)
+    convo_id = uuid.uuid4()
+    for i in range(5):
+        writer.persist(make_turn(convo_id, f"turn {i}"))
+
+    assert writer.flush(timeout=5)
+    assert writer.wait_for(convo_id, timeout=0)
+    assert stored_contents(session_factory, convo_id) == [
+        text for i in range(5) for text in (f"turn {i}", f"Reply to turn {i}")
+    ]
+
+
+def test_write_behind_retries_failed_writes(session_factory):
+    calls = {"count": 0}
+    lock = threading.Lock()
+
+    def flaky_factory():
+        with lock:
+            calls["count"] += 1
+            if calls["count"] == 1:
+                raise RuntimeError("database unavailable")
+        return session_factory()
+
+    writer = WriteBehindChatWriter(flaky_factory, retry_delay_s=0.01)
+    convo_id = uuid.uuid4()
+    writer.persist(make_turn(convo_id, "hello"))
+
+    assert writer.flush(timeout=5)
+    assert stored_contents(session_factory, convo_id) == ["hello", "Reply to hello"]
@@ -0,0 +1,207 @@
+# tests/test_chat_stream.py
+import json
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.models.conversation_models import EnhancedConversationResponse, Intent, IntentType
+from app.routers import chat
+from app.services.chat_persistence import new_message
+from app.services.conversation_agent import stream_conversation
+
+FINAL = EnhancedConversationResponse(
+    response="Let's plan the launch.",
+    detected_intent=Intent(primary_intent=IntentType.PLAN, confidence=0.9),
+    suggested_actions=["Pick a date"],
+)
+
+
+def fake_stream(*args, **kwargs):
+    # Partial objects as instructor yields them: the response text grows chunk by chunk
+    yield SimpleNamespace(response=None)
+    yield SimpleNamespace(response="Let's")
+    yield SimpleNamespace(response="Let's plan the")
+    yield FINAL
+
+
+@patch("app.services.conversation_agent.LLMFactory.stream_completion", side_effect=fake_stream)
+def test_stream_conversation_yields_deltas_then_final(_):
+    events = list(stream_conversation([{"role": "user", "content": "Help me plan the launch"}]))
+
+    deltas = [e["text"] for e in events if e["event"] == "delta"]
+    assert "".join(deltas) == FINAL.response
+    assert events[-1]["event"] == "final"
+    assert events[-1]["message"].endswith("- Pick a date")
+    assert events[-1]["completion"] == FINAL
+
+
+def failing_stream(*args, **kwargs):
+    yield SimpleNamespace(response="Let's")
+    yield SimpleNamespace(response="Let's plan the")
+    raise RuntimeError("connection reset")
+
+
+@patch("app.routers.chat.schedule_recall_index")
+@patch("app.routers.chat.schedule_summary")
+@patch("app.routers.chat.get_chat_writer")
+@patch("app.services.conversation_agent.LLMFactory.stream_completion", side_effect=failing_stream)
+def test_sse_stream_ends_with_the_streamed_text_when_the_model_fails(_, get_chat_writer, schedule_summary,
+                                                                    schedule_recall_index):
+    convo_id = uuid.uuid4()
+    user_msg = new_message(convo_id, "user", "Help me plan the launch")
+    chunks = list(chat._stream_reply(convo_id, user_msg, [{"role": "user", "content": user_msg.content}]))
+
+    final = json.loads(chunks[-1].split("data: ", 1)[1])
+    assert final["ai_message"] == "Alfred: Let's plan the"
+    turn = get_chat_writer.return_value.persist.call_args.args[0]
+    assert turn.messages[1].content == "Alfred: Let's plan the"
+
+
+@patch("app.services.conversation_agent.LLMFactory.stream_completion")
+def test_stream_conversation_lets_deadline_exceeded_through(stream_completion):
+    from app.services.latency_control import DeadlineExceeded
+
+    stream_completion.side_effect = DeadlineExceeded("no time left")
+    with pytest.raises(DeadlineExceeded):
+        list(stream_conversation([{"role": "user", "content": "Help me plan the launch"}]))
+
+
+@patch("app.routers.chat.schedule_recall_index")
+@patch("app.routers.chat.schedule_summary")
+@patch("app.routers.chat.get_chat_writer")
+@patch("app.services.conversation_agent.LLMFactory.stream_completion", side_effect=fake_stream)
+def test_sse_stream_persists_the_turn_at_the_end(_, get_chat_writer, schedule_summary, schedule_recall_index):
+    convo_id = uuid.uuid4()
+    user_msg = new_message(convo_id, "user", "Help me plan the launch")
+    chunks = list(chat._stream_reply(convo_id, user_msg, [{"role": "user", "content": user_msg.content}]))
+
+    assert all(chunk.endswith("\n\n") for chunk in chunks)
+    assert chunks[0].startswith("event: delta")
+    final = json.loads(chunks[-1].split("data: ", 1)[1])
+    assert final["ai_message"].startswith("Alfred: Let's plan the launch.")
+    assert final["suggested_actions"] == ["Pick a date"]
+    turn = get_chat_writer.return_value.persist.call_args.args[0]
+    assert [m.role for m in turn.messages] == ["user", "assistant"]
+    assert turn.messages[1].content == final["ai_message"]
+    assert turn.messages[1].created_at > turn.messages[0].created_at
+    schedule_summary.assert_called_once_with(convo_id)
+    schedule_recall_index.assert_called_once_with(turn.messages)
+
+
+@patch("app.routers.chat.schedule_recall_index")
+@patch("app.routers.chat.schedule_summary")
+@patch("app.routers.chat.get_chat_writer")
+@patch("app.services.conversation_agent.LLMFactory.stream_completion", side_effect=fake_stream)
+def test_sse_stream_persists_the_partial_turn_on_disconnect(_, get_chat_writer, schedule_summary,
+                                                            schedule_recall_index):
+    convo_id = uuid.uuid4()
+    user_msg = new_message(convo_id, "user", "Help me plan the launch")
+    stream = chat._stream_reply(convo_id, user_msg, [{"role": "user", "content": user_msg.content}])
+    first = next(stream)
+    stream.close()  # what the server does when the client goes away
+
+    sent = json.loads(first.split("data: ", 1)[1])["text"]
+    turn = get_chat_writer.return_value.persist.call_args.args[0]
+    assert [m.role for m in turn.messages] == ["user", "assistant"]
+    assert turn.messages[1].content == f"Alfred: {sent}"
+
+
+@patch("app.routers.chat.schedule_recall_index")
+@patch("app.routers.chat.schedule_summary")
+@patch("app.routers.chat.get_chat_writer")
+def test_sse_stream_keeps_the_user_message_when_the_model_fails(get_chat_writer, schedule_summary,
+                                                               schedule_recall_index):
+    convo_id = uuid.uuid4()
+    user_msg = new_message(convo_id, "user", "Help me plan the launch")
+    with patch("app.routers.chat.stream_conversation", side_effect=RuntimeError("model unavailable")):
+        stream = chat._stream_reply(convo_id, user_msg, [{"role": "user", "content": user_msg.content}])
+        with pytest.raises(RuntimeError):
+            list(stream)
+
+    turn = get_chat_writer.return_value.persist.call_args.args[0]
+    assert turn.messages == [user_msg]
+
+
+@patch("app.routers.chat.schedule_recall_index")
+@patch("app.routers.chat.schedule_summary")
+@patch("app.routers.chat.get_chat_writer")
+@patch("app.services.conversation_agent.LLMFactory.stream_completion", side_effect=fake_stream)
+def test_sse_stream_answers_a_pending_goal_link(stream_completion, get_chat_writer, schedule_summary,
+                                               schedule_recall_index):
+    from app.services.session_state import PENDING_GOAL_LINK, get_session_store
+
+    convo_id = uuid.uuid4()
+    store = get_session_store()
+    store.set(PENDING_GOAL_LINK, {"task_id": "1", "task_title": "Write docs", "goals": []}, session_key=str(convo_id))
+    user_msg = new_message(convo_id, "user", "No.")
+    chunks = list(chat._stream_reply(convo_id, user_msg, [{"role": "user", "content": user_msg.content}]))
+
+    final = json.loads(chunks[-1].split("data: ", 1)[1])
+    assert final["ai_message"] == "Germain: Okay, task 'Write docs' created without linking a goal."
+    assert store.get(PENDING_GOAL_LINK, session_key=str(convo_id)) is None
+    stream_completion.assert_not_called()
+
+
+@patch("app.routers.chat.schedule_recall_index")
+@patch("app.routers.chat.schedule_summary")
+@patch("app.routers.chat.get_chat_writer")
+def test_sse_stream_runs_under_the_turn_scopes(get_chat_writer, schedule_summary, schedule_recall_index):
+    import contextvars
+
+    from app.database.unit_of_work import _current_uow
+    from app.services.latency_control import remaining_turn_time
+    from app.services.session_state import current_session_key
+
+    convo_id = uuid.uuid4()
+    seen = []
+
+    def scoped_stream(*args, **kwargs):
+        for text in ["Let's", " plan"]:
+            seen.append((remaining_turn_time() is not None, _current_uow.get() is not None, current_session_key()))
+            yield {"event": "delta", "text": text}
+        yield {"event": "final", "message": "Let's plan", "completion": None}
+
+    user_msg = new_message(convo_id, "user", "Help me plan the launch")
+    with patch("app.routers.chat.stream_conversation", side_effect=scoped_stream):
+        stream = chat._stream_reply(convo_id, user_msg, [{"role": "user", "content": user_msg.content}])
+        # Each step in a new context, as StreamingResponse runs a sync generator
+        chunks = []
+        while (chunk := contextvars.copy_context().run(next, stream, None)) is not None:
+            chunks.append(chunk)
+
+    assert seen == [(True, True, str(convo_id))] * 2
+    assert json.loads(chunks[-1].split("data: ", 1)[1])["ai_message"] == "Alfred: Let's plan"
+
+
+@patch("app.routers.chat.schedule_recall_index")
+@patch("app.routers.chat.schedule_summary")
+@patch("app.routers.chat.get_chat_writer")
+def test_sse_stream_ends_the_turn_when_it_runs_out_of_time(get_chat_writer, schedule_summary, schedule_recall_index):
+    from app.services.agent import TURN_TIMEOUT_MESSAGE
+    from app.services.latency_control import DeadlineExceeded
+
+    convo_id = uuid.uuid4()
+    user_msg = new_message(convo_id, "user", "Help me plan the launch")
+    with patch("app.routers.chat.stream_conversation", side_effect=DeadlineExceeded("no time left")):
+        chunks = list(chat._stream_reply(convo_id, user_msg, [{"role": "user", "content": user_msg.content}]))
+
+    assert json.loads(chunks[-1].split("data: ", 1)[1])["ai_message"] == TURN_TIMEOUT_MESSAGE
+
+
+@patch("app.services.llm_factory.get_rate_limiter")
+def test_stream_completion_settles_its_rate_limit_reservation(get_rate_limiter):
+    from app.services.llm_factory import LLMFactory
+
+    limiter = get_rate_limiter.return_value
+    limiter.acquire.return_value = 500
+    factory = LLMFactory("openai")
+    with patch.object(factory.client.chat.completions, "create_partial", side_effect=fake_stream):
+        events = list(factory.stream_completion(EnhancedConversationResponse,
+                                                [{"role": "user", "content": "Help me plan the launch"}]))
+
+    assert events[-1] == FINAL
+    provider, reserved, actual = limiter.settle.call_args.args
+    assert (provider, reserved) == ("openai", 500)
+    assert 0 < actual < 500
@@ -0,0 +1,62 @@
+# tests/test_conversation_context.py
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.conversation_models import ConversationContext, ConversationContextDB, ConversationMessageDB
+from app.services.conversation_context import extract_context_from_messages, refresh_conversation_context
+
+ASSISTANT_STEPS = "Algorithmic trading plan:\n1. Market research first\n2. Define objectives\n- Test the strategy"
+
+
+@pytest.fixture
+def tables():
+    return [ConversationMessageDB.__table__, ConversationContextDB.__table__]
+
+
+def add_message(db, convo_id, role, content, at):
+    db.add(ConversationMessageDB(conversation_id=convo_id, role=role, content=content, created_at=at))
+    db.commit()
+
+
+def test_context_lists_are_bounded():
+    context = ConversationContext(current_topic="topic 0")
+    for i in range(ConversationContext.MAX_DISCUSSION_POINTS + 10):
+        context.add_discussion_point(f"point {i}", "general")
+    for i in range(ConversationContext.MAX_TOPICS + 5):
+        context.add_topic_details(f"topic {i}", [f"detail {j}" for j in range(ConversationContext.MAX_TOPIC_DETAILS + 3)])
+
+    assert len(context.discussion_points) == ConversationContext.MAX_DISCUSSION_POINTS
+    assert context.discussion_points[-1].content.endswith(str(ConversationContext.MAX_DISCUSSION_POINTS + 9))
+    assert len(context.topic_details) == ConversationContext.MAX_TOPICS
+    # The current topic is never evicted, and each topic keeps its newest details
+    assert "topic 0" in context.topic_details
+    assert all(len(details) == ConversationContext.MAX_TOPIC_DETAILS for details in context.topic_details.values())
+
+
+def test_compact_round_trip():
+    context = extract_context_from_messages([{"role": "assistant", "content": ASSISTANT_STEPS}])
+    restored = ConversationContext.from_compact(context.to_compact())
+
+    assert restored == context
+    assert ConversationContext.from_compact(None) == ConversationContext()
+
+
+def test_refresh_applies_only_new_messages(db):
+    convo_id = uuid.uuid4()
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    add_message(db, convo_id, "user", "Help me with algorithmic trading", start)
+    add_message(db, convo_id, "assistant", ASSISTANT_STEPS, start + timedelta(seconds=1))
+
+    first = refresh_conversation_context(db, convo_id)
+    points = len(first.discussion_points)
+    assert [p.type for p in first.discussion_points] == ["market_research", "objectives", "testing"]
+
+    # Nothing new: the stored context is returned unchanged
+    assert len(refresh_conversation_context(db, convo_id).discussion_points) == points
+
+    add_message(db, convo_id, "assistant", "- Monitor the results", start + timedelta(seconds=2))
+    updated = refresh_conversation_context(db, convo_id)
+    assert len(updated.discussion_points) == points + 1
+    assert updated.discussion_points[-1].type == "monitoring"
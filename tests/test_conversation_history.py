@@ -0,0 +1,68 @@
+# tests/test_conversation_history.py
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.conversation_models import ConversationMessageDB
+from app.services.tools.conversation_tools import decode_cursor, list_messages_page, recent_history
+
+CONVO_ID = uuid.uuid4()
+
+
+@pytest.fixture
+def tables():
+    return [ConversationMessageDB.__table__]
+
+
+@pytest.fixture
+def db(db):
+    start = datetime(2025, 1, 1)
+    for i in range(7):
+        db.add(ConversationMessageDB(conversation_id=CONVO_ID, role="user" if i % 2 == 0 else "assistant",
+                                     content=f"message {i}", created_at=start + timedelta(seconds=i)))
+    # Another conversation must never leak into the window
+    db.add(ConversationMessageDB(conversation_id=uuid.uuid4(), role="user", content="other", created_at=start))
+    db.commit()
+    return db
+
+
+def contents(messages):
+    return [m.content if hasattr(m, "content") else m["content"] for m in messages]
+
+
+def test_recent_history_returns_the_last_messages_oldest_first(db):
+    history = recent_history(db, CONVO_ID, limit=3)
+    assert contents(history) == ["message 4", "message 5", "message 6"]
+    assert history[-1] == {"role": "user", "content": "message 6"}
+
+
+def test_pages_back_from_the_latest_messages(db):
+    page = list_messages_page(db, CONVO_ID, limit=3)
+    assert contents(page.messages) == ["message 4", "message 5", "message 6"]
+
+    page = list_messages_page(db, CONVO_ID, limit=3, before=page.next_cursor)
+    assert contents(page.messages) == ["message 1", "message 2", "message 3"]
+
+    page = list_messages_page(db, CONVO_ID, limit=3, before=page.next_cursor)
+    assert contents(page.messages) == ["message 0"]
+    assert page.next_cursor is None
+
+
+def test_after_cursor_returns_only_newer_messages(db):
+    first = list_messages_page(db, CONVO_ID, limit=2, before=list_messages_page(db, CONVO_ID, limit=5).next_cursor)
+    assert contents(first.messages) == ["message 0", "message 1"]
+
+    cursor = first.next_cursor  # position of message 0
+    newer = list_messages_page(db, CONVO_ID, limit=2, after=cursor)
+    assert contents(newer.messages) == ["message 1", "message 2"]
+
+    caught_up = list_messages_page(db, CONVO_ID, limit=10, after=newer.next_cursor)
+    assert contents(caught_up.messages) == ["message 3", "message 4", "message 5", "message 6"]
+    # Nothing new yet: the cursor stays where it was so clients can keep polling
+    assert list_messages_page(db, CONVO_ID, after=caught_up.next_cursor).next_cursor == caught_up.next_cursor
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
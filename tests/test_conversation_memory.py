@@ -0,0 +1,65 @@
+# tests/test_conversation_memory.py
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.config.settings import get_settings
+from app.models.conversation_models import ConversationContext, ConversationMessageDB, ConversationSummaryDB
+from app.services.conversation_memory import ConversationSummarizer, load_summary, update_summary
+
+CONVO_ID = uuid.uuid4()
+
+
+@pytest.fixture
+def tables():
+    return [ConversationMessageDB.__table__, ConversationSummaryDB.__table__]
+
+
+def add_messages(db, count, start_index=0):
+    start = datetime(2025, 1, 1)
+    for i in range(start_index, start_index + count):
+        db.add(ConversationMessageDB(conversation_id=CONVO_ID, role="user", content=f"message {i}",
+                                     created_at=start + timedelta(seconds=i)))
+    db.commit()
+
+
+def fake_summarize(previous, messages):
+    return f"{previous or ''}[{messages[0].content} .. {messages[-1].content}]"
+
+
+def test_only_messages_outside_the_recent_window_are_summarized(db):
+    segment = get_settings().memory.segment_messages
+    window = get_settings().prompt_budget.history_messages
+
+    add_messages(db, segment + window - 1)
+    assert update_summary(db, CONVO_ID, fake_summarize) == 0
+    assert load_summary(db, CONVO_ID) is None
+
+    add_messages(db, 1, start_index=segment + window - 1)
+    assert update_summary(db, CONVO_ID, fake_summarize) == segment
+    assert load_summary(db, CONVO_ID) == f"[message 0 .. message {segment - 1}]"
+
+    # Already summarized messages are not sent again
+    add_messages(db, segment, start_index=segment + window)
+    assert update_summary(db, CONVO_ID, fake_summarize) == segment
+    assert load_summary(db, CONVO_ID).endswith(f"[message {segment} .. message {2 * segment - 1}]")
+
+
+def test_summary_is_rendered_but_not_stored_with_the_context():
+    context = ConversationContext(current_topic="launch", summary="- User plans a launch in May")
+
+    assert context.to_prompt().startswith("Earlier in this conversation:\n- User plans a launch in May")
+    assert "summary" not in context.to_compact()
+
+
+def test_schedule_never_blocks_and_deduplicates():
+    with patch("app.services.conversation_memory.ConversationSummarizer._process") as process:
+        summarizer = ConversationSummarizer(session_factory=MagicMock(), queue_size=1)
+        assert summarizer.schedule(CONVO_ID)
+        assert summarizer.schedule(CONVO_ID)
+        summarizer.join()
+
+    process.assert_called_with(CONVO_ID)
+    assert process.call_count in (1, 2)
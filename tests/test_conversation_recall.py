@@ -0,0 +1,59 @@
+# tests/test_conversation_recall.py
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from app.models.conversation_models import ConversationContext
+from app.services.chat_persistence import new_message
+from app.services.conversation_recall import ConversationRecall, rank_recalled
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def result(contents, distance, days_ago, role="user"):
+    metadata = {"role": role, "created_at": (NOW - timedelta(days=days_ago)).isoformat()}
+    return (uuid.uuid1(), metadata, contents, None, distance)
+
+
+def test_recency_breaks_close_similarity():
+    results = [
+        result("We chose momentum for the trading strategy", 0.20, days_ago=90),
+        result("Final decision: mean reversion for the trading strategy", 0.22, days_ago=2),
+        result("Unrelated chat about lunch", 0.80, days_ago=1),
+    ]
+    recalled = rank_recalled(results, NOW, half_life_days=30, top_k=1)
+    assert recalled == ["user: Final decision: mean reversion for the trading strategy"]
+
+
+def test_recalled_messages_are_returned_oldest_first_without_the_window():
+    results = [
+        result("Newer decision", 0.1, days_ago=1, role="assistant"),
+        result("Older decision", 0.1, days_ago=5),
+        result("Already in the window", 0.0, days_ago=0),
+    ]
+    recalled = rank_recalled(results, NOW, half_life_days=30, top_k=3, exclude=["Already in the window"])
+    assert recalled == ["user: Older decision", "assistant: Newer decision"]
+
+
+def test_messages_are_indexed_in_their_time_partition():
+    store = MagicMock()
+    store.get_embedding.return_value = [0.1, 0.2]
+    recall = ConversationRecall(vector_store=store)
+    convo_id = uuid.uuid4()
+    message = new_message(convo_id, "user", "Let's settle the trading strategy this week")
+
+    recall.schedule_index([message, new_message(convo_id, "user", "ok")])  # too short to embed
+    recall.join()
+
+    store.create_tables.assert_called_once()
+    record = store.upsert.call_args.args[0].iloc[0]
+    assert uuid.UUID(record["id"]).version == 1
+    assert record["metadata"]["conversation_id"] == str(convo_id)
+    assert record["contents"] == message.content
+    assert store.upsert.call_count == 1
+
+
+def test_recall_is_rendered_in_the_prompt_but_not_stored():
+    context = ConversationContext(recalled=["user: We chose mean reversion"])
+    assert "Relevant earlier messages:\n- user: We chose mean reversion" in context.to_prompt()
+    assert "recalled" not in context.to_compact()
@@ -0,0 +1,52 @@
+# tests/test_decision_prefetch.py
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from app.services import decision_prefetch
+from app.services.decision_prefetch import prefetch_session, prefetched
+
+
+def partial(tool_name=None, subject=None, priority=None):
+    # Mimics the partial AgentDecision objects instructor yields while streaming
+    tool_input = SimpleNamespace(subject=subject, priority=priority)
+    return SimpleNamespace(
+        tool_name=tool_name,
+        tool_input=tool_input,
+        model_dump=lambda: {"tool_name": tool_name, "subject": subject, "priority": priority},
+    )
+
+
+def test_lookup_starts_once_subject_is_complete_and_is_reused():
+    search = MagicMock(__name__="search_tasks_by_subject", return_value=["task"])
+    lookups = {"update_task": (search, True, {"limit": 1})}
+
+    with patch.dict(decision_prefetch.PREFETCH_LOOKUPS, lookups, clear=True), prefetch_session() as session:
+        session.observe(partial("update_task", "Proj"))
+        session.observe(partial("update_task", "Project X"))
+        assert not search.called  # the subject may still be growing
+
+        session.observe(partial("update_task", "Project X", priority="hi"))
+        session.observe(partial("update_task", "Project X", priority="high"))
+
+        assert prefetched(search, "Project X", limit=1) == ["task"]
+        search.assert_called_once_with("Project X", limit=1)
+
+
+def test_different_final_subject_runs_the_lookup_normally():
+    search = MagicMock(__name__="search_tasks_by_subject", return_value=[])
+    lookups = {"update_task": (search, True, {"limit": 1})}
+
+    with patch.dict(decision_prefetch.PREFETCH_LOOKUPS, lookups, clear=True), prefetch_session() as session:
+        session.observe(partial("update_task", "Homework"))
+        session.observe(partial("update_task", "Homework", priority="low"))
+
+        prefetched(search, "Homework assignment", limit=1)
+
+    # The unused "Homework" prefetch is simply discarded (or cancelled before it ran)
+    search.assert_any_call("Homework assignment", limit=1)
+
+
+def test_prefetched_without_session_calls_directly():
+    lookup = MagicMock(__name__="list_goals", return_value=[])
+    assert prefetched(lookup) == []
+    lookup.assert_called_once_with()
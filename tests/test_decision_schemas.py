@@ -0,0 +1,70 @@
+# tests/test_decision_schemas.py
+import json
+
+import pytest
+
+from app.models.agent_decision import AgentDecision
+from app.models.task_models import TaskUpdate
+from app.services.decision_schemas import (
+    NARROWED_DECISIONS,
+    decision_model_for,
+    select_tool_family,
+    to_agent_decision,
+)
+
+
+@pytest.mark.parametrize("query, family", [
+    ("Create a task called Review budget due Friday", "task_create"),
+    ("Update Task Project X set priority to high", "task_update"),
+    ("Mark my dentist appointment as completed", "task_update"),
+    ("Delete the task Buy groceries", "task_delete"),
+    ("Create a task to update the website", None),
+    ("Change the target date of my marathon goal", "goal_update"),
+    ("List my goals", "goal_query"),
+    ("Get goal Run a marathon", "goal_query"),
+    ("Get task service for id 1234", None),
+    ("Germain, handle it", None),
+])
+def test_select_tool_family(query, family):
+    assert select_tool_family(query) == family
+
+
+# Mixed verbs used to pick the first group in a fixed order, e.g. "new" made an update a create
+@pytest.mark.parametrize("query, family", [
+    ("Update task Project X with a new due date", "task_update"),
+    ("Rename task Write docs to Write new docs", "task_update"),
+    ("Add a step to remove clutter as a task", None),
+    ("Set up a task for the dentist", "task_create"),
+    ("Create a task called Review budget due Friday", "task_create"),
+    ("Show tasks due tomorrow", "task_query"),
+])
+def test_select_tool_family_mixed_verbs(query, family):
+    assert select_tool_family(query) == family
+
+
+def test_goal_query_allows_get_goal():
+    model = NARROWED_DECISIONS["goal_query"]
+    decision = to_agent_decision(model(tool_name="get_goal", tool_input={"id": None, "subject": "Run a marathon"}))
+    assert decision.tool_name == "get_goal"
+
+
+def test_narrowed_schema_is_smaller_than_full_schema():
+    full = len(json.dumps(AgentDecision.model_json_schema()))
+    for model in NARROWED_DECISIONS.values():
+        assert len(json.dumps(model.model_json_schema())) < full
+
+
+def test_narrowed_decision_converts_to_agent_decision():
+    model = decision_model_for("Update task Project X set priority to high")
+    narrowed = model(tool_name="update_task", tool_input=TaskUpdate(id=None, subject="Project X", priority="high"))
+
+    decision = to_agent_decision(narrowed)
+    assert isinstance(decision, AgentDecision)
+    assert decision.tool_name == "update_task"
+    assert decision.tool_input.subject == "Project X"
+
+
+def test_narrowed_model_rejects_other_tools():
+    model = NARROWED_DECISIONS["task_update"]
+    with pytest.raises(ValueError):
+        model(tool_name="delete_task", tool_input={"id": None, "subject": "x"})
@@ -0,0 +1,97 @@
+# tests/test_goal_suggestions.py
+import uuid
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.models.agent_decision import AgentDecision
+from app.models.goal_models import GoalDB
+from app.models.task_models import CreateTask
+from app.services import agent
+from app.services.goal_suggestions import GoalIndex, GoalSuggestion, record_id, suggest_goals
+from app.services.session_state import PENDING_GOAL_LINK, conversation_session, get_session_store
+
+
+def test_goal_records_are_replaced_and_removed_by_a_stable_id():
+    store = MagicMock()
+    store.get_embedding.return_value = [0.1, 0.2]
+    index = GoalIndex(vector_store=store)
+    goal_id = uuid.uuid4()
+
+    index.schedule_upsert(goal_id, "Run a marathon", "Train four times a week")
+    index.schedule_upsert(goal_id, "Run a half marathon")
+    index.schedule_delete(goal_id)
+    index.join()
+
+    first, second = (call.args[0].iloc[0] for call in store.upsert.call_args_list)
+    assert first["id"] == second["id"] == record_id(goal_id)
+    assert uuid.UUID(first["id"]).version == 1
+    assert first["contents"] == "Run a marathon\nTrain four times a week"
+    assert second["metadata"] == {"goal_id": str(goal_id), "title": "Run a half marathon"}
+    store.delete.assert_called_once_with(ids=[record_id(goal_id)])
+
+
+def test_committed_goal_writes_are_indexed_and_rolled_back_ones_are_not(db):
+    index = MagicMock()
+
+    with patch("app.services.goal_suggestions.get_goal_index", return_value=index):
+        goal = GoalDB(title="Launch the website", description="")
+        db.add(goal)
+        db.commit()
+        index.schedule_upsert.assert_called_once_with(str(goal.id), "Launch the website", "")
+
+        db.add(GoalDB(title="Never committed"))
+        db.flush()
+        db.rollback()
+        goal.completed = True  # not a title or description change
+        db.commit()
+        assert index.schedule_upsert.call_count == 1
+
+        db.delete(goal)
+        db.commit()
+        index.schedule_delete.assert_called_once_with(str(goal.id))
+
+
+def test_only_close_goals_are_suggested():
+    index = MagicMock()
+    index.nearest.return_value = [GoalSuggestion(id="1", title="Launch the website", similarity=0.62),
+                                  GoalSuggestion(id="2", title="Learn Spanish", similarity=0.12)]
+    with patch("app.services.goal_suggestions.get_goal_index", return_value=index):
+        assert [s.title for s in suggest_goals("Write landing page copy")] == ["Launch the website"]
+    index.nearest.assert_called_once_with("Write landing page copy", 3)
+
+
+def create_task_decision(title):
+    task = CreateTask(title=title, description="", due_date=None, priority=None)
+    return AgentDecision(tool_name="create_task", tool_input=task)
+
+
+@pytest.fixture
+def created():
+    task = SimpleNamespace(id=str(uuid.uuid4()), title="Write landing page copy", description="",
+                           due_date=None, goal_id=None)
+    with patch("app.services.agent.create_task", return_value=task):
+        yield task
+
+
+def test_a_close_goal_is_linked_without_asking(created):
+    best = GoalSuggestion(id=str(uuid.uuid4()), title="Launch the website", similarity=0.91)
+    linked = SimpleNamespace(**{**vars(created), "goal_id": best.id})
+    with patch("app.services.agent.suggest_goals", return_value=[best]), \
+         patch("app.services.agent.update_task", return_value=linked) as update:
+        reply = agent.agent_execute(create_task_decision(created.title))
+
+    assert reply == "Created task 'Write landing page copy' and linked it to goal 'Launch the website'."
+    assert update.call_args.args[0].goal_id == best.id
+
+
+def test_only_the_suggested_goals_are_offered_and_stored(created):
+    goals = [GoalSuggestion(id=str(i), title=f"Goal {i}", similarity=0.5) for i in range(3)]
+    with patch("app.services.agent.suggest_goals", return_value=goals), conversation_session("convo-goals"):
+        reply = agent.agent_execute(create_task_decision(created.title))
+        state = get_session_store().get(PENDING_GOAL_LINK)
+        get_session_store().delete(PENDING_GOAL_LINK)
+
+    assert "3. Goal 2" in reply
+    assert state["goals"] == [{"id": g.id, "title": g.title} for g in goals]
@@ -0,0 +1,73 @@
+# tests/test_latency_control.py
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.models.conversation_models import ConversationContext, Intent, IntentType
+from app.services.latency_control import DeadlineExceeded, call_with_deadline, remaining_turn_time, turn_deadline
+
+
+def test_hedged_request_returns_first_valid_response():
+    calls = []
+
+    def provider_call(timeout: float) -> str:
+        # The first attempt is slow, the hedged duplicate is fast
+        calls.append(timeout)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    start = time.monotonic()
+    result = call_with_deadline("test", provider_call, deadline=2.0, hedge_after=0.05)
+
+    assert result == "fast"
+    assert len(calls) == 2
+    assert time.monotonic() - start < 0.4
+
+
+def test_deadline_exceeded_raises():
+    with pytest.raises(DeadlineExceeded):
+        call_with_deadline("test", lambda timeout: time.sleep(0.3), deadline=0.05, hedge_after=None)
+
+
+def test_turn_deadline_clamps_calls():
+    with turn_deadline(0.05):
+        assert 0 < remaining_turn_time() <= 0.05
+        time.sleep(0.06)
+        with pytest.raises(DeadlineExceeded):
+            call_with_deadline("test", lambda timeout: "never runs")
+    assert remaining_turn_time() is None
+
+
+@patch("app.services.latency_control._hedge_delay", return_value=0.05)
+@patch("app.services.llm_factory.get_rate_limiter")
+def test_a_hedged_completion_takes_quota_once(get_rate_limiter, _):
+    from app.services.llm_factory import LLMFactory
+
+    factory = LLMFactory("openai")
+    requests = []
+
+    def create_with_completion(**params):
+        requests.append(params["timeout"])
+        if len(requests) == 1:
+            time.sleep(0.3)
+        return Intent(primary_intent=IntentType.PLAN, confidence=0.9), SimpleNamespace(usage=None)
+
+    with patch.object(factory.client.chat.completions, "create_with_completion", side_effect=create_with_completion):
+        intent = factory.create_completion(Intent, [{"role": "user", "content": "Plan the launch"}], call_site="intent")
+
+    assert intent.primary_intent == IntentType.PLAN
+    assert len(requests) == 2
+    get_rate_limiter.return_value.acquire.assert_called_once()
+    get_rate_limiter.return_value.settle.assert_called_once()
+
+
+@patch("app.services.agent.LLMFactory.create_completion", side_effect=DeadlineExceeded("turn is over"))
+def test_classification_lets_the_turn_deadline_through(_):
+    from app.services.agent import classify_intent
+
+    with pytest.raises(DeadlineExceeded):
+        classify_intent("Plan the launch", [], ConversationContext())
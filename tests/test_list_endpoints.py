@@ -0,0 +1,95 @@
+# tests/test_list_endpoints.py
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.database.unit_of_work import unit_of_work
+from app.models.goal_models import GoalDB
+from app.models.sql_task_models import TaskDB
+from app.services.tools.task_adapters import list_reccent_tasks
+
+START = datetime(2024, 5, 1, 9, 0)
+GOAL_ID = uuid.UUID("a1b2c3d4-0000-4000-8000-00000000abcd")
+
+
+@pytest.fixture(autouse=True)
+def rows(db):
+    db.add(GoalDB(id=GOAL_ID, title="Launch the website", created_at=START))
+    db.add(GoalDB(title="Learn Spanish", created_at=START + timedelta(days=1), completed=True))
+    for i in range(8):
+        db.add(TaskDB(
+            title=f"Task {i}",
+            description="",
+            created_at=START + timedelta(hours=i),
+            # Every third task has no due date
+            due_date=None if i % 3 == 0 else START + timedelta(days=8 - i),
+            completed=i % 2 == 1,
+            priority=["high", "low"][i % 2],
+            goal_id=GOAL_ID if i < 3 else None,
+        ))
+    db.commit()
+
+
+def all_pages(client, path, key, **params):
+    items, cursor, pages = [], None, 0
+    while True:
+        body = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})}).json()
+        items += body[key]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return items, pages
+
+
+def test_pages_cover_every_task_once_in_order(client):
+    tasks_, pages = all_pages(client, "/tasks/", "tasks", limit=3, fields="title")
+    assert [t["title"] for t in tasks_] == [f"Task {i}" for i in reversed(range(8))]
+    assert pages == 3
+    assert set(tasks_[0]) == {"title"}
+
+
+def test_nullable_sort_keeps_tasks_without_due_date_last(client):
+    ascending, _ = all_pages(client, "/tasks/", "tasks", sort="due_date", limit=2, fields="title,due_date")
+    dated = [t["title"] for t in ascending if t["due_date"]]
+    assert dated == ["Task 7", "Task 5", "Task 4", "Task 2", "Task 1"]
+    assert [t["due_date"] for t in ascending[5:]] == [None, None, None]
+
+    descending, _ = all_pages(client, "/tasks/", "tasks", sort="-due_date", limit=2, fields="title,due_date")
+    assert [t["title"] for t in descending[:5]] == list(reversed(dated))
+    assert len(descending) == 8
+
+
+def test_filters_are_applied_in_the_database(client):
+    def titles(**params):
+        return [t["title"] for t in client.get("/tasks/", params={"sort": "title", **params}).json()["tasks"]]
+
+    assert titles(completed="false") == ["Task 0", "Task 2", "Task 4", "Task 6"]
+    assert titles(goal_id=str(GOAL_ID), priority=["low"]) == ["Task 1"]
+    assert titles(due_after=(START + timedelta(days=4)).isoformat(),
+                  due_before=(START + timedelta(days=7)).isoformat()) == ["Task 2", "Task 4"]
+
+    open_goals = client.get("/goals/", params={"completed": "false", "fields": "id,title"}).json()
+    assert open_goals == {"goals": [{"id": str(GOAL_ID), "title": "Launch the website"}], "next_cursor": None}
+
+
+def test_invalid_listing_parameters_are_rejected(client):
+    cursor = client.get("/tasks/", params={"limit": 1}).json()["next_cursor"]
+    assert client.get("/tasks/", params={"sort": "description"}).status_code == 400
+    assert client.get("/tasks/", params={"fields": "id,secret"}).status_code == 400
+    assert client.get("/tasks/", params={"cursor": "not-a-cursor"}).status_code == 400
+    # A cursor only continues the sort it was issued for
+    assert client.get("/tasks/", params={"cursor": cursor, "sort": "title"}).status_code == 400
+    assert client.get("/tasks/", params={"limit": 500}).status_code == 422
+
+
+def test_recent_tasks_are_one_ordered_limited_query(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with unit_of_work("test", bind=engine):
+        recent = list_reccent_tasks(limit=3)
+
+    assert [t.title for t in recent] == ["Task 7", "Task 6", "Task 5"]
+    assert len(statements) == 1
+    assert "ORDER BY tasks.created_at DESC" in statements[0] and "LIMIT" in statements[0]
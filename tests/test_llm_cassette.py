@@ -0,0 +1,51 @@
+# tests/test_llm_cassette.py
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.models.conversation_models import Intent, IntentType
+from app.services.llm_cassette import Cassette, CassetteMiss
+from app.services.llm_factory import LLMFactory
+
+MESSAGES = [{"role": "user", "content": "What are my current tasks?"}]
+
+
+def test_record_then_replay_without_provider(tmp_path):
+    path = str(tmp_path / "cassette.json")
+    recorded = Intent(primary_intent=IntentType.QUERY, confidence=0.9)
+
+    factory = LLMFactory(provider="openai")
+    factory.client = MagicMock()
+    factory.client.chat.completions.create_with_completion.return_value = (recorded, SimpleNamespace(usage=None))
+    with patch("app.services.llm_factory.get_cassette", return_value=Cassette(path, mode="record")):
+        factory.create_completion(response_model=Intent, messages=MESSAGES, call_site="intent")
+
+    # A fresh factory whose provider must never be called
+    factory = LLMFactory(provider="openai")
+    factory.client = MagicMock()
+    with patch("app.services.llm_factory.get_cassette", return_value=Cassette(path, mode="replay")):
+        replayed = factory.create_completion(response_model=Intent, messages=MESSAGES, call_site="intent")
+
+    assert replayed == recorded
+    factory.client.chat.completions.create_with_completion.assert_not_called()
+
+
+def test_replay_falls_back_to_latest_recording_for_call_site(tmp_path):
+    cassette = Cassette(str(tmp_path / "cassette.json"), mode="record")
+    cassette.record_completion("intent", Intent, MESSAGES, Intent(primary_intent=IntentType.PLAN, confidence=0.7))
+
+    replay = Cassette(cassette.path, mode="replay")
+    other_messages = [{"role": "user", "content": "Something never recorded"}]
+    assert replay.replay_completion("intent", Intent, other_messages).primary_intent == IntentType.PLAN
+
+    with pytest.raises(CassetteMiss):
+        replay.replay_completion("decision", Intent, MESSAGES)
+
+
+def test_unknown_embedding_is_stable(tmp_path):
+    cassette = Cassette(str(tmp_path / "cassette.json"), mode="replay")
+    first = cassette.replay_embedding("text-embedding-3-small", "hello")
+
+    assert first == cassette.replay_embedding("text-embedding-3-small", "hello")
+    assert len(first) == 1536
@@ -0,0 +1,113 @@
+# tests/test_llm_factory.py
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from pydantic import ValidationError
+
+from app.models.conversation_models import Intent, IntentType
+from app.services.llm_factory import LLMFactory
+
+
+def make_factory(side_effect) -> LLMFactory:
+    # Replace the instructor client with a fake that records the model of each call
+    factory = LLMFactory(provider="openai")
+    factory.client = MagicMock()
+    factory.client.chat.completions.create_with_completion.side_effect = side_effect
+    return factory
+
+
+def called_models(factory: LLMFactory) -> list:
+    return [c.kwargs["model"] for c in factory.client.chat.completions.create_with_completion.call_args_list]
+
+
+def intent(confidence: float):
+    return Intent(primary_intent=IntentType.QUERY, confidence=confidence), SimpleNamespace(usage=None)
+
+
+def test_call_site_uses_routed_model():
+    factory = make_factory(lambda **kwargs: intent(0.9))
+    factory.create_completion(response_model=Intent, messages=[], call_site="intent")
+
+    assert called_models(factory) == [factory.settings.call_site_models["intent"]]
+
+
+def test_low_confidence_escalates_to_larger_model():
+    factory = make_factory([intent(0.2), intent(0.95)])
+    result = factory.create_completion(
+        response_model=Intent, messages=[], call_site="intent", escalate_if=lambda r: r.confidence < 0.6
+    )
+
+    assert result.confidence == 0.95
+    assert called_models(factory) == [factory.settings.call_site_models["intent"], factory.settings.escalation_model]
+
+
+def test_validation_failure_escalates_to_larger_model():
+    try:
+        Intent(primary_intent="nope", confidence=2)
+    except ValidationError as e:
+        validation_error = e
+
+    factory = make_factory([validation_error, intent(0.9)])
+    factory.create_completion(response_model=Intent, messages=[], call_site="event_gate")
+
+    assert called_models(factory)[-1] == factory.settings.escalation_model
+
+
+def test_calls_are_recorded_per_request_id():
+    from app.services.llm_metrics import llm_metrics, set_request_id, request_id_var
+
+    usage = SimpleNamespace(prompt_tokens=120, completion_tokens=15, prompt_tokens_details=SimpleNamespace(cached_tokens=64))
+    factory = make_factory(lambda **kwargs: (Intent(primary_intent=IntentType.QUERY, confidence=0.9), SimpleNamespace(usage=usage)))
+
+    token = set_request_id("test-request-1")
+    try:
+        factory.create_completion(response_model=Intent, messages=[], call_site="intent")
+    finally:
+        request_id_var.reset(token)
+
+    [record] = llm_metrics.calls_for_request("test-request-1")
+    assert record.call_site == "intent"
+    assert (record.prompt_tokens, record.completion_tokens, record.cached_tokens) == (120, 15, 64)
+    assert "llm_call_wall_time_ms_bucket" in llm_metrics.prometheus_text()
+
+
+def test_call_site_routed_to_local_provider(monkeypatch):
+    from app.config.settings import get_settings
+    from app.services.prompt_builder import PromptBuilder
+
+    settings = get_settings()
+    monkeypatch.setitem(settings.routing.call_site_providers, "intent", "llama")
+
+    factory = LLMFactory.for_call_site("intent")
+    assert factory.provider == "llama"
+    assert factory.resolve_model("intent") == settings.llama.default_model
+    # The prompt budget shrinks to what fits in the local model's context window
+    monkeypatch.setattr(settings.llama, "context_size", 1200)
+    assert PromptBuilder("intent").budget == 1200 - settings.llama.max_tokens
+
+
+def test_concurrency_cap_limits_calls_in_flight(monkeypatch):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def slow_call(**kwargs):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return intent(0.9)
+
+    factory = LLMFactory(provider="llama")
+    monkeypatch.setattr(factory.settings, "max_concurrency", 1)
+    factory.client = MagicMock()
+    factory.client.chat.completions.create_with_completion.side_effect = slow_call
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(executor.map(lambda _: factory.create_completion(Intent, [], call_site="cap_test"), range(3)))
+
+    assert peak[0] == 1
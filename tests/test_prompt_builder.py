@@ -0,0 +1,90 @@
+# tests/test_prompt_builder.py
+import pytest
+
+from app.services.prompt_builder import PromptBuilder, count_message_tokens, get_prompt_token_stats
+
+
+def make_history(n: int, words: int = 50) -> list:
+    # Alternate user/assistant messages, each one "words" long
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " + "word " * words}
+        for i in range(n)
+    ]
+
+
+def test_build_keeps_everything_under_budget():
+    history = make_history(3, words=5)
+    messages = PromptBuilder("test_small", budget=1000).add_system("You are a test.").add_history(history).build()
+
+    assert messages[0]["role"] == "system"
+    assert [m["content"] for m in messages[1:]] == [m["content"] for m in history]
+
+
+def test_build_drops_oldest_history_first_and_keeps_current_turn():
+    history = make_history(5, words=400)
+    budget = 1200
+    messages = PromptBuilder("test_drop", budget=budget).add_system("You are a test.").add_history(history).build()
+
+    # The current turn is always the last message
+    assert messages[-1]["content"] == history[-1]["content"]
+    # The oldest message was dropped and compacted into the system prompt
+    assert history[0]["content"] not in [m["content"] for m in messages]
+    assert "Earlier messages (compacted)" in messages[0]["content"]
+    assert count_message_tokens(messages) <= budget
+
+
+def test_build_trims_oldest_context_lines():
+    context = "\n".join(f"- point {i} " + "detail " * 30 for i in range(20))
+    messages = (
+        PromptBuilder("test_context", budget=300)
+        .add_system("You are a test.")
+        .add_context("Context", context)
+        .add_history([{"role": "user", "content": "hi"}])
+        .build()
+    )
+
+    system = messages[0]["content"]
+    assert "point 19" in system
+    assert "point 0 " not in system
+    assert get_prompt_token_stats()["test_context"]["calls"] == 1
+
+
+def test_build_keeps_compacted_history_once_context_is_trimmed():
+    # Dropping one message is not enough on its own, so the summary only fits after context trimming
+    context = "\n".join(f"- point {i} " + "detail " * 30 for i in range(20))
+    messages = (
+        PromptBuilder("test_compact_after_context", budget=500)
+        .add_system("You are a test.")
+        .add_context("Context", context)
+        .add_history(make_history(2, words=100))
+        .build()
+    )
+
+    system = messages[0]["content"]
+    assert "Earlier messages (compacted)" in system
+    assert "point 0 " not in system
+    assert count_message_tokens(messages) <= 500
+
+
+def test_template_keeps_static_prefix_and_volatile_values_last():
+    first = PromptBuilder.from_template("decision").add_volatile("Current time context", "2025-03-22").add_history(
+        [{"role": "user", "content": "create a task"}]
+    ).build()
+    second = PromptBuilder.from_template("decision").add_volatile("Current time context", "2025-04-01").add_history(
+        [{"role": "user", "content": "create a task"}]
+    ).build()
+
+    # Both prompts start with the same static instructions; only the tail differs
+    assert first[0]["content"].endswith("Current time context: 2025-03-22")
+    assert second[0]["content"].endswith("Current time context: 2025-04-01")
+    prefix = first[0]["content"].rsplit("\n\n", 1)[0]
+    assert second[0]["content"].startswith(prefix)
+
+
+def test_template_volatile_fields_are_enforced_and_ordered():
+    builder = PromptBuilder.from_template("conversation").add_volatile("Confidence", 0.9).add_volatile("Current mode", "PLAN")
+    system = builder.build()[0]["content"]
+    assert system.endswith("Current mode: PLAN\nConfidence: 0.9")
+
+    with pytest.raises(ValueError, match="not a volatile field of template 'conversation'"):
+        builder.add_volatile("Current time context", "2025-03-22")
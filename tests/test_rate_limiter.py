@@ -0,0 +1,109 @@
+# tests/test_rate_limiter.py
+import threading
+import time
+
+import pytest
+
+from app.config.settings import RateLimitSettings
+from app.services.rate_limiter import (
+    CallPriority,
+    MemoryBucketStore,
+    RateLimiter,
+    RateLimitQueueFull,
+    RateLimitTimeout,
+    call_priority,
+)
+
+
+def make_limiter(rpm: int, tpm: int = 1_000_000, **overrides) -> RateLimiter:
+    limiter = RateLimiter(MemoryBucketStore())
+    limiter.settings = RateLimitSettings(
+        requests_per_minute={"test": rpm}, tokens_per_minute={"test": tpm}, **overrides
+    )
+    return limiter
+
+
+def test_empty_bucket_times_out():
+    limiter = make_limiter(rpm=2)
+    limiter.acquire("test", 10)
+    limiter.acquire("test", 10)
+
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("test", 10, timeout=0.05)
+
+
+def test_unlisted_provider_is_not_limited():
+    limiter = make_limiter(rpm=1)
+    for _ in range(5):
+        assert limiter.acquire("llama", 10) == 0
+
+
+def test_interactive_is_served_before_waiting_batch():
+    limiter = make_limiter(rpm=600)  # one request every 0.1s once drained
+    for _ in range(600):
+        limiter.acquire("test", 1)
+
+    order = []
+
+    def worker(priority):
+        with call_priority(priority):
+            limiter.acquire("test", 1, timeout=2)
+        order.append(priority)
+
+    batch = threading.Thread(target=worker, args=(CallPriority.BATCH,))
+    batch.start()
+    time.sleep(0.02)  # batch is queued first
+    interactive = threading.Thread(target=worker, args=(CallPriority.INTERACTIVE,))
+    interactive.start()
+    batch.join()
+    interactive.join()
+
+    assert order == [CallPriority.INTERACTIVE, CallPriority.BATCH]
+
+
+def test_rate_limit_feedback_pauses_and_slows_down():
+    limiter = make_limiter(rpm=1000)
+    limiter.on_rate_limited("test", retry_after=0.3)
+
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("test", 1, timeout=0.05)
+    assert limiter.store.rate_factor("test") == pytest.approx(0.5)
+
+
+def test_full_queue_fails_fast():
+    limiter = make_limiter(rpm=10, max_queue={"interactive": 0, "batch": 0})
+
+    with pytest.raises(RateLimitQueueFull):
+        limiter.acquire("test", 1)
+
+
+def test_store_is_called_outside_the_queue_lock():
+    limiter = make_limiter(rpm=100)
+    store, lock_free = limiter.store, []
+
+    class ProbingStore:
+        def take(self, *args):
+            # Another caller could queue up (or fail fast) while this take is in flight
+            acquired = limiter._cond.acquire(blocking=False)
+            lock_free.append(acquired)
+            if acquired:
+                limiter._cond.release()
+            return store.take(*args)
+
+    limiter.store = ProbingStore()
+    limiter.acquire("test", 10)
+    assert lock_free == [True]
+
+
+def test_settle_corrects_tokens_and_recovers_in_one_store_update():
+    limiter = make_limiter(rpm=1000, tpm=1000)
+    limiter.on_rate_limited("test", retry_after=0)
+    calls = []
+    settle = limiter.store.settle
+    limiter.store.settle = lambda *args: (calls.append(args), settle(*args))
+
+    reserved = limiter.acquire("test", 100)
+    limiter.settle("test", reserved, 40)
+
+    assert len(calls) == 1
+    assert limiter.store.rate_factor("test") == pytest.approx(0.5 + limiter.settings.recovery_step)
@@ -0,0 +1,105 @@
+# tests/test_session_state.py
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.models.session_state import SessionStateDB
+from app.services.session_state import (
+    PENDING_GOAL_LINK,
+    PostgresStateBackend,
+    SessionStateStore,
+    conversation_session,
+    current_session_key,
+)
+
+STATE = {"task_id": "1", "task_title": "Write docs", "goals": [{"id": "g1", "title": "Ship v1"}]}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with patch("app.services.session_state.time.time", clock):
+        yield clock
+
+
+@pytest.fixture
+def tables():
+    return [SessionStateDB.__table__]
+
+
+@pytest.fixture
+def backend(engine):
+    return PostgresStateBackend(session_factory=sessionmaker(bind=engine))
+
+
+def test_state_is_scoped_per_conversation():
+    store = SessionStateStore()
+    with conversation_session("convo-a"):
+        assert current_session_key() == "convo-a"
+        store.set(PENDING_GOAL_LINK, STATE)
+        assert store.get(PENDING_GOAL_LINK) == STATE
+    with conversation_session("convo-b"):
+        assert store.get(PENDING_GOAL_LINK) is None
+    assert store.get(PENDING_GOAL_LINK, session_key="convo-a") == STATE
+
+
+def test_values_expire_after_ttl(clock):
+    store = SessionStateStore(ttl_s=60)
+    store.set(PENDING_GOAL_LINK, STATE)
+    clock.now += 59
+    assert store.get(PENDING_GOAL_LINK) == STATE
+    clock.now += 2
+    assert store.get(PENDING_GOAL_LINK) is None
+
+
+def test_local_tier_evicts_least_recently_used():
+    store = SessionStateStore(max_local_entries=2)
+    store.set("step", 1, session_key="a")
+    store.set("step", 2, session_key="b")
+    store.get("step", session_key="a")
+    store.set("step", 3, session_key="c")
+
+    assert store.get("step", session_key="b") is None
+    assert store.get("step", session_key="a") == 1
+    assert len(store.local) == 2
+
+
+def test_shared_backend_is_seen_by_other_workers(clock, backend):
+    worker_a = SessionStateStore(backend=backend, local_ttl_s=2)
+    worker_b = SessionStateStore(backend=backend, local_ttl_s=2)
+
+    worker_a.set(PENDING_GOAL_LINK, STATE, session_key="convo")
+    assert worker_b.get(PENDING_GOAL_LINK, session_key="convo") == STATE
+
+    # Worker B answers the question; worker A's local copy is only trusted for local_ttl_s
+    worker_b.delete(PENDING_GOAL_LINK, session_key="convo")
+    clock.now += 3
+    assert worker_a.get(PENDING_GOAL_LINK, session_key="convo") is None
+
+
+def test_backend_drops_expired_rows(clock, backend):
+    store = SessionStateStore(backend=backend, ttl_s=10)
+    store.set(PENDING_GOAL_LINK, STATE, session_key="convo")
+    clock.now += 11
+    assert backend.get("convo:" + PENDING_GOAL_LINK) is None
+
+
+def test_coordinated_chat_answers_a_pending_goal_link():
+    from app.services.agent_coordinator import coordinate_agents
+    from app.services.session_state import get_session_store
+
+    store = get_session_store()
+    store.set(PENDING_GOAL_LINK, STATE, session_key="convo-link")
+    reply = coordinate_agents([{"role": "user", "content": "No."}], session_key="convo-link")
+
+    assert reply == "Germain: Okay, task 'Write docs' created without linking a goal."
+    assert store.get(PENDING_GOAL_LINK, session_key="convo-link") is None
@@ -0,0 +1,95 @@
+# tests/test_subject_resolver.py
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+from app.models.sql_task_models import TaskBulkItemSQL, TaskDB
+from app.services.subject_resolver import TitleIndex, get_subject_resolver
+from app.services.tools.sql_task_tools import insert_sql_tasks
+
+
+def test_title_index_exact_prefix_and_updates():
+    ids = [uuid.uuid4() for _ in range(4)]
+    index = TitleIndex([(ids[0], "Write docs"), (ids[1], "Write  docs for the API"), (ids[2], "Review budget")])
+
+    assert [m.id for m in index.exact("write DOCS")] == [ids[0]]
+    # Shortest title first
+    assert [m.id for m in index.prefix("write")] == [ids[0], ids[1]]
+    assert index.prefix("docs") == []
+
+    index.add(ids[0], "Ship release")  # rename
+    index.add(ids[3], "Write docs for the API")  # same title, second row
+    assert [m.id for m in index.prefix("write")] == [ids[1], ids[3]]
+    index.remove(ids[1])
+    index.remove(ids[3])
+    assert index.prefix("write") == []
+    assert len(index) == 2
+
+
+@pytest.fixture
+def db(db):
+    db.add_all([TaskDB(title="Write docs"), TaskDB(title="Review the quarterly budget")])
+    db.commit()
+    resolver = get_subject_resolver(TaskDB)
+    resolver.invalidate()
+    yield db
+    resolver.invalidate()
+
+
+def count_statements(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_exact_and_prefix_matches_come_from_the_cache(engine, db):
+    resolver = get_subject_resolver(TaskDB)
+    resolver.resolve(db, "anything")  # loads the index
+    statements = count_statements(engine)
+
+    assert [m.title for m in resolver.resolve(db, "write docs")] == ["Write docs"]
+    assert [m.title for m in resolver.resolve(db, "Review the")] == ["Review the quarterly budget"]
+    assert statements == []
+
+    # A match inside the title needs the database
+    assert [m.title for m in resolver.resolve(db, "quarterly")] == ["Review the quarterly budget"]
+    assert len(statements) == 1
+
+
+def test_committed_writes_update_the_cache_and_rollbacks_do_not(engine, db):
+    resolver = get_subject_resolver(TaskDB)
+    resolver.resolve(db, "anything")
+
+    task = db.query(TaskDB).filter(TaskDB.title == "Write docs").one()
+    task.title = "Publish docs"
+    db.add(TaskDB(title="Plan sprint"))
+    db.commit()
+    insert_sql_tasks(db, [TaskBulkItemSQL(title="Plan retro", description=None, due_date=None, priority=None)])
+    db.commit()
+
+    statements = count_statements(engine)
+    assert [m.title for m in resolver.resolve(db, "plan")] == ["Plan retro", "Plan sprint"]
+    assert [m.title for m in resolver.resolve(db, "publish docs")] == ["Publish docs"]
+    assert statements == []
+
+    db.delete(task)
+    db.add(TaskDB(title="Never committed"))
+    db.flush()
+    db.rollback()
+    assert [m.title for m in resolver.resolve(db, "publish docs")] == ["Publish docs"]
+    assert resolver.resolve(db, "never committed") == []
+
+
+def test_search_skips_titles_renamed_by_another_process(engine, db):
+    from app.database.unit_of_work import unit_of_work
+    from app.services.tools.sql_task_tools import search_sql_tasks_by_subject
+
+    get_subject_resolver(TaskDB).resolve(db, "anything")  # loads the index
+    # Not through this process's sessions, so the cached index still has the old title
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE tasks SET title = 'Publish docs' WHERE title = 'Write docs'")
+
+    with unit_of_work("turn", bind=engine):
+        assert search_sql_tasks_by_subject("write docs") == []
+        assert [t.title for t in search_sql_tasks_by_subject("publish docs")] == ["Publish docs"]
@@ -0,0 +1,112 @@
+# tests/test_tool_executor.py
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.models.agent_decision import AgentDecision
+from app.models.goal_models import GoalCreate
+from app.models.task_models import CreateTask, TaskDelete
+from app.services import agent
+from app.services.decision_schemas import is_multi_action
+from app.services.tool import TOOLS, ToolResult
+from app.services.tool_executor import aggregate_results, execute_tool_calls, in_multi_call
+
+
+def create_task_call(title, goal_id=None, depends_on=()):
+    task = CreateTask(title=title, description="", due_date=None, priority=None, goal_id=goal_id)
+    return AgentDecision(tool_name="create_task", tool_input=task, depends_on=list(depends_on))
+
+
+def test_every_decision_tool_with_a_handler_is_registered():
+    for name in ["create_task", "update_task", "delete_task", "search_tasks_by_subject",
+                 "list_tasks_by_date_range", "create_goal", "update_goal", "delete_goal", "list_goals"]:
+        assert TOOLS.get(name) is not None, name
+
+
+def test_independent_calls_run_concurrently():
+    # Both calls must be inside run() at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def run(decision):
+        barrier.wait()
+        assert in_multi_call()
+        return ToolResult(message=f"Created task '{decision.tool_input.title}'")
+
+    results = execute_tool_calls([create_task_call("A"), create_task_call("B")], run)
+    assert [r.message for r in results] == ["Created task 'A'", "Created task 'B'"]
+
+
+def test_dependent_call_gets_the_earlier_result():
+    goal = AgentDecision(tool_name="create_goal", tool_input=GoalCreate(title="Ship v1", description=""))
+    task = create_task_call("Write docs", goal_id="$0.id", depends_on=[0])
+    seen = {}
+
+    def run(decision):
+        if decision.tool_name == "create_goal":
+            return ToolResult(message="Created goal", data=SimpleNamespace(id="goal-1"))
+        seen["goal_id"] = decision.tool_input.goal_id
+        return ToolResult(message="Created task")
+
+    execute_tool_calls([goal, task], run)
+    assert seen["goal_id"] == "goal-1"
+
+
+def test_failed_dependency_skips_dependents_but_not_others():
+    calls = [
+        AgentDecision(tool_name="delete_task", tool_input=TaskDelete(subject="missing", message="")),
+        create_task_call("Follow up", goal_id="$0.id"),
+        create_task_call("Unrelated"),
+    ]
+
+    def run(decision):
+        if decision.tool_name == "delete_task":
+            raise ValueError("No task found")
+        return ToolResult(message=f"Created task '{decision.tool_input.title}'")
+
+    results = execute_tool_calls(calls, run)
+    assert [r.ok for r in results] == [False, False, True]
+    assert results[1].message.startswith("Skipped create_task")
+
+
+def test_unresolvable_reference_skips_the_call():
+    # list_goals returns a list, which has no .id to reference
+    calls = [
+        AgentDecision(tool_name="list_goals", tool_input=TaskDelete(subject="", message="")),
+        create_task_call("Write docs", goal_id="$0.id"),
+        create_task_call("Unrelated"),
+    ]
+
+    def run(decision):
+        if decision.tool_name == "list_goals":
+            return ToolResult(message="2 goals", data=[SimpleNamespace(id="g1"), SimpleNamespace(id="g2")])
+        return ToolResult(message=f"Created task '{decision.tool_input.title}'")
+
+    results = execute_tool_calls(calls, run)
+    assert not results[1].ok and results[1].message.startswith("Skipped create_task: $0.id")
+    assert results[2].message == "Created task 'Unrelated'"
+
+
+def test_agent_execute_all_aggregates_one_reply():
+    created = SimpleNamespace(id="1", title="A", description="", due_date=None, goal_id=None)
+    with patch("app.services.agent.create_task", return_value=created), \
+         patch("app.services.agent.suggest_goals", return_value=[SimpleNamespace(id="g", title="Goal", similarity=0.5)]):
+        reply = agent.agent_execute_all([create_task_call("A"), create_task_call("A")])
+    # Several calls: no goal link follow-up question, one line per call
+    assert reply == "1. Created task 'A' with due date None\n2. Created task 'A' with due date None"
+
+
+def test_single_result_is_returned_as_is():
+    assert aggregate_results([ToolResult(message="Done")]) == "Done"
+
+
+@pytest.mark.parametrize("query, multi", [
+    ("Create goals A, B and C", True),
+    ("Create tasks A, B and C", False),
+    ("Create task A and mark task D done", True),
+    ("Create a task called Review budget", False),
+    ("Show my tasks for next week", False),
+])
+def test_is_multi_action(query, multi):
+    assert is_multi_action(query) == multi
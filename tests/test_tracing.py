@@ -0,0 +1,133 @@
+# tests/test_tracing.py
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.routers import debug
+from app.services.llm_metrics import CallTimer
+from app.services.tracing import (
+    NOOP_SPAN, TraceExporter, span, start_trace, to_otlp_json, trace_http_request, trace_store, traced, waterfall,
+)
+
+pytestmark = pytest.mark.usefixtures("tracing")
+
+
+@traced()
+def lookup():
+    with span("inner", table="tasks"):
+        pass
+
+
+def test_spans_nest_across_copied_context_threads():
+    with start_trace("req-nesting", "POST /chat"):
+        with span("agent_step"):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                pool.submit(contextvars.copy_context().run, lookup).result()
+
+    rows = waterfall(trace_store.get("req-nesting"))
+    assert [(row["name"], row["depth"]) for row in rows] == [
+        ("POST /chat", 0), ("agent_step", 1), ("lookup", 2), ("inner", 3),
+    ]
+    assert rows[3]["attributes"] == {"table": "tasks"}
+    assert rows[1]["parent_span_id"] == rows[0]["span_id"]
+
+
+def test_nothing_is_recorded_outside_a_trace():
+    with span("orphan") as orphan:
+        orphan.set_attribute("ignored", True)
+    assert orphan is NOOP_SPAN
+    assert lookup() is None
+
+
+def test_sql_statements_and_model_calls_become_spans():
+    engine = create_engine("sqlite://")
+    with start_trace("req-sql", "GET /tasks"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        with CallTimer(call_site="decision", provider="openai", model="gpt-4o") as timer:
+            timer.record.prompt_tokens = 120
+
+    rows = {row["name"]: row for row in waterfall(trace_store.get("req-sql"))}
+    assert rows["sql"]["attributes"]["db.statement"] == "SELECT 1"
+    assert rows["sql"]["attributes"]["db.system"] == "sqlite"
+    assert rows["model decision"]["attributes"]["llm.prompt_tokens"] == 120
+    assert rows["model decision"]["depth"] == 1
+
+
+def test_errors_are_marked_and_exported_as_otlp_json(tmp_path):
+    try:
+        with start_trace("req-error", "POST /agent"):
+            with span("tool create_task"):
+                raise ValueError("no title")
+    except ValueError:
+        pass
+    trace = trace_store.get("req-error")
+
+    exporter = TraceExporter("file", str(tmp_path / "traces.jsonl"), "", "test-service")
+    exporter.export(trace)
+    exporter.join()
+    exported = json.loads((tmp_path / "traces.jsonl").read_text())
+    assert exported == to_otlp_json(trace, "test-service")
+
+    resource_spans = exported["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "test-service"}}]
+    root, tool = resource_spans["scopeSpans"][0]["spans"]
+    assert root["traceId"] == tool["traceId"] == trace.trace_id
+    assert tool["parentSpanId"] == root["spanId"]
+    assert "parentSpanId" not in root
+    assert tool["status"] == {"code": 2, "message": "ValueError: no title"}
+    assert int(tool["endTimeUnixNano"]) >= int(tool["startTimeUnixNano"])
+
+
+def test_debug_endpoint_shows_the_waterfall():
+    with start_trace("req-debug", "POST /chat"):
+        lookup()
+    app = FastAPI()
+    app.include_router(debug.router)
+    client = TestClient(app)
+
+    body = client.get("/debug/traces/req-debug").json()
+    assert [row["name"] for row in body["spans"]] == ["POST /chat", "lookup", "inner"]
+    assert body["dropped_spans"] == 0
+    text_body = client.get("/debug/traces/req-debug", params={"format": "text"}).text
+    assert text_body.splitlines()[2].startswith("    inner")
+    assert client.get("/debug/traces/unknown").status_code == 404
+
+
+def test_the_request_span_covers_a_streamed_body():
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        return await trace_http_request("req-stream", request, call_next)
+
+    @app.get("/stream")
+    def stream():
+        def body():
+            for i in range(2):
+                with span("chunk", index=i):
+                    chunk = f"data: {i}\n\n"
+                yield chunk
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    assert TestClient(app).get("/stream").text == "data: 0\n\ndata: 1\n\n"
+    trace = trace_store.get("req-stream")
+    root, *chunks = trace.finished_spans()
+    assert root.name == "GET /stream" and root.attributes["http.status_code"] == 200
+    assert [(c.name, c.parent_id) for c in chunks] == [("chunk", root.span_id)] * 2
+    assert root.end_ns >= max(c.end_ns for c in chunks)
+
+
+def test_tracing_is_off_by_default(monkeypatch):
+    from app.config.settings import TracingSettings
+
+    monkeypatch.delenv("TRACING_ENABLED", raising=False)
+    monkeypatch.delenv("TRACING_DEBUG_ENDPOINT", raising=False)
+    settings = TracingSettings()
+    assert not settings.enabled and not settings.debug_endpoint
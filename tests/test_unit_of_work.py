@@ -0,0 +1,111 @@
+# tests/test_unit_of_work.py
+import contextvars
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event, select
+
+from app.database.unit_of_work import current_session, release_session, unit_of_work, unit_of_work_stats
+from app.models.goal_models import GoalCreate
+from app.models.sql_task_models import TaskCreateSQL, TaskDB, TaskUpdateSQL
+from app.services.subject_resolver import get_subject_resolver
+from app.services.tools import goal_tools, sql_task_tools
+
+
+@pytest.fixture(autouse=True)
+def fresh_subject_index():
+    get_subject_resolver(TaskDB).invalidate()
+    yield
+    get_subject_resolver(TaskDB).invalidate()
+
+
+def count_checkouts(engine):
+    checkouts = []
+    event.listen(engine, "checkout", lambda *args: checkouts.append(1))
+    return checkouts
+
+
+def test_tool_calls_in_a_turn_share_one_session_and_connection(engine):
+    checkouts = count_checkouts(engine)
+    with unit_of_work("turn", bind=engine) as uow:
+        goal = goal_tools.create_goal(GoalCreate(title="Launch the website", description=None, target_date=None))
+        task = sql_task_tools.create_sql_task(TaskCreateSQL(title="Write copy", description=None, due_date=None,
+                                                            priority=None))
+        sql_task_tools.update_sql_task(TaskUpdateSQL(id=task.id, title=None, description=None, completed=True,
+                                                     due_date=None, priority=None, goal_id=goal.id, subject=None))
+        assert sql_task_tools.get_sql_task(str(task.id)).completed is True
+        assert [t.title for t in sql_task_tools.search_sql_tasks_by_subject("write")] == ["Write copy"]
+        goal_tools.delete_goal(str(goal.id))
+
+    assert uow.sessions == 1
+    assert len(checkouts) == 1
+    assert uow.statements > 5
+
+
+def test_the_turn_session_is_released_and_failed_work_rolled_back(engine):
+    with unit_of_work("turn", bind=engine) as uow:
+        db = current_session()
+        db.add(TaskDB(title="Never committed"))
+        db.flush()
+        release_session(db)  # a tool call ending does not close the turn's session
+        assert db.query(TaskDB).count() == 1
+        with unit_of_work("nested") as nested:
+            assert nested is uow and current_session() is db
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM tasks").scalar() == 0
+    assert engine.pool.checkedout() == 0
+
+
+def test_worker_threads_get_their_own_session(engine):
+    before = unit_of_work_stats.snapshot()
+    with unit_of_work("turn", bind=engine) as uow:
+        shared = current_session()
+        seen = []
+
+        def worker():
+            db = current_session()
+            seen.append(db)
+            release_session(db)
+
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(worker,))
+        thread.start()
+        thread.join()
+
+    assert seen[0] is not shared
+    assert uow.sessions == 2
+    after = unit_of_work_stats.snapshot()
+    assert after["units"] == before["units"] + 1
+    assert after["sessions"] == before["sessions"] + 2
+
+
+def test_coordinated_turns_share_one_session(engine, monkeypatch):
+    from app.services import agent_coordinator
+
+    sessions = []
+
+    def execute(decisions):
+        sessions.append(current_session())
+        sessions.append(current_session())
+        return "done"
+
+    monkeypatch.setattr(agent_coordinator, "parse_agent_decisions", lambda query: [])
+    monkeypatch.setattr(agent_coordinator, "agent_execute_all", execute)
+    monkeypatch.setattr("app.database.unit_of_work.UnitOfWork.bind", engine)
+    assert agent_coordinator.coordinate_agents([{"role": "user", "content": "Germain list my tasks"}]) == "Germain: done"
+    assert sessions[0] is sessions[1]
+
+
+def test_a_failed_read_does_not_leave_the_turn_session_in_a_transaction(engine, monkeypatch):
+    class FailingResolver:
+        def resolve(self, db, subject, limit, use_cache=True):
+            db.execute(select(TaskDB.id)).all()
+            raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(sql_task_tools, "get_subject_resolver", lambda model: FailingResolver())
+    with unit_of_work("turn", bind=engine):
+        with pytest.raises(HTTPException):
+            sql_task_tools.search_sql_tasks_by_subject("anything")
+        assert not current_session().in_transaction()
+        assert sql_task_tools.list_sql_tasks() == []